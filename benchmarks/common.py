@@ -0,0 +1,117 @@
+import math
+import random
+from typing import Iterator
+
+from models.request_models import CrudeOilDataModelPost
+
+ORIGINS = [
+    ("Canada", "Country"),
+    ("Mexico", "Country"),
+    ("Saudi Arabia", "Country"),
+    ("Iraq", "Country"),
+    ("Colombia", "Country"),
+    ("Persian Gulf", "Region"),
+    ("Canada (Region)", "Region"),
+    ("PADD1 (East Coast)", "Port"),
+]
+DESTINATIONS = [
+    ("EXXONMOBIL REFINING & SPLY CO / BEAUMONT / TX", "Refinery"),
+    ("FLINT HILLS RESOURCES LP / WEST / TX", "Refinery"),
+    ("PADD1 (East Coast)", "PADD"),
+    ("PADD3 (Gulf Coast)", "PADD"),
+    ("HOUSTON, TX", "Port"),
+]
+GRADES = ["Light Sour", "Light Sweet", "Medium", "Heavy Sour", "Heavy Sweet"]
+
+# The real names are too few for large datasets with unique natural keys, synthetic
+# ones complete them: 16 years x 12 months x 5 grades x 400 origins x 200 destinations
+# is 76.8M keys.
+ALL_ORIGINS = ORIGINS + [
+    (f"Origin {number}", "Country") for number in range(len(ORIGINS), 400)
+]
+ALL_DESTINATIONS = DESTINATIONS + [
+    (f"Refinery {number}", "Refinery") for number in range(len(DESTINATIONS), 200)
+]
+# Years of the seeded dataset, and of the records the write benchmarks create, so
+# the two never share a natural key.
+DATASET_YEARS = range(2009, 2025)
+WRITE_YEARS = range(1900, 2009)
+
+
+class KeySpace:
+    """
+    Every natural key (year, month, origin, destination, grade) of `years`, numbered
+    0 to `size - 1` in a scrambled order. Consecutive numbers spread over all the
+    dimensions, so any prefix of the numbering is a realistic dataset without
+    repeated keys.
+    """
+
+    def __init__(self, years: range):
+        self.years = years
+        self.radixes = [
+            len(GRADES),
+            12,
+            len(years),
+            len(ALL_DESTINATIONS),
+            len(ALL_ORIGINS),
+        ]
+        self.size = math.prod(self.radixes)
+        # A multiplier coprime with the size makes the scrambling a bijection.
+        self.multiplier = 1_000_003
+        while math.gcd(self.multiplier, self.size) != 1:
+            self.multiplier += 2
+
+    def key(self, number: int) -> dict:
+        value = number * self.multiplier % self.size
+        digits = []
+        for radix in self.radixes:
+            value, digit = divmod(value, radix)
+            digits.append(digit)
+        grade, month, year, destination, origin = digits
+        origin_name, origin_type_name = ALL_ORIGINS[origin]
+        destination_name, destination_type_name = ALL_DESTINATIONS[destination]
+        return {
+            "year": self.years[year],
+            "month": month + 1,
+            "origin_name": origin_name,
+            "origin_type_name": origin_type_name,
+            "destination_name": destination_name,
+            "destination_type_name": destination_type_name,
+            "grade_name": GRADES[grade],
+        }
+
+
+DATASET_KEYS = KeySpace(DATASET_YEARS)
+WRITE_KEYS = KeySpace(WRITE_YEARS)
+
+
+def synthetic_records(
+    start: int, count: int, keys: KeySpace = DATASET_KEYS, seed: int = 0
+) -> Iterator[dict]:
+    """
+    Records `start` to `start + count - 1` of `keys`, shaped like `sample_data/data.csv`
+    and keyed by the API field names. The same numbers always give the same records.
+    """
+    rand = random.Random(seed * keys.size + start)
+    for number in range(start, start + count):
+        yield {**keys.key(number % keys.size), "quantity": rand.randint(1, 5000)}
+
+
+def fresh_write_start(count: int) -> int:
+    """
+    Random first number of `count` records of WRITE_KEYS, unlikely to have been
+    inserted by a previous run against the same database.
+    """
+    return random.randrange(WRITE_KEYS.size - count)
+
+
+def synthetic_rows(count: int, seed: int = 0) -> list:
+    """
+    Rows with new natural keys, outside of the seeded dataset, as accepted by the bulk
+    endpoint.
+    """
+    return list(synthetic_records(fresh_write_start(count), count, WRITE_KEYS, seed))
+
+
+def synthetic_models(count: int, seed: int = 0) -> list:
+    return [CrudeOilDataModelPost(**row) for row in synthetic_rows(count, seed)]
@@ -0,0 +1,593 @@
+"""
+Load test of every route of `routers/crude_oil_imports.py` against a running API,
+reporting throughput and p50/p95/p99 latencies per scenario to a JSON file.
+
+    DATABASE_URL=... python -m benchmarks.seed --rows 1000000
+    DATABASE_URL=... uvicorn main:app --port 5321 --workers 4
+    python -m benchmarks.load --base-url http://localhost:5321 --output results.json
+
+Every scenario sends requests at a fixed arrival rate (open loop) for `--duration`
+seconds, one scenario after the other. Latency runs from the time a request was due,
+not from the time it was sent, so a saturated server shows up as latency instead of
+slowing the client down. `--max-in-flight` bounds the open requests.
+
+With `--baseline`, the results are compared with a previous output file and the run
+fails when a latency grew, or the throughput dropped, by more than `--tolerance`:
+
+    python -m benchmarks.load --output benchmarks/baseline.json         # on main
+    python -m benchmarks.load --baseline benchmarks/baseline.json       # on the branch
+
+The write scenarios create their own records, with years before 2009, and update the
+quantities of seeded records. Run it against a scratch database.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import platform
+import random
+import subprocess
+import sys
+import time
+import uuid
+from typing import Callable, List, Optional
+
+import httpx
+
+from benchmarks.common import (
+    DATASET_KEYS,
+    ORIGINS,
+    WRITE_KEYS,
+    fresh_write_start,
+    synthetic_records,
+)
+
+PREFIX = "/crude-oil-imports"
+# Records of the seeded dataset used by the lookup and update scenarios.
+SAMPLE_SIZE = 1000
+# Records per request of the bulk scenarios.
+BULK_SIZE = 1000
+
+
+class Context:
+    """
+    State shared by the scenarios, filled by `prepare()` and the scenario setups.
+    """
+
+    def __init__(self):
+        self.run_id = uuid.uuid4().hex[:8]
+        self.total = 0
+        self.sample: List[dict] = []
+        self.deep_cursor: Optional[str] = None
+        self.delete_uuids: List[str] = []
+        self.write_start = 0
+
+
+class Scenario:
+    """
+    :param build: returns the `httpx.AsyncClient.request` arguments of the i-th request
+    :param setup: prepares `requests` requests before the scenario starts
+    """
+
+    def __init__(
+        self,
+        name: str,
+        rate: float,
+        build: Callable[[Context, int], dict],
+        setup: Optional[Callable] = None,
+    ):
+        self.name = name
+        self.rate = rate
+        self.build = build
+        self.setup = setup
+
+
+def _origin(i: int) -> str:
+    return ORIGINS[i % len(ORIGINS)][0]
+
+
+def _year(i: int) -> int:
+    return DATASET_KEYS.years[i % len(DATASET_KEYS.years)]
+
+
+def _sampled(context: Context, i: int) -> dict:
+    return context.sample[i % len(context.sample)]
+
+
+def _fresh_records(context: Context, count: int) -> List[dict]:
+    """
+    `count` records with natural keys no other request of the run uses.
+    """
+    records = list(synthetic_records(context.write_start, count, WRITE_KEYS))
+    context.write_start += count
+    return records
+
+
+async def _bulk_insert(client: httpx.AsyncClient, records: List[dict]) -> List[str]:
+    uuids = []
+    for start in range(0, len(records), BULK_SIZE):
+        response = await client.post(
+            f"{PREFIX}/bulk", json=records[start : start + BULK_SIZE]
+        )
+        response.raise_for_status()
+        uuids.extend(record["uuid"] for record in response.json()["data"])
+    return uuids
+
+
+async def setup_deep_cursor(
+    client: httpx.AsyncClient, context: Context, requests: int
+):
+    response = await client.get(
+        f"{PREFIX}/",
+        params={"skip": context.total // 2, "limit": 100, "count": "none"},
+    )
+    response.raise_for_status()
+    context.deep_cursor = response.json()["data"]["metadata"]["next_cursor"]
+
+
+async def setup_deletes(client: httpx.AsyncClient, context: Context, requests: int):
+    context.delete_uuids = await _bulk_insert(client, _fresh_records(context, requests))
+
+
+async def setup_bulk_deletes(
+    client: httpx.AsyncClient, context: Context, requests: int
+):
+    # Ten records per request, with an origin matching only them.
+    records = _fresh_records(context, requests * 10)
+    for number, record in enumerate(records):
+        record["origin_name"] = f"bench-{context.run_id}-{number // 10}"
+    await _bulk_insert(client, records)
+
+
+def _ndjson(records: List[dict]) -> bytes:
+    return "".join(json.dumps(record) + "\n" for record in records).encode()
+
+
+SCENARIOS = [
+    Scenario(
+        "list_first_page",
+        50,
+        lambda context, i: {
+            "method": "GET",
+            "url": f"{PREFIX}/",
+            "params": {"limit": 100},
+        },
+    ),
+    Scenario(
+        "list_deep_offset",
+        10,
+        lambda context, i: {
+            "method": "GET",
+            "url": f"{PREFIX}/",
+            "params": {"skip": context.total // 2, "limit": 100, "count": "none"},
+        },
+    ),
+    Scenario(
+        "list_deep_cursor",
+        50,
+        lambda context, i: {
+            "method": "GET",
+            "url": f"{PREFIX}/",
+            "params": {"cursor": context.deep_cursor, "limit": 100, "count": "none"},
+        },
+        setup=setup_deep_cursor,
+    ),
+    Scenario(
+        "list_filtered",
+        50,
+        lambda context, i: {
+            "method": "GET",
+            "url": f"{PREFIX}/",
+            "params": {
+                "originName": _origin(i),
+                "yearGte": 2015,
+                "yearLte": 2020,
+                "limit": 100,
+            },
+        },
+    ),
+    Scenario(
+        "list_exact_count",
+        20,
+        lambda context, i: {
+            "method": "GET",
+            "url": f"{PREFIX}/",
+            "params": {
+                "originName": [_origin(i), _origin(i + 1)],
+                "year": _year(i),
+                "count": "exact",
+                "limit": 10,
+            },
+        },
+    ),
+    Scenario(
+        "aggregate_rollup",
+        20,
+        lambda context, i: {
+            "method": "GET",
+            "url": f"{PREFIX}/aggregate",
+            "params": {"group_by": ["originName", "year"], "metrics": ["sum", "avg"]},
+        },
+    ),
+    Scenario(
+        "aggregate_base_table",
+        5,
+        lambda context, i: {
+            "method": "GET",
+            "url": f"{PREFIX}/aggregate",
+            "params": {
+                "group_by": ["destinationName"],
+                "metrics": ["max"],
+                "year": _year(i),
+            },
+        },
+    ),
+    Scenario(
+        "export_ndjson",
+        5,
+        lambda context, i: {
+            "method": "GET",
+            "url": f"{PREFIX}/export",
+            "params": {"format": "ndjson", "originName": _origin(i), "year": _year(i)},
+        },
+    ),
+    Scenario(
+        "get_by_uuid",
+        100,
+        lambda context, i: {
+            "method": "GET",
+            "url": f"{PREFIX}/{_sampled(context, i)['uuid']}",
+        },
+    ),
+    Scenario(
+        "lookup",
+        20,
+        lambda context, i: {
+            "method": "POST",
+            "url": f"{PREFIX}/lookup",
+            "json": {
+                "uuids": [
+                    _sampled(context, i * 100 + offset)["uuid"] for offset in range(100)
+                ]
+            },
+        },
+    ),
+    Scenario(
+        "create",
+        20,
+        lambda context, i: {
+            "method": "POST",
+            "url": f"{PREFIX}/",
+            "json": _fresh_records(context, 1)[0],
+        },
+    ),
+    Scenario(
+        "bulk_insert",
+        2,
+        lambda context, i: {
+            "method": "POST",
+            "url": f"{PREFIX}/bulk",
+            "json": _fresh_records(context, BULK_SIZE),
+        },
+    ),
+    Scenario(
+        "bulk_upsert",
+        2,
+        lambda context, i: {
+            "method": "POST",
+            "url": f"{PREFIX}/bulk",
+            "params": {"mode": "upsert"},
+            # Seeded records with new quantities.
+            "json": list(
+                synthetic_records(
+                    random.randrange(max(context.total - BULK_SIZE, 1)),
+                    BULK_SIZE,
+                    seed=i + 1,
+                )
+            ),
+        },
+    ),
+    Scenario(
+        "ingest_ndjson",
+        2,
+        lambda context, i: {
+            "method": "POST",
+            "url": f"{PREFIX}/stream",
+            "content": _ndjson(_fresh_records(context, BULK_SIZE)),
+            "headers": {"Content-Type": "application/x-ndjson"},
+        },
+    ),
+    Scenario(
+        "patch",
+        20,
+        lambda context, i: {
+            "method": "PATCH",
+            "url": f"{PREFIX}/{_sampled(context, i)['uuid']}",
+            "json": {"quantity": random.randint(1, 5000)},
+        },
+    ),
+    Scenario(
+        "put",
+        20,
+        lambda context, i: {
+            "method": "PUT",
+            "url": f"{PREFIX}/{_sampled(context, i)['uuid']}",
+            "json": {
+                **{
+                    field: value
+                    for field, value in _sampled(context, i).items()
+                    if field != "uuid"
+                },
+                "quantity": random.randint(1, 5000),
+            },
+        },
+    ),
+    Scenario(
+        "delete",
+        20,
+        lambda context, i: {
+            "method": "DELETE",
+            "url": f"{PREFIX}/{context.delete_uuids[i]}",
+        },
+        setup=setup_deletes,
+    ),
+    Scenario(
+        "bulk_patch",
+        5,
+        lambda context, i: {
+            "method": "PATCH",
+            "url": f"{PREFIX}/",
+            "params": {
+                "originName": _origin(i),
+                "periodFrom": f"{_year(i)}-06",
+                "periodTo": f"{_year(i)}-06",
+            },
+            "json": {"quantity": random.randint(1, 5000)},
+        },
+    ),
+    Scenario(
+        "bulk_delete",
+        5,
+        lambda context, i: {
+            "method": "DELETE",
+            "url": f"{PREFIX}/",
+            "params": {"originName": f"bench-{context.run_id}-{i}"},
+        },
+        setup=setup_bulk_deletes,
+    ),
+]
+
+
+def is_failure(response: httpx.Response) -> bool:
+    if response.status_code >= 400:
+        return True
+    # Failures are also returned as a FailureResponseModel with a success status code.
+    # They are small, larger bodies are not parsed to keep the client cheap.
+    if len(response.content) < 1024:
+        try:
+            body = response.json()
+        except ValueError:
+            return False
+        return isinstance(body, dict) and body.get("status", 0) >= 400
+    return False
+
+
+def percentile(sorted_values: List[float], fraction: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    index = max(math.ceil(fraction * len(sorted_values)) - 1, 0)
+    return sorted_values[index]
+
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    scenario: Scenario,
+    context: Context,
+    rate: float,
+    duration: float,
+    max_in_flight: int,
+    first: int = 0,
+) -> dict:
+    """
+    Sends `rate * duration` requests of `scenario` at a fixed arrival rate.
+    `first` is the number of the first request, the warmup uses the ones before.
+    """
+    loop = asyncio.get_running_loop()
+    requests = max(int(rate * duration), 1)
+    semaphore = asyncio.Semaphore(max_in_flight)
+    latencies: List[float] = []
+    errors = 0
+
+    async def send(i: int, due: float):
+        nonlocal errors
+        request = scenario.build(context, i)
+        async with semaphore:
+            try:
+                failed = is_failure(await client.request(**request))
+            except httpx.HTTPError:
+                failed = True
+        if failed:
+            errors += 1
+        else:
+            latencies.append(loop.time() - due)
+
+    started = loop.time()
+    tasks = []
+    for number in range(requests):
+        due = started + number / rate
+        delay = due - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(send(first + number, due)))
+    await asyncio.gather(*tasks)
+    elapsed = loop.time() - started
+
+    latencies.sort()
+    milliseconds = [latency * 1000 for latency in latencies]
+    return {
+        "rate": rate,
+        "requests": requests,
+        "errors": errors,
+        "throughput": len(latencies) / elapsed,
+        "latency_ms": {
+            "p50": percentile(milliseconds, 0.50),
+            "p95": percentile(milliseconds, 0.95),
+            "p99": percentile(milliseconds, 0.99),
+            "max": milliseconds[-1] if milliseconds else None,
+            "mean": sum(milliseconds) / len(milliseconds) if milliseconds else None,
+        },
+    }
+
+
+async def prepare(client: httpx.AsyncClient, context: Context) -> None:
+    response = await client.get(f"{PREFIX}/", params={"limit": 1, "count": "estimated"})
+    response.raise_for_status()
+    context.total = response.json()["data"]["metadata"]["total"]
+    if not context.total:
+        sys.exit("The database is empty, seed it with `python -m benchmarks.seed`.")
+    response = await client.get(
+        f"{PREFIX}/",
+        params={
+            "skip": random.randrange(max(context.total - SAMPLE_SIZE, 1)),
+            "limit": SAMPLE_SIZE,
+            "count": "none",
+        },
+    )
+    response.raise_for_status()
+    context.sample = response.json()["data"]["paginated_data"]
+    context.write_start = fresh_write_start(10_000_000)
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    """
+    :return: one line per regression of `results` compared with `baseline`
+    """
+    regressions = []
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if previous is None:
+            continue
+        for key in ("p50", "p95", "p99"):
+            now, before = current["latency_ms"][key], previous["latency_ms"][key]
+            if now is not None and before and now > before * (1 + tolerance):
+                regressions.append(f"{name}: {key} {before:.1f} ms -> {now:.1f} ms")
+        if current["throughput"] < previous["throughput"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: throughput {previous['throughput']:.1f}/s -> "
+                f"{current['throughput']:.1f}/s"
+            )
+        if current["errors"] > previous["errors"]:
+            regressions.append(
+                f"{name}: errors {previous['errors']} -> {current['errors']}"
+            )
+    return regressions
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--base-url", default="http://0.0.0.0:5321")
+    parser.add_argument(
+        "--scenarios",
+        default=",".join(scenario.name for scenario in SCENARIOS),
+        help="comma separated scenario names, all by default",
+    )
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds")
+    parser.add_argument("--warmup", type=float, default=2.0, help="seconds")
+    parser.add_argument(
+        "--rate", type=float, help="requests/sec of every scenario, else their own"
+    )
+    parser.add_argument("--max-in-flight", type=int, default=256)
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="output file of a previous run")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    by_name = {scenario.name: scenario for scenario in SCENARIOS}
+    names = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in names if name not in by_name]
+    if unknown:
+        parser.error(f"unknown scenarios {unknown}, choose from {list(by_name)}")
+
+    results = {
+        "meta": {
+            "base_url": args.base_url,
+            "commit": git_commit(),
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "duration": args.duration,
+            "warmup": args.warmup,
+            "max_in_flight": args.max_in_flight,
+        },
+        "scenarios": {},
+    }
+    limits = httpx.Limits(max_connections=args.max_in_flight)
+    async with httpx.AsyncClient(
+        base_url=args.base_url, timeout=args.timeout, limits=limits
+    ) as client:
+        context = Context()
+        await prepare(client, context)
+        results["meta"]["records"] = context.total
+        for name in names:
+            scenario = by_name[name]
+            rate = args.rate or scenario.rate
+            warmup = int(rate * args.warmup)
+            if scenario.setup is not None:
+                requests = warmup + max(int(rate * args.duration), 1)
+                await scenario.setup(client, context, requests)
+            if warmup:
+                await run_scenario(
+                    client, scenario, context, rate, args.warmup, args.max_in_flight
+                )
+            result = await run_scenario(
+                client,
+                scenario,
+                context,
+                rate,
+                args.duration,
+                args.max_in_flight,
+                first=warmup,
+            )
+            results["scenarios"][name] = result
+            latency = result["latency_ms"]
+            percentiles = "  ".join(
+                f"{key} {latency[key] or 0:>8.1f} ms" for key in ("p50", "p95", "p99")
+            )
+            print(
+                f"{name:>22}: {result['throughput']:>8.1f}/s  {percentiles}  "
+                f"errors {result['errors']}"
+            )
+
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=2)
+    print(f"Results written to {args.output}.")
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"Regressions against {args.baseline}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"No regression against {args.baseline}.")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
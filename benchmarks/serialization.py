@@ -0,0 +1,161 @@
+"""
+CPU time of building the JSON responses, before and after the single validation path.
+No database is needed.
+
+    python -m benchmarks.serialization --rows 10000 --repeat 5 --profile
+
+`before` is the previous implementation of each route: the router wraps the records
+validated by the bll in the response model, FastAPI validates the returned model
+against the route's `response_model` and encodes it with `JSONResponse`. `after` is
+the current one, `bll.serialization.envelope_json`. Both bodies are checked to decode
+to the same JSON. `--profile` prints the functions using the most CPU time of each path.
+"""
+
+import argparse
+import asyncio
+import cProfile
+import gc
+import json
+import pstats
+import time
+import uuid
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute, serialize_response
+
+from benchmarks.common import synthetic_records
+from bll.serialization import envelope_json
+from main import app
+from models.response_models import (
+    CrudeOilDataResponseModel,
+    DataCreatedResponseModel,
+    LookupResponseModel,
+    LookupResultModel,
+    MultipleDataCreatedResponseModel,
+)
+
+
+def db_rows(count):
+    # Shaped like the rows returned by the dal.
+    return [{**record, "uuid": uuid.uuid4()} for record in synthetic_records(0, count)]
+
+
+def response_field(path, method):
+    for route in app.routes:
+        if not isinstance(route, APIRoute):
+            continue
+        if route.path == path and method in route.methods:
+            return route.response_field
+    raise LookupError(f"{method} {path}")
+
+
+async def fastapi_body(field, content) -> bytes:
+    # What FastAPI does with a model returned by a route.
+    return JSONResponse(
+        await serialize_response(field=field, response_content=content)
+    ).body
+
+
+def validate(rows):
+    return [CrudeOilDataResponseModel.model_validate(row) for row in rows]
+
+
+async def insert_before(rows):
+    field = response_field("/crude-oil-imports/", "POST")
+    body = b""
+    for record in validate(rows):
+        content = DataCreatedResponseModel(data=record.model_dump())
+        body = await fastapi_body(field, content)
+    return body
+
+
+async def insert_after(rows):
+    body = b""
+    for record in validate(rows):
+        body = envelope_json(DataCreatedResponseModel, record)
+    return body
+
+
+async def bulk_before(rows):
+    content = MultipleDataCreatedResponseModel(data=validate(rows))
+    return await fastapi_body(
+        response_field("/crude-oil-imports/bulk", "POST"), content
+    )
+
+
+async def bulk_after(rows):
+    return envelope_json(MultipleDataCreatedResponseModel, validate(rows))
+
+
+async def lookup_before(rows):
+    result = LookupResultModel(records=validate(rows), missing=[])
+    content = LookupResponseModel(data=result)
+    return await fastapi_body(
+        response_field("/crude-oil-imports/lookup", "POST"), content
+    )
+
+
+async def lookup_after(rows):
+    result = LookupResultModel(records=validate(rows), missing=[])
+    return envelope_json(LookupResponseModel, result)
+
+
+# One response per record for `insert`, a single response of every record otherwise.
+PATHS = {
+    "insert": (insert_before, insert_after),
+    "bulk": (bulk_before, bulk_after),
+    "lookup": (lookup_before, lookup_after),
+}
+
+
+async def measure(build, rows, repeat):
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.process_time()
+        await build(rows)
+        timings.append(time.process_time() - start)
+    return min(timings)
+
+
+async def profile(name, build, rows, top):
+    gc.collect()
+    profiler = cProfile.Profile()
+    profiler.enable()
+    await build(rows)
+    profiler.disable()
+    print(f"--- {name}")
+    pstats.Stats(profiler).sort_stats("tottime").print_stats(top)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--paths", nargs="+", choices=list(PATHS), default=list(PATHS)
+    )
+    parser.add_argument("--profile", action="store_true")
+    parser.add_argument("--top", type=int, default=12)
+    args = parser.parse_args()
+
+    rows = db_rows(args.rows)
+    for name in args.paths:
+        before, after = PATHS[name]
+        if json.loads(await before(rows)) != json.loads(await after(rows)):
+            raise SystemExit(f"{name}: the response bodies differ")
+        before_time = await measure(before, rows, args.repeat)
+        after_time = await measure(after, rows, args.repeat)
+        print(
+            f"{name:>7}: before {before_time * 1000:>8.1f} ms, "
+            f"after {after_time * 1000:>8.1f} ms, "
+            f"{before_time / after_time:.1f}x less CPU "
+            f"({args.rows:,} records, best of {args.repeat})"
+        )
+        if args.profile:
+            await profile(f"{name} before", before, rows, args.top)
+            await profile(f"{name} after", after, rows, args.top)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,29 +1,116 @@
 import asyncio
+import hashlib
+import json
 import logging
-from typing import Optional, List
+from decimal import Decimal
+from typing import AsyncIterator, Optional, List, Tuple
 from uuid import UUID
 
-from fastapi import HTTPException
+from fastapi import HTTPException, status
 from pydantic import ValidationError
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
 import dal.crude_oil_imports as dal
+from bll.etags import etag_matches, make_etag
+from bll.export import ExportSerializer
+from bll.ingestion import RecordParser, ingestion_format, iter_lines
+from bll.pagination import decode_cursor, next_cursor_for_page
+from bll.serialization import envelope_json
+from cache.response_cache import ResponseCache, build_cache_backend
+from cache.ttl import TTLCache
+from config import settings
 from dao.schema import CrudeOilImportsSchema
+from dao.session import SessionLocal
+from metrics.instrumentation import timed_model
 from models.request_models import (
+    AggregateDimension,
+    AggregateMetric,
+    CountMode,
     CrudeOilDataModelFilter,
     CrudeOilDataModelPatch,
     CrudeOilDataModelPost,
     CrudeOilDataModelPut,
 )
 from models.response_models import (
+    AggregatedCrudeOilDataModel,
+    BulkChangeSummaryModel,
     CrudeOilDataResponseModel,
+    IngestionErrorModel,
+    IngestionSummaryModel,
+    LookupResultModel,
     PaginatedCrudeOilDataModel,
     PaginatedMetaData,
+    PaginatedResponseModel,
+    SingleDataGetResponseModel,
+    UpsertSummaryModel,
 )
 
 logging.basicConfig(level=logging.ERROR)
 logger = logging.getLogger(__name__)
 
+# Exact totals per change marker and normalized filter set. A write from any worker moves
+# the marker, so a total is never served past the data it was counted on.
+count_cache = TTLCache(
+    max_entries=settings.COUNT_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.COUNT_CACHE_TTL_SECONDS,
+)
+
+
+# Serialized single record responses keyed by uuid, invalidated by the writes of that uuid.
+record_cache = ResponseCache(
+    "records",
+    backend=build_cache_backend(
+        settings.RECORD_CACHE_BACKEND,
+        max_entries=settings.RECORD_CACHE_MAX_ENTRIES,
+        redis_url=settings.CACHE_REDIS_URL,
+        prefix="crude_oil_imports:record",
+    ),
+    ttl_seconds=settings.RECORD_CACHE_TTL_SECONDS,
+)
+
+
+# Serialized listing responses. Keys embed the change marker, a write makes all of
+# them unreachable and the byte bound evicts them.
+listing_cache = ResponseCache(
+    "listings",
+    backend=build_cache_backend(
+        settings.LISTING_CACHE_BACKEND,
+        max_bytes=settings.LISTING_CACHE_MAX_BYTES,
+        redis_url=settings.CACHE_REDIS_URL,
+        prefix="crude_oil_imports:listing",
+    ),
+    ttl_seconds=settings.LISTING_CACHE_TTL_SECONDS,
+)
+
+
+def _query_filters(filters: CrudeOilDataModelFilter) -> dict:
+    """
+    Set filters only. Lists are sorted and deduplicated, so equal filter sets share
+    their cache keys and cursors.
+    """
+    return {
+        column: sorted(set(value)) if isinstance(value, list) else value
+        for column, value in filters.model_dump().items()
+        if value is not None
+    }
+
+
+def _count_cache_key(filters: dict) -> tuple:
+    return tuple(sorted((column, str(value)) for column, value in filters.items()))
+
+
+def _replica_lag_bound(db: AsyncSession) -> float:
+    # Data read from a replica may miss the writes of the last seconds.
+    return settings.READ_REPLICA_MAX_LAG_SECONDS if db.info.get("replica") else 0.0
+
+
+async def _count_records_on_own_connection(db: AsyncSession, filters: dict) -> int:
+    # A session runs one statement at a time on one connection. Counting on a separate
+    # pooled connection of the same database lets the count and the page query really
+    # run concurrently.
+    async with AsyncSession(db.bind, info=db.info) as count_db:
+        return await dal.count_records_in_db(count_db, filters=filters)
+
 
 async def insert_one_data_into_database(
     db: AsyncSession, data: CrudeOilDataModelPost
@@ -36,7 +123,7 @@ async def insert_one_data_into_database(
     """
     try:
         inserted_data = await dal.insert_single_data_into_database(db, data)
-        formatted_data = CrudeOilDataResponseModel(**inserted_data)
+        formatted_data = CrudeOilDataResponseModel.model_validate(inserted_data)
     except ValidationError as e:
         logger.error(
             "Cannot create response model while using the inserted value from db."
@@ -83,6 +170,113 @@ async def insert_multiple_data_into_database(
         raise
 
 
+async def upsert_multiple_data_into_database(
+    db: AsyncSession, data_list: List[CrudeOilDataModelPost]
+) -> UpsertSummaryModel:
+    """
+    :param db: SQLAlchemy async db session
+    :param data_list: records to insert, or to update when their natural key exists
+    :return: UpsertSummaryModel with the number of inserted, updated, unchanged and
+        duplicate records
+    """
+    result = await dal.upsert_multiple_data_into_database(db, data_list)
+    if result["updated"]:
+        await record_cache.invalidate(*[str(uuid) for uuid in result["updated"]])
+    return UpsertSummaryModel(
+        inserted=result["inserted"],
+        updated=len(result["updated"]),
+        unchanged=result["unchanged"],
+        duplicates=result["duplicates"],
+    )
+
+
+async def ingest_crude_oil_imports_stream(
+    db: AsyncSession,
+    body: AsyncIterator[bytes],
+    content_type: Optional[str],
+    chunk_size: int,
+) -> IngestionSummaryModel:
+    """
+    Parses and validates an ndjson or csv body line by line and inserts the valid records
+    every `chunk_size` rows. Memory use depends on `chunk_size`, not on the body size.
+    Invalid lines, and records whose natural key already exists, are skipped and
+    reported, they do not stop the ingestion.
+
+    :param db: SQLAlchemy async db session
+    :param body: request body chunks
+    :param content_type: Content-Type header, selects the ndjson or csv parser
+    :param chunk_size: number of valid records inserted per transaction
+    :return: IngestionSummaryModel with the counts and the per-line errors
+    """
+    parser = RecordParser(ingestion_format(content_type))
+    received = inserted = failed = 0
+    errors: List[IngestionErrorModel] = []
+    errors_truncated = False
+    chunk: List[CrudeOilDataModelPost] = []
+    chunk_lines: List[int] = []
+
+    def report_error(line_number: int, error: str):
+        nonlocal errors_truncated
+        if len(errors) < settings.INGEST_MAX_ERRORS:
+            errors.append(IngestionErrorModel(line=line_number, error=error))
+        else:
+            errors_truncated = True
+
+    async def flush():
+        nonlocal inserted, failed
+        if not chunk:
+            return
+        try:
+            skipped = await dal.insert_new_data_into_database(db, chunk)
+            inserted += len(chunk) - len(skipped)
+            failed += len(skipped)
+            for position in skipped:
+                report_error(chunk_lines[position], dal.DUPLICATE_RECORD_TEXT)
+        except HTTPException as he:
+            failed += len(chunk)
+            report_error(
+                chunk_lines[0],
+                f"Lines {chunk_lines[0]}-{chunk_lines[-1]} were not inserted. {he.detail}",
+            )
+        chunk.clear()
+        chunk_lines.clear()
+
+    async for line_number, raw_line in iter_lines(
+        body, max_line_bytes=settings.INGEST_MAX_LINE_BYTES
+    ):
+        if raw_line is None:
+            received += 1
+            failed += 1
+            report_error(
+                line_number,
+                f"Line is longer than {settings.INGEST_MAX_LINE_BYTES} bytes.",
+            )
+            continue
+        try:
+            record = parser.parse(raw_line)
+        except ValueError as e:
+            received += 1
+            failed += 1
+            report_error(line_number, str(e))
+            continue
+        if record is None:
+            continue
+        received += 1
+        chunk.append(record)
+        chunk_lines.append(line_number)
+        if len(chunk) >= chunk_size:
+            await flush()
+    await flush()
+
+    return IngestionSummaryModel(
+        received=received,
+        inserted=inserted,
+        failed=failed,
+        errors=errors,
+        errors_truncated=errors_truncated,
+    )
+
+
 async def get_crude_oil_from_uuid(
     db: AsyncSession, uuid: UUID
 ) -> Optional[CrudeOilDataResponseModel]:
@@ -103,29 +297,228 @@ async def get_crude_oil_from_uuid(
         raise
 
 
+async def lookup_crude_oil_imports(
+    db: AsyncSession, uuids: List[UUID]
+) -> LookupResultModel:
+    """
+    :param db: sqlalchemy async session object
+    :param uuids: uuids of the records, repeated uuids are looked up once
+    :return: LookupResultModel with the found records in the requested order and the missing uuids
+    """
+    uuids = list(dict.fromkeys(uuids))
+    rows = await dal.get_records_by_uuids(
+        db, uuids, chunk_size=settings.LOOKUP_CHUNK_SIZE
+    )
+    found = {row["uuid"]: row for row in rows}
+    try:
+        with timed_model("validation", "LookupResultModel"):
+            return LookupResultModel(
+                records=[found[uuid] for uuid in uuids if uuid in found],
+                missing=[uuid for uuid in uuids if uuid not in found],
+            )
+    except ValidationError as e:
+        logger.error(
+            "Cannot create lookup response model while using the values from db."
+            f"Please check for inconsistent data. {e}"
+        )
+        raise
+
+
+def _pack_cached_response(etag: str, body: bytes) -> bytes:
+    return etag.encode() + b"\n" + body
+
+
+def _unpack_cached_response(cached: bytes) -> Tuple[str, bytes]:
+    etag, body = cached.split(b"\n", 1)
+    return etag.decode(), body
+
+
+async def get_crude_oil_response_from_uuid(
+    db: AsyncSession, uuid: UUID, if_none_match: Optional[str] = None
+) -> Optional[Tuple[str, Optional[bytes]]]:
+    """
+    Read-through cached lookup by uuid, with conditional request support.
+
+    :param db: sqlalchemy async session object
+    :param uuid: uuid of the record
+    :param if_none_match: If-None-Match header of the request
+    :return: None if the record does not exist, else the ETag of the record and the
+        serialized SingleDataGetResponseModel, or None instead of it when the client's
+        copy is still current
+    """
+    key = str(uuid)
+    cached = await record_cache.get(key)
+    if cached is not None:
+        etag, body = _unpack_cached_response(cached)
+        return (etag, None) if etag_matches(if_none_match, etag) else (etag, body)
+    if if_none_match:
+        # Revalidating only needs the version, not the row.
+        version = await dal.get_record_version(db, uuid)
+        if version is None:
+            return None
+        etag = make_etag(uuid, version)
+        if etag_matches(if_none_match, etag):
+            return etag, None
+    token = record_cache.fill_token()
+    db_data = await dal.get_records_from_db(db, filters={"uuid": uuid})
+    if not db_data:
+        return None
+    etag = make_etag(uuid, db_data[0]["version"])
+    try:
+        with timed_model("validation", "CrudeOilDataResponseModel"):
+            record = CrudeOilDataResponseModel.model_validate(db_data[0])
+    except ValidationError as e:
+        logger.error(
+            "Cannot create response model while using the values from db."
+            f"Please check for inconsistent data. {e}"
+        )
+        raise
+    body = envelope_json(SingleDataGetResponseModel, record)
+    await record_cache.set(
+        key,
+        _pack_cached_response(etag, body),
+        token,
+        quiet_seconds=_replica_lag_bound(db),
+    )
+    return etag, body
+
+
+def _listing_digest(
+    filters: dict,
+    skip: int,
+    limit: int,
+    cursor: Optional[str],
+    count: CountMode,
+) -> str:
+    normalized = json.dumps(
+        {
+            "filters": filters,
+            # skip is ignored when paging with a cursor.
+            "skip": skip if cursor is None else 0,
+            "limit": limit,
+            "cursor": cursor,
+            "count": count.value,
+        },
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+async def get_paginated_crude_oil_imports_response(
+    db: AsyncSession,
+    filters: CrudeOilDataModelFilter,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    count: CountMode = CountMode.exact,
+    if_none_match: Optional[str] = None,
+) -> Tuple[str, Optional[bytes]]:
+    """
+    Read-through cached `get_paginated_crude_oil_imports`, with conditional request support.
+
+    :param if_none_match: If-None-Match header of the request, other parameters are the
+        ones of `get_paginated_crude_oil_imports`
+    :return: the ETag of the listing and the serialized PaginatedResponseModel, or None
+        instead of it when the client's copy is still current
+    """
+    query_filters = _query_filters(filters)
+    digest = _listing_digest(query_filters, skip, limit, cursor, count)
+    # Read before the data, so neither the ETag nor the cache key can ever be newer than
+    # the page they describe. The marker is shared by the workers, and a replica's one
+    # follows its own data.
+    marker = await dal.get_change_marker(db)
+    etag = make_etag(marker, digest[:16])
+    if etag_matches(if_none_match, etag):
+        return etag, None
+
+    key = f"{marker}:{digest}"
+    cached = await listing_cache.get(key)
+    if cached is not None:
+        return etag, cached
+    token = listing_cache.fill_token()
+    paginated_data = await get_paginated_crude_oil_imports(
+        db,
+        filters=filters,
+        skip=skip,
+        limit=limit,
+        cursor=cursor,
+        count=count,
+        change_marker=marker,
+    )
+    body = envelope_json(PaginatedResponseModel, paginated_data)
+    await listing_cache.set(key, body, token)
+    return etag, body
+
+
 async def get_paginated_crude_oil_imports(
     db: AsyncSession,
     filters: CrudeOilDataModelFilter,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
+    count: CountMode = CountMode.exact,
+    change_marker: Optional[str] = None,
 ) -> PaginatedCrudeOilDataModel:
-    # Only use set parameters for filtering.
-    query_filters = {
-        column: value
-        for column, value in filters.model_dump().items()
-        if value is not None
-    }
+    """
+    :param db: sqlalchemy async session object
+    :param filters: CrudeOilDataModelFilter, unset values are ignored
+    :param skip: offset based pagination, ignored when `cursor` is set
+    :param limit: maximum number of records in the page
+    :param cursor: opaque `next_cursor` from a previous page, enables keyset pagination
+    :param count: how the total is computed, `exact` (cached per change marker and
+        filter set), `estimated` (planner statistics) or `none` (not computed)
+    :param change_marker: `dal.get_change_marker` read before the page, read here when
+        not given and the total is exact
+    :return: PaginatedCrudeOilDataModel with a `next_cursor` when more rows may follow
+    """
+    query_filters = _query_filters(filters)
+    after_id = None
+    if cursor is not None:
+        after_id = decode_cursor(cursor, query_filters)
+        skip = 0
 
-    paginated_data, total = await asyncio.gather(
-        dal.get_records_from_db(db=db, skip=skip, limit=limit, filters=query_filters),
-        dal.count_records_in_db(db, filters=query_filters),
-    )
+    def read_page():
+        return dal.get_records_from_db(
+            db=db, skip=skip, limit=limit, filters=query_filters, after_id=after_id
+        )
+
+    total, total_estimated = None, False
+    if count == CountMode.exact:
+        if change_marker is None:
+            change_marker = await dal.get_change_marker(db)
+        cache_key = (change_marker, *_count_cache_key(query_filters))
+        total = count_cache.get(cache_key)
+        if total is None:
+            paginated_data, total = await asyncio.gather(
+                read_page(), _count_records_on_own_connection(db, query_filters)
+            )
+            count_cache.set(cache_key, total)
+        else:
+            paginated_data = await read_page()
+    elif count == CountMode.estimated:
+        paginated_data = await read_page()
+        total = await dal.estimate_records_in_db(db, filters=query_filters)
+        total_estimated = True
+    else:
+        paginated_data = await read_page()
     try:
         # Set metadata
-        metadata = PaginatedMetaData(**{"total": total, "skip": skip, "limit": limit})
-        return PaginatedCrudeOilDataModel(
-            metadata=metadata, paginated_data=paginated_data
+        metadata = PaginatedMetaData(
+            **{
+                "total": total,
+                "total_estimated": total_estimated,
+                "skip": skip,
+                "limit": limit,
+                "next_cursor": next_cursor_for_page(
+                    paginated_data, limit, query_filters
+                ),
+            }
         )
+        with timed_model("validation", "PaginatedCrudeOilDataModel"):
+            return PaginatedCrudeOilDataModel(
+                metadata=metadata, paginated_data=paginated_data
+            )
     except ValidationError as e:
         logger.error(
             "Cannot create Paginated response model while using the values from db."
@@ -136,6 +529,88 @@ async def get_paginated_crude_oil_imports(
         raise
 
 
+async def export_crude_oil_imports(
+    filters: CrudeOilDataModelFilter,
+    serializer: ExportSerializer,
+    sessionmaker: async_sessionmaker = SessionLocal,
+) -> AsyncIterator[bytes]:
+    """
+    Streams every record matching the filters, serialized chunk by chunk.
+    Uses its own session: the response body is produced after the request
+    dependencies, including their db session, are closed.
+
+    :param filters: CrudeOilDataModelFilter, unset values are ignored
+    :param serializer: ExportSerializer of the requested format
+    :param sessionmaker: opens the session, of the primary or of a read replica
+    :return: async iterator of serialized chunks
+    """
+    query_filters = _query_filters(filters)
+    try:
+        async with sessionmaker() as db:
+            yield serializer.header()
+            async for rows in dal.stream_records_from_db(
+                db, filters=query_filters, batch_size=settings.EXPORT_BATCH_SIZE
+            ):
+                with timed_model("serialization", "export"):
+                    chunk = serializer.serialize(rows)
+                yield chunk
+            yield serializer.footer()
+    except Exception as e:
+        # The status line is already sent, aborting the stream is the only way
+        # to tell the client the export is incomplete.
+        logger.error(f"Export interrupted. {e}")
+        raise
+
+
+async def get_aggregated_crude_oil_imports(
+    db: AsyncSession,
+    filters: CrudeOilDataModelFilter,
+    group_by: List[AggregateDimension],
+    metrics: List[AggregateMetric],
+) -> AggregatedCrudeOilDataModel:
+    """
+    :param db: sqlalchemy async session object
+    :param filters: CrudeOilDataModelFilter, unset values are ignored
+    :param group_by: dimensions to group by, an empty list aggregates all the matching records
+    :param metrics: aggregate functions computed on quantity for every group
+    :return: AggregatedCrudeOilDataModel, one row per group keyed by the API field names
+    """
+    query_filters = _query_filters(filters)
+    # Keep the requested order, drop repeated values.
+    group_by = list(dict.fromkeys(group_by))
+    metrics = list(dict.fromkeys(metrics))
+
+    rows = await dal.aggregate_records_in_db(
+        db,
+        group_by=[dimension.name for dimension in group_by],
+        metrics=[metric.value for metric in metrics],
+        filters=query_filters,
+    )
+    formatted_rows = []
+    for row in rows:
+        formatted_row = {dimension.value: row[dimension.name] for dimension in group_by}
+        for metric in metrics:
+            value = row[metric.value]
+            # avg comes back as a postgres numeric.
+            formatted_row[metric.value] = (
+                float(value) if isinstance(value, Decimal) else value
+            )
+        formatted_rows.append(formatted_row)
+    try:
+        with timed_model("validation", "AggregatedCrudeOilDataModel"):
+            return AggregatedCrudeOilDataModel(
+                group_by=[dimension.value for dimension in group_by],
+                metrics=[metric.value for metric in metrics],
+                rows=formatted_rows,
+            )
+    except ValidationError as e:
+        logger.error(
+            "Cannot create aggregate response model while using the values from db."
+            f"Please check for inconsistent data. {e}"
+        )
+        raise
+
+
 async def patch_crude_oil_import_from_uuid(
     db: AsyncSession, uuid: UUID, patch_data_model: CrudeOilDataModelPatch
 ) -> Optional[CrudeOilDataResponseModel]:
@@ -151,6 +626,7 @@ async def patch_crude_oil_import_from_uuid(
         updated_row = await dal.update_crude_oil_imports(
             db, filters=[CrudeOilImportsSchema.uuid == uuid], update_data=updates
         )
+        await record_cache.invalidate(str(uuid))
         if not updated_row:
             return None
         updated_row = CrudeOilDataResponseModel.model_validate(updated_row)
@@ -186,6 +662,7 @@ async def put_update_crude_oil_import_from_uuid(
         updated_row = await dal.update_crude_oil_imports(
             db, filters=[CrudeOilImportsSchema.uuid == uuid], update_data=updates
         )
+        await record_cache.invalidate(str(uuid))
         if not updated_row:
             return None
         updated_row = CrudeOilDataResponseModel.model_validate(updated_row)
@@ -213,6 +690,7 @@ async def delete_data_from_uuid(
         deleted_row = await dal.delete_crude_oil_imports(
             db, filters=[CrudeOilImportsSchema.uuid == uuid]
         )
+        await record_cache.invalidate(str(uuid))
         if not deleted_row:
             return None
         return CrudeOilDataResponseModel.model_validate(deleted_row)
@@ -230,3 +708,71 @@ async def delete_data_from_uuid(
             f"Please check for inconsistent data. {e}"
         )
         raise
+
+
+def _bulk_filters(filters: CrudeOilDataModelFilter) -> dict:
+    query_filters = _query_filters(filters)
+    if not query_filters:
+        # An empty filter set matches every record, most likely a client mistake.
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="At least one filter is required.",
+        )
+    return query_filters
+
+
+async def patch_crude_oil_imports_by_filter(
+    db: AsyncSession,
+    filters: CrudeOilDataModelFilter,
+    patch_data_model: CrudeOilDataModelPatch,
+    dry_run: bool = False,
+    max_rows: Optional[int] = None,
+) -> BulkChangeSummaryModel:
+    """
+    :param db: sqlalchemy async session object
+    :param filters: CrudeOilDataModelFilter selecting the records, at least one is required
+    :param patch_data_model: CrudeOilDataModelPatch data model containing patch values
+    :param dry_run: only count the matching records
+    :param max_rows: nothing is changed when more records match
+    :return: BulkChangeSummaryModel with the number of updated records
+    """
+    query_filters = _bulk_filters(filters)
+    updates = {k: v for k, v in patch_data_model.model_dump().items() if v is not None}
+    if not updates:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="No values to update."
+        )
+    if dry_run:
+        affected = await dal.count_records_in_db(db, filters=query_filters)
+        return BulkChangeSummaryModel(affected=affected, dry_run=True)
+    updated = await dal.update_crude_oil_imports_by_filter(
+        db, update_data=updates, filters=query_filters, max_rows=max_rows
+    )
+    if updated:
+        await record_cache.invalidate(*[str(uuid) for uuid in updated])
+    return BulkChangeSummaryModel(affected=len(updated))
+
+
+async def delete_crude_oil_imports_by_filter(
+    db: AsyncSession,
+    filters: CrudeOilDataModelFilter,
+    dry_run: bool = False,
+    max_rows: Optional[int] = None,
+) -> BulkChangeSummaryModel:
+    """
+    :param db: sqlalchemy async session object
+    :param filters: CrudeOilDataModelFilter selecting the records, at least one is required
+    :param dry_run: only count the matching records
+    :param max_rows: nothing is deleted when more records match
+    :return: BulkChangeSummaryModel with the number of deleted records
+    """
+    query_filters = _bulk_filters(filters)
+    if dry_run:
+        affected = await dal.count_records_in_db(db, filters=query_filters)
+        return BulkChangeSummaryModel(affected=affected, dry_run=True)
+    deleted = await dal.delete_crude_oil_imports_by_filter(
+        db, filters=query_filters, max_rows=max_rows
+    )
+    if deleted:
+        await record_cache.invalidate(*[str(uuid) for uuid in deleted])
+    return BulkChangeSummaryModel(affected=len(deleted))
@@ -0,0 +1,28 @@
+from typing import Optional
+
+
+def make_etag(*parts) -> str:
+    """
+    Strong entity tag made of the given parts, e.g. `"<uuid>.<version>"`.
+    """
+    return '"' + ".".join(str(part) for part in parts) + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    If-None-Match uses the weak comparison: `W/` prefixes are ignored.
+
+    :param if_none_match: raw If-None-Match header, a list of entity tags or `*`
+    :param etag: current entity tag of the resource
+    """
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
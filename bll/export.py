@@ -0,0 +1,183 @@
+import csv
+import io
+import json
+from abc import ABC, abstractmethod
+from typing import Dict, List, Sequence
+
+from fastapi import HTTPException, status
+from sqlalchemy import Row
+
+from dal.crude_oil_imports import EXPORT_COLUMNS
+from models.request_models import ExportFormat
+from models.response_models import CrudeOilDataResponseModel
+
+# Same field names as the JSON responses, e.g. originName.
+EXPORT_FIELDS: List[str] = [
+    CrudeOilDataResponseModel.model_fields[column].alias or column
+    for column in EXPORT_COLUMNS
+]
+
+EXPORT_MEDIA_TYPES = {
+    ExportFormat.ndjson: "application/x-ndjson",
+    ExportFormat.csv: "text/csv",
+    ExportFormat.arrow: "application/vnd.apache.arrow.stream",
+    ExportFormat.parquet: "application/vnd.apache.parquet",
+}
+
+
+class ExportSerializer(ABC):
+    """
+    Turns batches of result tuples, in the order of EXPORT_COLUMNS, into response bytes.
+    """
+
+    def header(self) -> bytes:
+        return b""
+
+    @abstractmethod
+    def serialize(self, rows: Sequence[Row]) -> bytes:
+        """
+        :return: the bytes of a batch of rows, between the header and the footer
+        """
+
+    def footer(self) -> bytes:
+        return b""
+
+
+class NdjsonSerializer(ExportSerializer):
+    def serialize(self, rows: Sequence[Row]) -> bytes:
+        return "".join(
+            json.dumps(dict(zip(EXPORT_FIELDS, row)), default=str) + "\n"
+            for row in rows
+        ).encode()
+
+
+class CsvSerializer(ExportSerializer):
+    def header(self) -> bytes:
+        return (",".join(EXPORT_FIELDS) + "\r\n").encode()
+
+    def serialize(self, rows: Sequence[Row]) -> bytes:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        return buffer.getvalue().encode()
+
+
+class _GrowingDictionary:
+    """
+    Dictionary of a string column shared by all the batches of an export. New values are
+    appended, so each batch only adds a delta to the dictionary the client already has.
+    """
+
+    def __init__(self):
+        self.positions: Dict[str, int] = {}
+        self.values: List[str] = []
+
+    def encode(self, pa, values: Sequence[str]):
+        indices = []
+        for value in values:
+            position = self.positions.get(value)
+            if position is None:
+                position = self.positions[value] = len(self.values)
+                self.values.append(value)
+            indices.append(position)
+        return pa.DictionaryArray.from_arrays(
+            pa.array(indices, type=pa.int32()), pa.array(self.values, type=pa.string())
+        )
+
+
+class ArrowSerializer(ExportSerializer):
+    """
+    Arrow IPC stream, or parquet, with typed columns. The repeated string dimensions
+    (origin, destination, grade names...) are dictionary encoded.
+    """
+
+    DICTIONARY_COLUMNS = {
+        "origin_name",
+        "origin_type_name",
+        "destination_name",
+        "destination_type_name",
+        "grade_name",
+    }
+
+    def __init__(self, parquet: bool = False):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise HTTPException(
+                status_code=status.HTTP_501_NOT_IMPLEMENTED,
+                detail="Arrow and parquet exports need the pyarrow package.",
+            )
+        self.pa = pa
+        column_types = {
+            "year": pa.int16(),
+            "month": pa.int8(),
+            "quantity": pa.int32(),
+            "uuid": pa.string(),
+        }
+        dictionary_type = pa.dictionary(pa.int32(), pa.string())
+        self.schema = pa.schema(
+            [
+                pa.field(
+                    field,
+                    (
+                        dictionary_type
+                        if column in self.DICTIONARY_COLUMNS
+                        else column_types[column]
+                    ),
+                    nullable=False,
+                )
+                for column, field in zip(EXPORT_COLUMNS, EXPORT_FIELDS)
+            ]
+        )
+        self.dictionaries = {
+            position: _GrowingDictionary()
+            for position, column in enumerate(EXPORT_COLUMNS)
+            if column in self.DICTIONARY_COLUMNS
+        }
+        self.sink = io.BytesIO()
+        if parquet:
+            self.writer = pq.ParquetWriter(self.sink, self.schema)
+        else:
+            self.writer = pa.ipc.new_stream(
+                self.sink,
+                self.schema,
+                options=pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True),
+            )
+
+    def _drain(self) -> bytes:
+        data = self.sink.getvalue()
+        self.sink.seek(0)
+        self.sink.truncate()
+        return data
+
+    def header(self) -> bytes:
+        return self._drain()
+
+    def serialize(self, rows: Sequence[Row]) -> bytes:
+        pa = self.pa
+        arrays = []
+        for position, (values, field) in enumerate(zip(zip(*rows), self.schema)):
+            if position in self.dictionaries:
+                arrays.append(self.dictionaries[position].encode(pa, values))
+            elif field.type == pa.string():
+                arrays.append(
+                    pa.array([str(value) for value in values], type=field.type)
+                )
+            else:
+                arrays.append(pa.array(values, type=field.type))
+        self.writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=self.schema))
+        return self._drain()
+
+    def footer(self) -> bytes:
+        self.writer.close()
+        return self._drain()
+
+
+def export_serializer(fmt: ExportFormat) -> ExportSerializer:
+    if fmt == ExportFormat.csv:
+        return CsvSerializer()
+    if fmt == ExportFormat.arrow:
+        return ArrowSerializer()
+    if fmt == ExportFormat.parquet:
+        return ArrowSerializer(parquet=True)
+    return NdjsonSerializer()
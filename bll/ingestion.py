@@ -0,0 +1,116 @@
+import csv
+from typing import AsyncIterator, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from pydantic import ValidationError
+
+from models.request_models import CrudeOilDataModelPost
+
+NDJSON_CONTENT_TYPES = {
+    "application/x-ndjson",
+    "application/ndjson",
+    "application/jsonl",
+}
+CSV_CONTENT_TYPES = {"text/csv", "application/csv"}
+
+
+def ingestion_format(content_type: Optional[str]) -> str:
+    """
+    :param content_type: Content-Type header of the request
+    :return: "ndjson" or "csv", else HTTPException(415) is raised
+    """
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    if media_type in NDJSON_CONTENT_TYPES:
+        return "ndjson"
+    if media_type in CSV_CONTENT_TYPES:
+        return "csv"
+    raise HTTPException(
+        status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+        detail="Content-Type must be application/x-ndjson or text/csv.",
+    )
+
+
+async def iter_lines(
+    body: AsyncIterator[bytes], max_line_bytes: int
+) -> AsyncIterator[Tuple[int, Optional[bytes]]]:
+    """
+    Splits a chunked request body into lines without buffering more than one line.
+
+    :param body: request body chunks, e.g. `request.stream()`
+    :param max_line_bytes: longer lines are skipped and yielded as None
+    :return: async iterator of (1 based line number, line or None when too long)
+    """
+    buffer = b""
+    line_number = 0
+    skipping = False
+    async for chunk in body:
+        *complete_lines, rest = chunk.split(b"\n")
+        for part in complete_lines:
+            line, buffer = buffer + part, b""
+            line_number += 1
+            if skipping or len(line) > max_line_bytes:
+                skipping = False
+                yield line_number, None
+            else:
+                yield line_number, line
+        if skipping:
+            continue
+        buffer += rest
+        if len(buffer) > max_line_bytes:
+            # Drop the rest of an oversized line as it arrives instead of buffering it.
+            buffer = b""
+            skipping = True
+    if skipping:
+        yield line_number + 1, None
+    elif buffer:
+        yield line_number + 1, buffer
+
+
+class RecordParser:
+    """
+    Turns ndjson or csv lines into validated CrudeOilDataModelPost records.
+    The first non empty csv line is the header, columns are the `data.csv` ones
+    (`year`, `month`, `originName`, ...), unknown columns are ignored.
+    """
+
+    def __init__(self, fmt: str):
+        self.fmt = fmt
+        self.header: Optional[List[str]] = None
+
+    def parse(self, raw_line: bytes) -> Optional[CrudeOilDataModelPost]:
+        """
+        :return: the record, None for blank and header lines. Raises ValueError on invalid lines.
+        """
+        try:
+            line = raw_line.decode("utf-8-sig").rstrip("\r")
+        except UnicodeDecodeError as e:
+            raise ValueError(f"Invalid UTF-8: {e}")
+        if not line.strip():
+            return None
+        if self.fmt == "ndjson":
+            return self._validate(
+                lambda: CrudeOilDataModelPost.model_validate_json(line)
+            )
+        values = next(csv.reader([line]))
+        if self.header is None:
+            self.header = [column.strip() for column in values]
+            return None
+        if len(values) != len(self.header):
+            raise ValueError(f"Expected {len(self.header)} columns, got {len(values)}.")
+        return self._validate(
+            lambda: CrudeOilDataModelPost.model_validate(dict(zip(self.header, values)))
+        )
+
+    @staticmethod
+    def _validate(build) -> CrudeOilDataModelPost:
+        try:
+            return build()
+        except ValidationError as e:
+            raise ValueError(
+                "; ".join(
+                    ": ".join(
+                        filter(None, [".".join(map(str, error["loc"])), error["msg"]])
+                    )
+                    for error in e.errors()
+                )
+            )
@@ -0,0 +1,64 @@
+import base64
+import hashlib
+import json
+import logging
+from typing import Optional
+
+from fastapi import HTTPException, status
+
+logging.basicConfig(level=logging.ERROR)
+logger = logging.getLogger(__name__)
+
+
+def _filters_fingerprint(filters: dict) -> str:
+    """
+    Short, stable digest of the applied filters. A cursor is only valid for the
+    filter set it was issued for, otherwise the seek would land on an unrelated row.
+    """
+    normalized = json.dumps(filters, sort_keys=True, default=str)
+    return hashlib.sha256(normalized.encode()).hexdigest()[:16]
+
+
+def encode_cursor(last_id: int, filters: dict) -> str:
+    """
+    :param last_id: sort key (primary key) of the last row on the current page
+    :param filters: filters used to produce the current page
+    :return: opaque url-safe cursor pointing right after `last_id`
+    """
+    payload = json.dumps(
+        {"id": last_id, "f": _filters_fingerprint(filters)}, separators=(",", ":")
+    )
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, filters: dict) -> int:
+    """
+    :param cursor: cursor previously returned as `next_cursor`
+    :param filters: filters of the current request
+    :return: sort key to seek after, else HTTPException(400) is raised
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        last_id = int(payload["id"])
+        fingerprint = payload["f"]
+    except Exception as e:
+        logger.error(f"Cannot decode pagination cursor. {e}")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor."
+        )
+    if fingerprint != _filters_fingerprint(filters):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor does not match the requested filters.",
+        )
+    return last_id
+
+
+def next_cursor_for_page(rows: list, limit: int, filters: dict) -> Optional[str]:
+    """
+    A full page means there may be more rows after it, an incomplete page is the last one.
+    """
+    if not rows or len(rows) < limit:
+        return None
+    return encode_cursor(rows[-1]["id"], filters)
@@ -0,0 +1,25 @@
+from typing import Any, Type
+
+from pydantic import BaseModel
+
+from metrics.instrumentation import timed_model
+
+
+def json_bytes(model: BaseModel) -> bytes:
+    """
+    JSON of `model` with the API field names, written by pydantic-core straight to
+    bytes rather than through an intermediate str.
+    """
+    return model.__pydantic_serializer__.to_json(model, by_alias=True)
+
+
+def envelope_json(response_model: Type[BaseModel], data: Any) -> bytes:
+    """
+    Serializes `data` wrapped in `response_model`, e.g. DataCreatedResponseModel, with
+    its default status and message.
+
+    `data` must already be validated, e.g. CrudeOilDataResponseModel instances built by
+    the bll: the envelope is constructed without validating it again.
+    """
+    with timed_model("serialization", response_model.__name__):
+        return json_bytes(response_model.model_construct(data=data))
@@ -0,0 +1,141 @@
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Optional
+
+
+class CacheBackend(ABC):
+    """
+    Byte store behind the response caches. Implementations must be safe to share
+    between the coroutines of one worker.
+    """
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[bytes]:
+        """
+        :return: the value of `key`, None when it is missing or expired
+        """
+
+    @abstractmethod
+    async def set(self, key: str, value: bytes, ttl_seconds: float) -> None:
+        """
+        Stores `value` under `key` for `ttl_seconds`.
+        """
+
+    @abstractmethod
+    async def delete(self, *keys: str) -> None:
+        """
+        Removes `keys`, missing ones are ignored.
+        """
+
+    @abstractmethod
+    async def clear(self) -> None:
+        """
+        Removes every entry.
+        """
+
+    def size(self) -> Optional[int]:
+        """
+        Number of entries, None when the backend cannot tell cheaply.
+        """
+        return None
+
+    def size_bytes(self) -> Optional[int]:
+        """
+        Total size of the keys and values, None when the backend cannot tell cheaply.
+        """
+        return None
+
+
+class InMemoryCacheBackend(CacheBackend):
+    """
+    LRU with per-entry expiry, private to the worker process.
+    Bounded by the number of entries, the total size of keys and values, or both.
+    """
+
+    def __init__(
+        self, max_entries: Optional[int] = None, max_bytes: Optional[int] = None
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._entries: OrderedDict = OrderedDict()
+
+    @staticmethod
+    def _entry_bytes(key: str, value: bytes) -> int:
+        return len(key) + len(value)
+
+    def _pop(self, key: str) -> None:
+        _, value = self._entries.pop(key)
+        self.bytes -= self._entry_bytes(key, value)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            self._pop(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: bytes, ttl_seconds: float) -> None:
+        if key in self._entries:
+            self._pop(key)
+        entry_bytes = self._entry_bytes(key, value)
+        if self.max_bytes is not None and entry_bytes > self.max_bytes:
+            return
+        self._entries[key] = (time.monotonic() + ttl_seconds, value)
+        self.bytes += entry_bytes
+        while (
+            self.max_entries is not None and len(self._entries) > self.max_entries
+        ) or (self.max_bytes is not None and self.bytes > self.max_bytes):
+            self._pop(next(iter(self._entries)))
+
+    async def delete(self, *keys: str) -> None:
+        for key in keys:
+            if key in self._entries:
+                self._pop(key)
+
+    async def clear(self) -> None:
+        self._entries.clear()
+        self.bytes = 0
+
+    def size(self) -> Optional[int]:
+        return len(self._entries)
+
+    def size_bytes(self) -> Optional[int]:
+        return self.bytes
+
+
+class RedisCacheBackend(CacheBackend):
+    """
+    Shared by all the workers through any Redis protocol compatible server.
+    Eviction is up to the server, configure it with `maxmemory-policy allkeys-lru`.
+    """
+
+    def __init__(self, url: str, prefix: str):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("The redis cache backend needs the redis package.")
+        self.client = redis.from_url(url)
+        self.prefix = prefix
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}:{key}"
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.client.get(self._key(key))
+
+    async def set(self, key: str, value: bytes, ttl_seconds: float) -> None:
+        await self.client.set(self._key(key), value, px=max(1, int(ttl_seconds * 1000)))
+
+    async def delete(self, *keys: str) -> None:
+        if keys:
+            await self.client.delete(*[self._key(key) for key in keys])
+
+    async def clear(self) -> None:
+        async for key in self.client.scan_iter(match=f"{self.prefix}:*"):
+            await self.client.delete(key)
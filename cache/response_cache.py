@@ -0,0 +1,93 @@
+import time
+from typing import Optional
+
+from cache.backends import CacheBackend, InMemoryCacheBackend, RedisCacheBackend
+
+
+class ResponseCache:
+    """
+    Serialized responses keyed by a string, with hit and miss counters.
+
+    Reads go through `fill_token()` / `set()`: an entry read from the database before an
+    invalidation of this worker is not stored after it, so a slow reader cannot put
+    back a value a concurrent write just invalidated. Values read from a lagging
+    replica are not stored for `quiet_seconds` after an invalidation either.
+    """
+
+    def __init__(self, name: str, backend: Optional[CacheBackend], ttl_seconds: float):
+        self.name = name
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._invalidations = 0
+        self._invalidated_at = float("-inf")
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    async def get(self, key: str) -> Optional[bytes]:
+        if self.backend is None:
+            return None
+        value = await self.backend.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def fill_token(self) -> int:
+        return self._invalidations
+
+    async def set(
+        self, key: str, value: bytes, token: int, quiet_seconds: float = 0.0
+    ) -> None:
+        if self.backend is None or token != self._invalidations:
+            return
+        if time.monotonic() - self._invalidated_at < quiet_seconds:
+            return
+        await self.backend.set(key, value, self.ttl_seconds)
+
+    async def invalidate(self, *keys: str) -> None:
+        self._invalidations += 1
+        self._invalidated_at = time.monotonic()
+        if self.backend is not None:
+            await self.backend.delete(*keys)
+
+    async def clear(self) -> None:
+        self._invalidations += 1
+        self._invalidated_at = time.monotonic()
+        if self.backend is not None:
+            await self.backend.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else None,
+            "entries": self.backend.size() if self.backend is not None else 0,
+            "bytes": self.backend.size_bytes() if self.backend is not None else 0,
+        }
+
+
+def build_cache_backend(
+    kind: str,
+    redis_url: str,
+    prefix: str,
+    max_entries: Optional[int] = None,
+    max_bytes: Optional[int] = None,
+) -> Optional[CacheBackend]:
+    """
+    :param kind: "memory", "redis" or "none"
+    :param max_entries: bound of the memory backend, the redis server evicts by itself
+    :param max_bytes: bound of the memory backend, the redis server evicts by itself
+    :return: the configured backend, None when caching is disabled
+    """
+    if kind == "memory":
+        return InMemoryCacheBackend(max_entries=max_entries, max_bytes=max_bytes)
+    if kind == "redis":
+        return RedisCacheBackend(url=redis_url, prefix=prefix)
+    return None
@@ -0,0 +1,270 @@
+"""
+Incremental decoders of compressed request bodies and encoders of response bodies,
+for the `Content-Encoding` codings `gzip` and `zstd`.
+
+zstd needs the optional zstandard package, without it only gzip is available.
+"""
+
+import zlib
+from typing import List, Optional
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Largest piece of decompressed output produced at once.
+PIECE_BYTES = 64 * 1024
+
+
+class BodyTooLarge(Exception):
+    pass
+
+
+class MalformedBody(Exception):
+    pass
+
+
+def available_encodings() -> List[str]:
+    """
+    :return: the supported codings, in order of preference
+    """
+    return ["zstd", "gzip"] if zstandard is not None else ["gzip"]
+
+
+class GzipDecoder:
+    """
+    Decodes a gzip body of one or more members, concatenated members decode to the
+    concatenation of their contents, as with gunzip.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+        self.max_bytes = max_bytes
+        self.total = 0
+
+    def decompress(self, data: bytes) -> List[bytes]:
+        """
+        :return: the output of `data`, in pieces of PIECE_BYTES at most. Stops with
+            BodyTooLarge as soon as the total output exceeds `max_bytes`, and with
+            MalformedBody on bytes which are not part of a gzip member.
+        """
+        pieces = []
+        try:
+            while data:
+                if self.decompressor.eof:
+                    # The bytes after the end of a member start the next one.
+                    self.decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+                piece = self.decompressor.decompress(data, PIECE_BYTES)
+                self.total += len(piece)
+                if self.total > self.max_bytes:
+                    raise BodyTooLarge()
+                if piece:
+                    pieces.append(piece)
+                decompressor = self.decompressor
+                data = decompressor.unconsumed_tail or decompressor.unused_data
+        except zlib.error as e:
+            raise MalformedBody(str(e))
+        return pieces
+
+    def finish(self) -> List[bytes]:
+        if not self.decompressor.eof:
+            raise MalformedBody("truncated gzip body")
+        return []
+
+
+class _BoundedSink:
+    """
+    Output of the zstd stream writer, refusing more than `max_bytes` in total, so the
+    decompression of a small input stops as soon as it is too large.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.total = 0
+        self.pieces: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self.total += len(data)
+        if self.total > self.max_bytes:
+            raise BodyTooLarge()
+        self.pieces.append(bytes(data))
+        return len(data)
+
+
+ZSTD_MAGIC = 0xFD2FB528
+# Skippable frames use the 16 magic numbers from 0x184D2A50 to 0x184D2A5F.
+ZSTD_SKIPPABLE_MAGIC = 0x184D2A50
+ZSTD_SKIPPABLE_MASK = 0xFFFFFFF0
+
+
+class _ZstdFrameTracker:
+    """
+    Follows the frame and block headers of a zstd body, skipping the block contents, to
+    tell whether the body ends where a frame does. Only the bytes of a header are kept.
+    """
+
+    def __init__(self):
+        self.field = bytearray()
+        self.field_size = 4
+        self.skip = 0
+        self.step = self._magic
+        self.checksum = False
+
+    @property
+    def at_frame_end(self) -> bool:
+        return self.step == self._magic and not self.field and not self.skip
+
+    def feed(self, data: bytes) -> None:
+        view = memoryview(data)
+        while view:
+            if self.skip:
+                skipped = min(self.skip, len(view))
+                self.skip -= skipped
+                view = view[skipped:]
+                continue
+            taken = min(self.field_size - len(self.field), len(view))
+            self.field += view[:taken]
+            view = view[taken:]
+            if len(self.field) == self.field_size:
+                field = bytes(self.field)
+                self.field.clear()
+                self.step(field)
+
+    def _expect(self, field_size: int, step) -> None:
+        self.field_size = field_size
+        self.step = step
+
+    def _magic(self, field: bytes) -> None:
+        magic = int.from_bytes(field, "little")
+        if magic == ZSTD_MAGIC:
+            self._expect(1, self._frame_header)
+        elif magic & ZSTD_SKIPPABLE_MASK == ZSTD_SKIPPABLE_MAGIC:
+            self._expect(4, self._skippable_size)
+        else:
+            raise MalformedBody("unknown zstd frame")
+
+    def _frame_header(self, field: bytes) -> None:
+        descriptor = field[0]
+        single_segment = bool(descriptor & 0x20)
+        self.checksum = bool(descriptor & 0x04)
+        window_size = 0 if single_segment else 1
+        dictionary_id_size = (0, 1, 2, 4)[descriptor & 0x03]
+        content_size_size = (int(single_segment), 2, 4, 8)[descriptor >> 6]
+        self.skip = window_size + dictionary_id_size + content_size_size
+        self._expect(3, self._block_header)
+
+    def _block_header(self, field: bytes) -> None:
+        header = int.from_bytes(field, "little")
+        last_block, block_type, block_size = header & 1, (header >> 1) & 3, header >> 3
+        # An RLE block holds the single byte it repeats.
+        self.skip = 1 if block_type == 1 else block_size
+        if last_block:
+            self.skip += 4 if self.checksum else 0
+            self._expect(4, self._magic)
+
+    def _skippable_size(self, field: bytes) -> None:
+        self.skip = int.from_bytes(field, "little")
+        self._expect(4, self._magic)
+
+
+class ZstdDecoder:
+    """
+    Decodes a zstd body of one or more frames. The stream writer bounds the output but
+    cannot tell a complete frame from a truncated one, a _ZstdFrameTracker does.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.sink = _BoundedSink(max_bytes)
+        self.writer = zstandard.ZstdDecompressor().stream_writer(
+            self.sink, write_size=PIECE_BYTES, write_return_read=True
+        )
+        self.frames = _ZstdFrameTracker()
+
+    @property
+    def total(self) -> int:
+        return self.sink.total
+
+    def decompress(self, data: bytes) -> List[bytes]:
+        try:
+            self.writer.write(data)
+        except zstandard.ZstdError as e:
+            raise MalformedBody(str(e))
+        self.frames.feed(data)
+        pieces, self.sink.pieces = self.sink.pieces, []
+        return pieces
+
+    def finish(self) -> List[bytes]:
+        if not self.frames.at_frame_end:
+            raise MalformedBody("truncated zstd body")
+        return []
+
+
+def request_decoder(encoding: str, max_bytes: int):
+    """
+    :param encoding: value of the Content-Encoding header
+    :return: a decoder of the body, None if the coding is not supported
+    """
+    if encoding in ("gzip", "x-gzip"):
+        return GzipDecoder(max_bytes)
+    if encoding == "zstd" and zstandard is not None:
+        return ZstdDecoder(max_bytes)
+    return None
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """
+    :param accept_encoding: value of the Accept-Encoding header
+    :return: the supported coding the client prefers, the server's preference between
+        equal weights, None for the identity
+    """
+    if not accept_encoding:
+        return None
+    weights = {}
+    for item in accept_encoding.split(","):
+        coding, _, parameters = item.strip().partition(";")
+        weight = 1.0
+        parameter, _, value = parameters.strip().partition("=")
+        if parameter.strip() == "q":
+            try:
+                weight = float(value)
+            except ValueError:
+                weight = 0.0
+        weights[coding.strip().lower()] = weight
+    candidates = [
+        (weights.get(coding, weights.get("*", 0.0)), -preference, coding)
+        for preference, coding in enumerate(available_encodings())
+    ]
+    weight, _, coding = max(candidates)
+    return coding if weight > 0 else None
+
+
+class GzipEncoder:
+    def __init__(self, level: int):
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        # Flushed every chunk, a streamed response reaches the client as it is produced.
+        return self.compressor.compress(data) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes) -> bytes:
+        return self.compressor.compress(data) + self.compressor.flush()
+
+
+class ZstdEncoder:
+    def __init__(self, level: int):
+        self.compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self.compressor.compress(data) + self.compressor.flush(
+            zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        )
+
+    def finish(self, data: bytes) -> bytes:
+        return self.compressor.compress(data) + self.compressor.flush()
+
+
+def response_encoder(encoding: str, gzip_level: int, zstd_level: int):
+    if encoding == "zstd":
+        return ZstdEncoder(zstd_level)
+    return GzipEncoder(gzip_level)
@@ -0,0 +1,167 @@
+from collections import deque
+from typing import Collection
+
+from fastapi import HTTPException, status
+from starlette.datastructures import Headers, MutableHeaders
+
+from content_encoding.coding import (
+    BodyTooLarge,
+    MalformedBody,
+    negotiate_encoding,
+    request_decoder,
+    response_encoder,
+)
+
+
+class RequestDecompressionMiddleware:
+    """
+    ASGI middleware decoding the bodies of requests to `paths` sent with a
+    `Content-Encoding`, as they are received. The route reads the decoded body, in
+    pieces of 64 KiB at most, and no longer sees the Content-Encoding header.
+
+    Errors surface when the route reads the body, as an HTTPException: 415 for an
+    unsupported coding, 413 beyond `max_bytes` of decoded body, 400 for a corrupt one.
+    """
+
+    def __init__(self, app, paths: Collection[str], max_bytes: int):
+        self.app = app
+        self.paths = set(paths)
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        encoding = Headers(scope=scope).get("content-encoding", "").strip().lower()
+        if encoding in ("", "identity"):
+            await self.app(scope, receive, send)
+            return
+        scope = dict(scope)
+        scope["headers"] = [
+            (name, value)
+            for name, value in scope["headers"]
+            if name not in (b"content-encoding", b"content-length")
+        ]
+        decoder = request_decoder(encoding, self.max_bytes)
+        pending = deque()
+        finished = False
+
+        async def receive_decoded():
+            nonlocal finished
+            if decoder is None:
+                raise HTTPException(
+                    status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                    detail=f"Unsupported Content-Encoding: {encoding}.",
+                )
+            while not pending and not finished:
+                message = await receive()
+                if message["type"] != "http.request":
+                    return message
+                try:
+                    pending.extend(decoder.decompress(message.get("body", b"")))
+                    if not message.get("more_body", False):
+                        pending.extend(decoder.finish())
+                        finished = True
+                except BodyTooLarge:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail="The decompressed body is larger than "
+                        f"{self.max_bytes} bytes.",
+                    )
+                except MalformedBody as e:
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail=f"Cannot decode the {encoding} body: {e}",
+                    )
+            body = pending.popleft() if pending else b""
+            return {
+                "type": "http.request",
+                "body": body,
+                "more_body": bool(pending) or not finished,
+            }
+
+        await self.app(scope, receive_decoded, send)
+
+
+class ResponseCompressionMiddleware:
+    """
+    ASGI middleware compressing the responses of `paths` with the coding the client
+    prefers among `gzip` and `zstd`. A response sent at once is compressed when its
+    body has at least `minimum_bytes`, a streamed one always, chunk by chunk. Responses
+    which already have a Content-Encoding are left alone.
+
+    A compressed response is another representation of the resource: its ETag is made
+    weak, If-None-Match ignores the `W/` prefix.
+    """
+
+    def __init__(
+        self,
+        app,
+        paths: Collection[str],
+        minimum_bytes: int,
+        gzip_level: int,
+        zstd_level: int,
+    ):
+        self.app = app
+        self.paths = set(paths)
+        self.minimum_bytes = minimum_bytes
+        self.gzip_level = gzip_level
+        self.zstd_level = zstd_level
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding"))
+        start = None
+        encoder = None
+
+        async def send_compressed(message):
+            nonlocal start, encoder
+            if message["type"] == "http.response.start":
+                # Held back until the first chunk of the body tells its size.
+                start = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if start is None:
+                # Next chunks of a stream, compressed when its first chunk was.
+                if encoder is not None:
+                    body = encoder.compress(body) if more_body else encoder.finish(body)
+                    message = {**message, "body": body}
+                await send(message)
+                return
+            headers = MutableHeaders(raw=list(start["headers"]))
+            headers.add_vary_header("Accept-Encoding")
+            if encoding is not None and start["status"] == status.HTTP_304_NOT_MODIFIED:
+                _weaken_etag(headers)
+            elif (
+                encoding is not None
+                and "content-encoding" not in headers
+                and (more_body or len(body) >= self.minimum_bytes)
+            ):
+                encoder = response_encoder(encoding, self.gzip_level, self.zstd_level)
+                headers["Content-Encoding"] = encoding
+                _weaken_etag(headers)
+                if more_body:
+                    if "content-length" in headers:
+                        del headers["Content-Length"]
+                    body = encoder.compress(body)
+                else:
+                    body = encoder.finish(body)
+                    headers["Content-Length"] = str(len(body))
+                message = {**message, "body": body}
+            await send({**start, "headers": headers.raw})
+            start = None
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
+
+
+def _weaken_etag(headers: MutableHeaders) -> None:
+    etag = headers.get("etag")
+    if etag and not etag.startswith("W/"):
+        headers["ETag"] = f"W/{etag}"
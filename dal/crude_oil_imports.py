@@ -1,45 +1,218 @@
+import json
 import logging
 import uuid
-from typing import Optional, List
+from typing import AsyncIterator, Optional, List, Sequence
 
 from fastapi import HTTPException, status
-from sqlalchemy import delete, func, select, update
+from sqlalchemy import (
+    Boolean,
+    Row,
+    and_,
+    any_,
+    bindparam,
+    delete,
+    func,
+    insert,
+    literal_column,
+    select,
+    text,
+    tuple_,
+    update,
+)
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from dao.schema import CrudeOilImportsSchema
+from config import settings
+from dal.dimensions import (
+    decode_records,
+    decode_rows,
+    decode_tuples,
+    encode_filters,
+    encode_rows,
+    storage_column,
+)
+from dal.filters import compile_filters, filter_clauses, filter_columns
+from dal.rollups import (
+    aggregate_rollup_in_db,
+    apply_rollup_deltas,
+    find_rollup,
+    rollup_source_columns,
+)
+from dao.schema import CrudeOilImportsChangeMarkerSchema, CrudeOilImportsSchema
+from metrics.instrumentation import record_rows
 from models.request_models import CrudeOilDataModelPost
 from models.response_models import CrudeOilDataResponseModel
 
 logging.basicConfig(level=logging.ERROR)
 logger = logging.getLogger(__name__)
 
+DUPLICATE_RECORD_TEXT = (
+    "A record with the same year, month, origin, destination and grade already exists."
+)
 
-def add_a_record_to_database(db: AsyncSession, data: CrudeOilDataModelPost):
+
+def _is_unique_violation(error: Exception) -> bool:
+    # SQLAlchemy copies the SQLSTATE onto the errors it wraps, COPY raises asyncpg's own.
+    return getattr(getattr(error, "orig", error), "sqlstate", None) == "23505"
+
+
+async def mark_dataset_changed(db: AsyncSession) -> None:
+    """
+    Advances the change marker within the transaction of a write, call it last before
+    the commit. The new marker becomes visible with the data, a reader can never pair
+    it with the old data, and a failure rolls the write back. Concurrent writes wait for
+    each other on the marker row from there to their commit.
+    """
+    table = CrudeOilImportsChangeMarkerSchema.__table__
+    query = pg_insert(table).values(id=1, marker=1)
+    query = query.on_conflict_do_update(
+        index_elements=[table.c.id], set_={"marker": table.c.marker + 1}
+    )
+    await db.execute(query)
+
+
+async def get_change_marker(db: AsyncSession) -> str:
     try:
-        row = CrudeOilImportsSchema(**data.model_dump(), uuid=uuid.uuid4())
-        db.add(row)
-        return row
+        query = select(CrudeOilImportsChangeMarkerSchema.marker)
+        marker = (await db.execute(query)).scalar()
+        # Prefixed, it never matches an ETag of the sequence this marker replaced.
+        return f"m{marker or 0}"
     except Exception as e:
-        error_text = "Something went wrong adding record to db (lazy)."
+        error_text = "Something went wrong reading the change marker from db."
         logger.error(f"{error_text} {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=error_text
         )
 
 
-async def get_records_from_db(db: AsyncSession, filters: dict, skip=0, limit=20):
+async def get_record_version(db: AsyncSession, record_uuid: uuid.UUID) -> Optional[int]:
+    try:
+        query = select(CrudeOilImportsSchema.version).where(
+            CrudeOilImportsSchema.uuid == record_uuid
+        )
+        return (await db.execute(query)).scalar()
+    except Exception as e:
+        error_text = "Something went wrong reading the record version from db."
+        logger.error(f"{error_text} {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=error_text
+        )
+
+
+# API columns of the exported tuples.
+EXPORT_COLUMNS = [
+    "year",
+    "month",
+    "origin_name",
+    "origin_type_name",
+    "destination_name",
+    "destination_type_name",
+    "grade_name",
+    "quantity",
+    "uuid",
+]
+
+# API columns of the records read by uuid or page, id for the cursors and version
+# for the ETags.
+RECORD_COLUMNS = [*EXPORT_COLUMNS, "id", "version"]
+
+
+def _storage_columns(columns: Sequence[str]) -> list:
+    """
+    :return: the crude_oil_imports columns holding the API `columns`, in the same order
+    """
+    table = CrudeOilImportsSchema.__table__
+    return [table.c[storage_column(column)] for column in columns]
+
+
+async def get_records_from_db(
+    db: AsyncSession,
+    filters: dict,
+    skip=0,
+    limit=20,
+    after_id: Optional[int] = None,
+) -> List[dict]:
+    """
+    :return: matching records keyed by API columns, plus id and version
+    """
+    try:
+        table = CrudeOilImportsSchema.__table__
+        # Plain tuples of the needed columns, decoded straight into one dict per row.
+        query = select(*_storage_columns(RECORD_COLUMNS)).where(
+            *await compile_filters(db, table, filters)
+        )
+        if after_id is not None:
+            # Keyset seek: the primary key index jumps straight to the next page,
+            # so deep pages cost the same as the first one.
+            query = query.where(CrudeOilImportsSchema.id > after_id)
+        else:
+            query = query.offset(skip)
+        query = query.limit(limit).order_by(CrudeOilImportsSchema.id)
+        results = (await db.execute(query)).all()
+        record_rows(len(results))
+        return await decode_records(db, RECORD_COLUMNS, results)
+    except Exception as e:
+        error_text = "Something went wrong reading from db."
+        logger.error(f"{error_text} {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=error_text
+        )
+
+
+async def get_records_by_uuids(
+    db: AsyncSession, uuids: Sequence[uuid.UUID], chunk_size: int
+) -> List[dict]:
+    """
+    Reads the records of many uuids with `uuid = ANY(:uuids)` over the uuid index,
+    `chunk_size` uuids per query. The array is a single parameter, every chunk reuses
+    the same prepared statement whatever its length.
+
+    :return: the found records keyed by API columns, in no particular order
+    """
+    table = CrudeOilImportsSchema.__table__
+    query = select(*_storage_columns(RECORD_COLUMNS)).where(
+        table.c.uuid
+        == any_(
+            bindparam("uuids", type_=postgresql.ARRAY(postgresql.UUID(as_uuid=True)))
+        )
+    )
+    try:
+        records = []
+        for start in range(0, len(uuids), chunk_size):
+            chunk = list(uuids[start : start + chunk_size])
+            results = (await db.execute(query, {"uuids": chunk})).all()
+            record_rows(len(results))
+            records.extend(await decode_records(db, RECORD_COLUMNS, results))
+        return records
+    except Exception as e:
+        error_text = "Something went wrong reading records by uuid from db."
+        logger.error(f"{error_text} {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=error_text
+        )
+
+
+async def stream_records_from_db(
+    db: AsyncSession, filters: dict, batch_size: int
+) -> AsyncIterator[Sequence[Row]]:
+    """
+    Reads every matching record through a server-side cursor, `batch_size` rows at a time.
+    Rows are plain tuples in the order of EXPORT_COLUMNS, no ORM object is built.
+    """
     try:
         query = (
-            select(CrudeOilImportsSchema)
-            .filter_by(**filters)
-            .offset(skip)
-            .limit(limit)
+            select(*_storage_columns(EXPORT_COLUMNS))
+            .where(*await compile_filters(db, CrudeOilImportsSchema.__table__, filters))
             .order_by(CrudeOilImportsSchema.id)
+            .execution_options(yield_per=batch_size)
         )
-        results = (await db.execute(query)).scalars().all()
-        return results
+        result = await db.stream(query)
+        async for partition in result.partitions(batch_size):
+            record_rows(len(partition))
+            yield await decode_tuples(db, EXPORT_COLUMNS, partition)
     except Exception as e:
-        error_text = "Something went wrong reading from db."
+        error_text = "Something went wrong streaming records from db."
         logger.error(f"{error_text} {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=error_text
@@ -48,7 +221,11 @@ async def get_records_from_db(db: AsyncSession, filters: dict, skip=0, limit=20)
 
 async def count_records_in_db(db: AsyncSession, filters: dict):
     try:
-        query = select(CrudeOilImportsSchema).filter_by(**filters).subquery()
+        query = (
+            select(CrudeOilImportsSchema.id)
+            .where(*await compile_filters(db, CrudeOilImportsSchema.__table__, filters))
+            .subquery()
+        )
         query = select(func.count()).select_from(query)
         result = (await db.execute(query)).scalars().first()
         return result
@@ -60,24 +237,150 @@ async def count_records_in_db(db: AsyncSession, filters: dict):
         )
 
 
+async def estimate_records_in_db(db: AsyncSession, filters: dict) -> int:
+    """
+    Row count estimate from the planner statistics, no rows are scanned.
+    Accuracy depends on how recently the table was analyzed.
+    """
+    try:
+        if not filters:
+            query = text(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = CAST(:table AS regclass)"
+            )
+            estimate = (
+                await db.execute(query, {"table": CrudeOilImportsSchema.__tablename__})
+            ).scalar()
+            # reltuples is -1 until the table is vacuumed or analyzed for the first time.
+            if estimate is not None and estimate >= 0:
+                return estimate
+        query = select(CrudeOilImportsSchema.id).where(
+            *await compile_filters(db, CrudeOilImportsSchema.__table__, filters)
+        )
+        # Filter values are validated by the request model and are all ints once the
+        # dimension names are resolved to their keys.
+        compiled = query.compile(
+            dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+        )
+        plan = (await db.execute(text(f"EXPLAIN (FORMAT JSON) {compiled}"))).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+    except Exception as e:
+        error_text = "Something went wrong estimating number of records in db."
+        logger.error(f"{error_text} {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=error_text
+        )
+
+
+AGGREGATE_FUNCTIONS = {
+    "sum": lambda: func.sum(CrudeOilImportsSchema.quantity),
+    "avg": lambda: func.avg(CrudeOilImportsSchema.quantity),
+    "min": lambda: func.min(CrudeOilImportsSchema.quantity),
+    "max": lambda: func.max(CrudeOilImportsSchema.quantity),
+    "count": lambda: func.count(),
+}
+
+
+async def aggregate_records_in_db(
+    db: AsyncSession, group_by: List[str], metrics: List[str], filters: dict
+) -> List[dict]:
+    """
+    Compiles the grouping, metrics and filters into a single GROUP BY query.
+
+    :param db: SQLAlchemy async db session
+    :param group_by: column names to group by, can be empty for a grand total
+    :param metrics: keys of AGGREGATE_FUNCTIONS, applied on quantity
+    :param filters: filters on API columns, see `dal.filters`
+    :return: one mapping per group with the group columns and the metrics, sorted by the group columns
+    """
+    try:
+        storage_group_by = [storage_column(column) for column in group_by]
+        storage_filters = await encode_filters(db, filters)
+        rollup = None
+        if settings.AGGREGATE_FROM_ROLLUPS:
+            rollup = find_rollup(
+                storage_group_by, filter_columns(storage_filters), metrics
+            )
+        if rollup is not None:
+            results = await aggregate_rollup_in_db(
+                db,
+                rollup,
+                group_by=storage_group_by,
+                metrics=metrics,
+                filters=storage_filters,
+            )
+        else:
+            group_columns = [
+                getattr(CrudeOilImportsSchema, column) for column in storage_group_by
+            ]
+            query = (
+                select(
+                    *group_columns,
+                    *[
+                        AGGREGATE_FUNCTIONS[metric]().label(metric)
+                        for metric in metrics
+                    ],
+                )
+                .where(
+                    *filter_clauses(CrudeOilImportsSchema.__table__, storage_filters)
+                )
+                .group_by(*group_columns)
+            )
+            results = (await db.execute(query)).mappings().all()
+        record_rows(len(results))
+        rows = await decode_rows(db, results)
+        # Keys do not sort like names, order once they are decoded.
+        rows.sort(key=lambda row: tuple(row[column] for column in group_by))
+        return rows
+    except Exception as e:
+        error_text = "Something went wrong aggregating records in db."
+        logger.error(f"{error_text} {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=error_text
+        )
+
+
 async def update_crude_oil_imports(db, update_data, filters) -> Optional[dict]:
+    """
+    :param update_data: new values keyed by API columns
+    :param filters: where clauses on CrudeOilImportsSchema
+    :return: the first updated record keyed by API columns, None if nothing matched
+    """
     try:
+        # Lock the rows and keep their old values to move their rollup contribution.
+        old_rows = (
+            (
+                await db.execute(
+                    select(*rollup_source_columns()).where(*filters).with_for_update()
+                )
+            )
+            .mappings()
+            .all()
+        )
+        (values,) = await encode_rows(db, [update_data])
         query = (
             update(CrudeOilImportsSchema)
             .where(*filters)
-            .values(**update_data)
-            .returning(CrudeOilImportsSchema)
+            .values(**values, version=CrudeOilImportsSchema.version + 1)
+            .returning(*_storage_columns(RECORD_COLUMNS))
         )
         result = await db.execute(query)
-        updated_record = result.scalars().first()
-        if not updated_record:
+        updated_row = result.first()
+        if not updated_row:
             await db.commit()
             return None
-        updated_row = updated_record.__dict__.copy()
+        await apply_rollup_deltas(db, added=[updated_row._mapping], removed=old_rows)
+        (updated_row,) = await decode_records(db, RECORD_COLUMNS, [updated_row])
+        await mark_dataset_changed(db)
         await db.commit()
         return updated_row
     except Exception as e:
         await db.rollback()
+        if _is_unique_violation(e):
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT, detail=DUPLICATE_RECORD_TEXT
+            )
         error_text = "Error while executing update query on database."
         logger.error(f"{error_text} {e}")
         raise HTTPException(
@@ -86,17 +389,23 @@ async def update_crude_oil_imports(db, update_data, filters) -> Optional[dict]:
 
 
 async def delete_crude_oil_imports(db: AsyncSession, filters: list) -> Optional[dict]:
+    """
+    :param filters: where clauses on CrudeOilImportsSchema
+    :return: the first deleted record keyed by API columns, None if nothing matched
+    """
     try:
         query = (
             delete(CrudeOilImportsSchema)
             .where(*filters)
-            .returning(CrudeOilImportsSchema)
+            .returning(*_storage_columns(RECORD_COLUMNS))
         )
         result = await db.execute(query)
-        deleted_record = result.scalars().first()
-        if not deleted_record:
+        deleted_row = result.first()
+        if not deleted_row:
             return None
-        deleted_row = deleted_record.__dict__.copy()
+        await apply_rollup_deltas(db, removed=[deleted_row._mapping])
+        (deleted_row,) = await decode_records(db, RECORD_COLUMNS, [deleted_row])
+        await mark_dataset_changed(db)
         await db.commit()
         return deleted_row
     except Exception as e:
@@ -108,14 +417,256 @@ async def delete_crude_oil_imports(db: AsyncSession, filters: list) -> Optional[
         )
 
 
-async def insert_multiple_data_into_database(db: AsyncSession, data_list: list) -> List:
-    updated = []
-    for data in data_list:
-        row = add_a_record_to_database(db, data)
-        updated.append(row.__dict__.copy())
+async def _limit_to_max_rows(
+    db: AsyncSession, table, where: list, max_rows: Optional[int]
+) -> list:
+    """
+    Rejects the request before anything is written when more than `max_rows` records
+    match `where`. Otherwise locks them, and narrows `where` to them: the write changes
+    exactly the records counted, even if matching ones are inserted meanwhile.
+
+    :return: the conditions of the write
+    """
+    if max_rows is None:
+        return where
+    query = select(table.c.id).where(*where).limit(max_rows + 1).with_for_update()
+    ids = (await db.execute(query)).scalars().all()
+    if len(ids) > max_rows:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"The filters match more than max_rows={max_rows} records. "
+            "Nothing was changed.",
+        )
+    # A single array parameter, however many records are allowed.
+    ids_type = postgresql.ARRAY(table.c.id.type)
+    return [table.c.id == any_(bindparam("ids", list(ids), type_=ids_type))]
+
+
+async def update_crude_oil_imports_by_filter(
+    db: AsyncSession,
+    update_data: dict,
+    filters: dict,
+    max_rows: Optional[int] = None,
+) -> List[uuid.UUID]:
+    """
+    Updates every matching record with a single UPDATE statement and moves their
+    rollup contribution in the same transaction.
+
+    :param update_data: new values keyed by API columns
+    :param filters: filters on API columns, see `dal.filters`
+    :param max_rows: nothing is changed when more records match
+    :return: uuids of the updated records
+    """
+    table = CrudeOilImportsSchema.__table__
+    source_columns = [column.name for column in rollup_source_columns()]
     try:
+        where = await compile_filters(db, table, filters)
+        where = await _limit_to_max_rows(db, table, where, max_rows)
+        # The locked old values come back with the new ones, no second query is needed.
+        old = (
+            select(table.c.id, *[table.c[column] for column in source_columns])
+            .where(*where)
+            .with_for_update()
+            .subquery("old")
+        )
+        (values,) = await encode_rows(db, [update_data])
+        query = (
+            update(table)
+            .where(table.c.id == old.c.id)
+            .values(**values, version=table.c.version + 1)
+            .returning(
+                table.c.uuid,
+                *[table.c[column] for column in source_columns],
+                *[old.c[column].label(f"old_{column}") for column in source_columns],
+            )
+        )
+        rows = (await db.execute(query)).mappings().all()
+        if rows:
+            await apply_rollup_deltas(
+                db,
+                added=rows,
+                removed=[
+                    {column: row[f"old_{column}"] for column in source_columns}
+                    for row in rows
+                ],
+            )
+            await mark_dataset_changed(db)
         await db.commit()
-        return updated
+        return [row["uuid"] for row in rows]
+    except HTTPException:
+        await db.rollback()
+        raise
+    except Exception as e:
+        await db.rollback()
+        if _is_unique_violation(e):
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT, detail=DUPLICATE_RECORD_TEXT
+            )
+        error_text = "Error while executing update query on database."
+        logger.error(f"{error_text} {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=error_text
+        )
+
+
+async def delete_crude_oil_imports_by_filter(
+    db: AsyncSession, filters: dict, max_rows: Optional[int] = None
+) -> List[uuid.UUID]:
+    """
+    Deletes every matching record with a single DELETE statement and removes their
+    rollup contribution in the same transaction.
+
+    :param filters: filters on API columns, see `dal.filters`
+    :param max_rows: nothing is deleted when more records match
+    :return: uuids of the deleted records
+    """
+    table = CrudeOilImportsSchema.__table__
+    try:
+        where = await compile_filters(db, table, filters)
+        where = await _limit_to_max_rows(db, table, where, max_rows)
+        query = (
+            delete(table)
+            .where(*where)
+            .returning(table.c.uuid, *rollup_source_columns())
+        )
+        rows = (await db.execute(query)).mappings().all()
+        if rows:
+            await apply_rollup_deltas(db, removed=rows)
+            await mark_dataset_changed(db)
+        await db.commit()
+        return [row["uuid"] for row in rows]
+    except HTTPException:
+        await db.rollback()
+        raise
+    except Exception as e:
+        await db.rollback()
+        error_text = "Error while executing delete query on database."
+        logger.error(f"{error_text} {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=error_text
+        )
+
+
+# id and version are filled in by the database.
+BULK_INSERT_COLUMNS = [
+    column.name
+    for column in CrudeOilImportsSchema.__table__.columns
+    if column.name not in ("id", "version")
+]
+
+
+# Natural key of a record, see the unique_import constraint.
+NATURAL_KEY = [
+    column.name
+    for constraint in CrudeOilImportsSchema.__table__.constraints
+    if constraint.name == "unique_import"
+    for column in constraint.columns
+]
+
+# Values an upsert can change on an existing record, its uuid is kept.
+UPSERT_COLUMNS = [
+    column
+    for column in BULK_INSERT_COLUMNS
+    if column not in NATURAL_KEY and column != "uuid"
+]
+
+
+async def copy_rows_into_table(db: AsyncSession, rows: List[dict]) -> None:
+    """
+    Streams `rows` into crude_oil_imports with asyncpg's binary COPY, within the
+    transaction already open on the session's connection. Does not commit.
+    """
+    connection = await db.connection()
+    raw_connection = await connection.get_raw_connection()
+    asyncpg_connection = raw_connection.driver_connection
+    if not asyncpg_connection.is_in_transaction():
+        # SQLAlchemy opens the driver transaction lazily on the first statement.
+        # COPY goes around SQLAlchemy, so make sure it cannot autocommit on its own.
+        await connection.exec_driver_sql("SELECT 1")
+    await asyncpg_connection.copy_records_to_table(
+        CrudeOilImportsSchema.__tablename__,
+        records=[[row[column] for column in BULK_INSERT_COLUMNS] for row in rows],
+        columns=BULK_INSERT_COLUMNS,
+    )
+
+
+async def insert_multiple_data_into_database(
+    db: AsyncSession, data_list: List[CrudeOilDataModelPost]
+) -> List[dict]:
+    """
+    Inserts all the records in a single transaction without building ORM objects.
+    UUIDs are generated here, so the returned rows are built from the input data and
+    nothing has to be read back from the database.
+
+    :return: the inserted records keyed by API columns
+    """
+    inserted = [{**data.model_dump(), "uuid": uuid.uuid4()} for data in data_list]
+    if not inserted:
+        return inserted
+    try:
+        rows = await encode_rows(db, inserted)
+        if settings.BULK_INSERT_METHOD == "copy":
+            await copy_rows_into_table(db, rows)
+        else:
+            # executemany, batched by SQLAlchemy into multi-row INSERT statements.
+            await db.execute(insert(CrudeOilImportsSchema.__table__), rows)
+        # After the rows, so the rollup rows are only locked from here to the commit and
+        # concurrent batches of the same groups do not wait for each other's COPY. The
+        # deltas are applied in key order, two batches cannot deadlock.
+        await apply_rollup_deltas(db, added=rows)
+        await mark_dataset_changed(db)
+        await db.commit()
+        return inserted
+    except Exception as e:
+        await db.rollback()
+        if _is_unique_violation(e):
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"{DUPLICATE_RECORD_TEXT} Use mode=upsert to update it.",
+            )
+        error_text = "Error while executing insert query on database."
+        logger.error(f"{error_text} {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=error_text
+        )
+
+
+async def insert_new_data_into_database(
+    db: AsyncSession, data_list: List[CrudeOilDataModelPost]
+) -> List[int]:
+    """
+    Inserts the records in a single transaction with `INSERT ... ON CONFLICT DO
+    NOTHING`. A record repeating the natural key of an existing record, or of a
+    previous record of `data_list`, is skipped instead of failing the others.
+
+    :return: positions in `data_list` of the skipped records
+    """
+    if not data_list:
+        return []
+    table = CrudeOilImportsSchema.__table__
+    try:
+        rows = await encode_rows(
+            db, [{**data.model_dump(), "uuid": uuid.uuid4()} for data in data_list]
+        )
+        query = (
+            pg_insert(table)
+            .on_conflict_do_nothing(constraint="unique_import")
+            .returning(table.c.uuid)
+        )
+        # executemany, SQLAlchemy pages the rows into multi-row statements. The uuids are
+        # generated here, the missing ones are the skipped records.
+        written = set((await db.execute(query, rows)).scalars().all())
+        if written:
+            await apply_rollup_deltas(
+                db, added=[row for row in rows if row["uuid"] in written]
+            )
+            await mark_dataset_changed(db)
+        await db.commit()
+        return [
+            position
+            for position, row in enumerate(rows)
+            if row["uuid"] not in written
+        ]
     except Exception as e:
         await db.rollback()
         error_text = "Error while executing insert query on database."
@@ -128,15 +679,157 @@ async def insert_multiple_data_into_database(db: AsyncSession, data_list: list)
 async def insert_single_data_into_database(
     db: AsyncSession, data: CrudeOilDataModelPost
 ) -> dict:
-    inserted_data = add_a_record_to_database(db, data)
-    inserted_data = inserted_data.__dict__.copy()
+    """
+    :return: the inserted record keyed by API columns
+    """
+    inserted_data = {**data.model_dump(), "uuid": uuid.uuid4()}
     try:
+        (row,) = await encode_rows(db, [inserted_data])
+        # A Core insert, the record is not tracked by the session.
+        await db.execute(insert(CrudeOilImportsSchema.__table__).values(**row))
+        await apply_rollup_deltas(db, added=[row])
+        await mark_dataset_changed(db)
         await db.commit()
     except Exception as e:
         await db.rollback()
+        if _is_unique_violation(e):
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT, detail=DUPLICATE_RECORD_TEXT
+            )
         error_text = "Error while executing insert query on database."
         logger.error(f"{error_text} {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=error_text
         )
     return inserted_data
+
+
+def _unnest_rows(rows: List[dict], columns: List[str], name: str):
+    """
+    `rows` as a set returning unnest() of one array per column, so a statement takes
+    as many bind parameters as there are columns whatever the number of rows.
+    """
+    table = CrudeOilImportsSchema.__table__
+    arrays = [
+        bindparam(
+            f"{name}_{column}",
+            [row[column] for row in rows],
+            type_=postgresql.ARRAY(table.c[column].type),
+        )
+        for column in columns
+    ]
+    return func.unnest(*arrays).table_valued(*columns).render_derived(name=name)
+
+
+async def _upsert_batch(db: AsyncSession, rows: List[dict]) -> tuple:
+    """
+    Upserts one batch of encoded rows with unique natural keys and moves the rollup
+    contribution of the updated records. Does not commit.
+
+    :return: number of inserted records, uuids of the updated records
+    """
+    table = CrudeOilImportsSchema.__table__
+    source_columns = rollup_source_columns()
+    keys = _unnest_rows(rows, NATURAL_KEY, "keys")
+    # Lock the existing records, their old values are needed for the rollup deltas and
+    # the records already up to date are not sent again.
+    existing = (
+        await db.execute(
+            select(*source_columns)
+            .join_from(
+                table, keys, and_(*[table.c[c] == keys.c[c] for c in NATURAL_KEY])
+            )
+            .with_for_update(of=table)
+        )
+    ).mappings()
+    old_rows = {tuple(row[c] for c in NATURAL_KEY): row for row in existing}
+    changed = []
+    for row in rows:
+        old_row = old_rows.get(tuple(row[c] for c in NATURAL_KEY))
+        if old_row is None or any(row[c] != old_row[c] for c in UPSERT_COLUMNS):
+            changed.append(row)
+    if not changed:
+        return 0, []
+
+    new = _unnest_rows(changed, BULK_INSERT_COLUMNS, "new")
+    query = pg_insert(table).from_select(
+        BULK_INSERT_COLUMNS, select(*[new.c[c] for c in BULK_INSERT_COLUMNS])
+    )
+    query = query.on_conflict_do_update(
+        constraint="unique_import",
+        set_={
+            **{column: query.excluded[column] for column in UPSERT_COLUMNS},
+            "version": table.c.version + 1,
+        },
+        where=tuple_(*[table.c[c] for c in UPSERT_COLUMNS]).is_distinct_from(
+            tuple_(*[query.excluded[c] for c in UPSERT_COLUMNS])
+        ),
+    ).returning(
+        # xmax is only set on the row versions written by an update.
+        literal_column("xmax = 0", Boolean).label("inserted"),
+        table.c.uuid,
+        *source_columns,
+    )
+    written = (await db.execute(query)).mappings().all()
+    inserted = [row for row in written if row["inserted"]]
+    updated = [row for row in written if not row["inserted"]]
+    removed = []
+    for row in updated:
+        old_row = old_rows.get(tuple(row[c] for c in NATURAL_KEY))
+        if old_row is None:
+            # Inserted by a concurrent transaction after the rows were locked.
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Records were inserted concurrently, retry the request.",
+            )
+        removed.append(old_row)
+    await apply_rollup_deltas(db, added=written, removed=removed)
+    return len(inserted), [row["uuid"] for row in updated]
+
+
+async def upsert_multiple_data_into_database(
+    db: AsyncSession, data_list: List[CrudeOilDataModelPost]
+) -> dict:
+    """
+    Inserts the new records and updates the existing ones on their natural key, in a
+    single transaction and `UPSERT_BATCH_SIZE` records per statement. Records whose
+    values did not change are not written. When the request repeats a natural key,
+    its last record wins and the previous ones are counted as duplicates.
+
+    :return: number of inserted, unchanged and duplicate records, uuids of the updated
+        records
+    """
+    if not data_list:
+        return {"inserted": 0, "updated": [], "unchanged": 0, "duplicates": 0}
+    try:
+        rows = await encode_rows(
+            db, [{**data.model_dump(), "uuid": uuid.uuid4()} for data in data_list]
+        )
+        # A statement cannot update the same record twice.
+        rows = list({tuple(row[c] for c in NATURAL_KEY): row for row in rows}.values())
+        inserted, updated = 0, []
+        for start in range(0, len(rows), settings.UPSERT_BATCH_SIZE):
+            batch_inserted, batch_updated = await _upsert_batch(
+                db, rows[start : start + settings.UPSERT_BATCH_SIZE]
+            )
+            inserted += batch_inserted
+            updated.extend(batch_updated)
+        if inserted or updated:
+            await mark_dataset_changed(db)
+        await db.commit()
+        return {
+            "inserted": inserted,
+            "updated": updated,
+            "unchanged": len(rows) - inserted - len(updated),
+            "duplicates": len(data_list) - len(rows),
+        }
+    except HTTPException:
+        await db.rollback()
+        raise
+    except Exception as e:
+        await db.rollback()
+        error_text = "Error while executing upsert query on database."
+        logger.error(f"{error_text} {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=error_text
+        )
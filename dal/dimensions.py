@@ -0,0 +1,268 @@
+"""
+Translation between the dimension names of the API (`origin_name`, `grade_name`...) and
+the small integer keys stored in `crude_oil_imports`, its rollups and COPY payloads.
+
+The maps are cached in the worker. Dimension rows are never updated or deleted, so a
+cached entry is never stale: a miss is read from the database once and kept. New names
+are added in the writer's transaction and cached once it has committed.
+"""
+
+import logging
+from typing import Dict, Iterable, List, Mapping, Sequence, Tuple, Type
+
+from sqlalchemy import event, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, SessionTransaction
+
+from dao.schema import (
+    DestinationDimensionSchema,
+    DestinationTypeDimensionSchema,
+    DimensionMixin,
+    GradeDimensionSchema,
+    OriginDimensionSchema,
+    OriginTypeDimensionSchema,
+)
+
+logging.basicConfig(level=logging.ERROR)
+logger = logging.getLogger(__name__)
+
+# API column -> dimension table.
+DIMENSIONS: Dict[str, Type[DimensionMixin]] = {
+    "origin_name": OriginDimensionSchema,
+    "origin_type_name": OriginTypeDimensionSchema,
+    "destination_name": DestinationDimensionSchema,
+    "destination_type_name": DestinationTypeDimensionSchema,
+    "grade_name": GradeDimensionSchema,
+}
+
+# API column -> key column of crude_oil_imports and the rollups.
+DIMENSION_ID_COLUMNS: Dict[str, str] = {
+    "origin_name": "origin_id",
+    "origin_type_name": "origin_type_id",
+    "destination_name": "destination_id",
+    "destination_type_name": "destination_type_id",
+    "grade_name": "grade_id",
+}
+DIMENSION_NAME_COLUMNS = {value: key for key, value in DIMENSION_ID_COLUMNS.items()}
+
+# Filter value for names that are not in a dimension table: no row has a negative key.
+UNKNOWN_ID = -1
+
+
+def storage_column(column: str) -> str:
+    """
+    :return: name of the crude_oil_imports column holding an API column
+    """
+    return DIMENSION_ID_COLUMNS.get(column, column)
+
+
+class DimensionCache:
+    """
+    Name to id and id to name maps of every dimension, private to the worker.
+    """
+
+    def __init__(self):
+        self.ids: Dict[str, Dict[str, int]] = {column: {} for column in DIMENSIONS}
+        self.names: Dict[str, Dict[int, str]] = {column: {} for column in DIMENSIONS}
+        # Rows added by the open transaction of a session, cached when it commits.
+        self.pending: Dict[Session, List[Tuple[str, Sequence]]] = {}
+
+    def _remember(self, column: str, rows: Iterable[Sequence]) -> None:
+        for dimension_id, name in rows:
+            self.ids[column][name] = dimension_id
+            self.names[column][dimension_id] = name
+
+    def _remember_after_commit(
+        self, db: AsyncSession, column: str, rows: Sequence[Sequence]
+    ) -> None:
+        session = db.sync_session
+        if not event.contains(session, "after_commit", self._commit_pending):
+            event.listen(session, "after_commit", self._commit_pending)
+            event.listen(session, "after_transaction_end", self._drop_pending)
+        self.pending.setdefault(session, []).append((column, rows))
+
+    def _commit_pending(self, session: Session) -> None:
+        for column, rows in self.pending.pop(session, ()):
+            self._remember(column, rows)
+
+    def _drop_pending(self, session: Session, transaction: SessionTransaction) -> None:
+        # Rolled back, or closed without a commit.
+        if transaction.parent is None:
+            self.pending.pop(session, None)
+
+    async def resolve_names(
+        self, db: AsyncSession, column: str, names: Iterable[str], create: bool = False
+    ) -> Dict[str, int]:
+        """
+        :param column: API column, key of DIMENSIONS
+        :param names: names to resolve
+        :param create: add the names missing from the dimension table, in the transaction
+            of `db`
+        :return: the name to id map of the column, unknown names are absent when not created
+        """
+        known = self.ids[column]
+        missing = {name for name in names if name not in known}
+        if not missing:
+            return known
+        table = DIMENSIONS[column]
+        query = select(table.id, table.name).where(table.name.in_(missing))
+        self._remember(column, (await db.execute(query)).all())
+        missing -= known.keys()
+        if missing and create:
+            # Added in the caller's transaction, so the new rows commit or roll back with
+            # the records using them. Their ids are only cached once it has committed.
+            await db.execute(
+                pg_insert(table)
+                .values([{"name": name} for name in sorted(missing)])
+                .on_conflict_do_nothing(index_elements=["name"])
+            )
+            query = select(table.id, table.name).where(table.name.in_(missing))
+            rows = (await db.execute(query)).all()
+            self._remember_after_commit(db, column, rows)
+            return {**known, **{name: dimension_id for dimension_id, name in rows}}
+        return known
+
+    async def resolve_ids(
+        self, db: AsyncSession, column: str, ids: Iterable[int]
+    ) -> Dict[int, str]:
+        """
+        :param column: API column, key of DIMENSIONS
+        :param ids: keys to resolve, they all exist thanks to the foreign keys
+        :return: the id to name map of the column
+        """
+        known = self.names[column]
+        missing = {dimension_id for dimension_id in ids if dimension_id not in known}
+        if missing:
+            table = DIMENSIONS[column]
+            query = select(table.id, table.name).where(table.id.in_(missing))
+            self._remember(column, (await db.execute(query)).all())
+        return known
+
+    def clear(self) -> None:
+        for column in DIMENSIONS:
+            self.ids[column].clear()
+            self.names[column].clear()
+
+
+dimension_cache = DimensionCache()
+
+
+async def encode_rows(db: AsyncSession, rows: Sequence[Mapping]) -> List[dict]:
+    """
+    Replaces the dimension names of complete or partial rows by their keys, adding the
+    new names to the dimension tables.
+
+    :return: new dicts keyed by crude_oil_imports columns
+    """
+    encoded = [dict(row) for row in rows]
+    for column, id_column in DIMENSION_ID_COLUMNS.items():
+        present = [row for row in encoded if column in row]
+        if not present:
+            continue
+        ids = await dimension_cache.resolve_names(
+            db, column, {row[column] for row in present}, create=True
+        )
+        for row in present:
+            row[id_column] = ids[row.pop(column)]
+    return encoded
+
+
+async def encode_filters(db: AsyncSession, filters: Mapping) -> dict:
+    """
+    Filters on API columns to filters on crude_oil_imports columns, a name or a list of
+    names becomes a key or a list of keys. A name missing from its dimension table
+    matches no row.
+    """
+    encoded = dict(filters)
+    for column, id_column in DIMENSION_ID_COLUMNS.items():
+        if column not in encoded:
+            continue
+        value = encoded.pop(column)
+        if isinstance(value, str):
+            ids = await dimension_cache.resolve_names(db, column, [value])
+            encoded[id_column] = ids.get(value, UNKNOWN_ID)
+        else:
+            ids = await dimension_cache.resolve_names(db, column, value)
+            encoded[id_column] = [ids[name] for name in value if name in ids] or [
+                UNKNOWN_ID
+            ]
+    return encoded
+
+
+async def decode_rows(db: AsyncSession, rows: Sequence[Mapping]) -> List[dict]:
+    """
+    Replaces the dimension keys of rows read from crude_oil_imports or a rollup by their names.
+
+    :return: new dicts keyed by API columns, other keys are kept as they are
+    """
+    decoded = [dict(row) for row in rows]
+    if not decoded:
+        return decoded
+    for id_column, column in DIMENSION_NAME_COLUMNS.items():
+        if id_column not in decoded[0]:
+            continue
+        names = await dimension_cache.resolve_ids(
+            db, column, {row[id_column] for row in decoded}
+        )
+        for row in decoded:
+            row[column] = names[row.pop(id_column)]
+    return decoded
+
+
+async def _name_maps(
+    db: AsyncSession, columns: Sequence[str], rows: Sequence[Sequence]
+) -> List[tuple]:
+    """
+    :return: (position, id to name map) of every dimension position of `columns`
+    """
+    return [
+        (
+            position,
+            await dimension_cache.resolve_ids(
+                db, column, {row[position] for row in rows}
+            ),
+        )
+        for position, column in enumerate(columns)
+        if column in DIMENSIONS
+    ]
+
+
+async def decode_tuples(
+    db: AsyncSession, columns: Sequence[str], rows: Sequence[Sequence]
+) -> List[tuple]:
+    """
+    Same as `decode_rows` for plain tuples, without building a dict per row.
+
+    :param columns: API column of every position, dimension positions hold keys
+    """
+    positions = await _name_maps(db, columns, rows)
+    decoded = []
+    for row in rows:
+        row = list(row)
+        for position, names in positions:
+            row[position] = names[row[position]]
+        decoded.append(tuple(row))
+    return decoded
+
+
+async def decode_records(
+    db: AsyncSession, columns: Sequence[str], rows: Sequence[Sequence]
+) -> List[dict]:
+    """
+    Same as `decode_rows` for plain tuples, building a single dict per row keyed by
+    `columns` rather than copying a mapping and renaming its key columns.
+
+    :param columns: API column of every position, dimension positions hold keys
+    """
+    positions = [
+        (columns[position], names)
+        for position, names in await _name_maps(db, columns, rows)
+    ]
+    decoded = []
+    for row in rows:
+        record = dict(zip(columns, row))
+        for column, names in positions:
+            record[column] = names[record[column]]
+        decoded.append(record)
+    return decoded
@@ -0,0 +1,82 @@
+"""
+Compiles the filters of `models.request_models.CrudeOilDataModelFilter` into SQL predicates.
+
+Filters are dicts keyed by column name or by one of the range keys below. A column takes a
+single value (`=`) or a list of values (`IN`), dimension columns use their keys (see
+`dal.dimensions.encode_filters`). Every filter compiles to one predicate on a bare column,
+so each of them can use an index.
+"""
+
+import operator
+from typing import Callable, Dict, List, Mapping, Set, Tuple
+
+from sqlalchemy import Table, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from dal.dimensions import encode_filters
+
+# Range key -> (column, comparison), bounds are inclusive.
+RANGE_FILTERS: Dict[str, Tuple[str, Callable]] = {
+    "year_gte": ("year", operator.ge),
+    "year_lte": ("year", operator.le),
+    "quantity_min": ("quantity", operator.ge),
+    "quantity_max": ("quantity", operator.le),
+}
+
+# Period key -> comparison of (year, month) with a "YYYY-MM" bound, bounds are inclusive.
+PERIOD_FILTERS: Dict[str, Callable] = {
+    "period_from": operator.ge,
+    "period_to": operator.le,
+}
+
+
+def filter_columns(filters: Mapping) -> Set[str]:
+    """
+    :return: the columns the filters apply to
+    """
+    columns = set()
+    for key in filters:
+        if key in RANGE_FILTERS:
+            columns.add(RANGE_FILTERS[key][0])
+        elif key in PERIOD_FILTERS:
+            columns.update(("year", "month"))
+        else:
+            columns.add(key)
+    return columns
+
+
+def filter_clauses(table: Table, filters: Mapping) -> list:
+    """
+    :param table: table holding the filtered columns, crude_oil_imports or a rollup
+    :param filters: filters on the columns of `table`
+    :return: where clauses, all of them must match
+    """
+    clauses = []
+    for key, value in filters.items():
+        if key in RANGE_FILTERS:
+            column, compare = RANGE_FILTERS[key]
+            clauses.append(compare(table.c[column], value))
+        elif key in PERIOD_FILTERS:
+            year, month = value.split("-")
+            # Row comparison, a (year, month, ...) index bounds it like a single column.
+            clauses.append(
+                PERIOD_FILTERS[key](
+                    tuple_(table.c.year, table.c.month), (int(year), int(month))
+                )
+            )
+        elif isinstance(value, (list, tuple, set)):
+            values = list(value)
+            if len(values) == 1:
+                clauses.append(table.c[key] == values[0])
+            else:
+                clauses.append(table.c[key].in_(values))
+        else:
+            clauses.append(table.c[key] == value)
+    return clauses
+
+
+async def compile_filters(db: AsyncSession, table: Table, filters: Mapping) -> List:
+    """
+    `filter_clauses` of filters on API columns, dimension names are resolved to their keys.
+    """
+    return filter_clauses(table, await encode_filters(db, filters))
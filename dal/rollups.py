@@ -0,0 +1,222 @@
+"""
+Rollup tables holding pre-aggregated monthly totals of `crude_oil_imports`.
+
+The write paths in `dal.crude_oil_imports` apply their deltas here inside their own
+transaction, and aggregate queries that only touch rollup columns are answered from
+the rollups instead of the base table.
+
+Backfill or repair the rollups with:
+
+    python -m dal.rollups
+"""
+
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Iterable, List, Mapping, Optional, Type
+
+from fastapi import HTTPException, status
+from sqlalchemy import (
+    BigInteger,
+    Numeric,
+    cast,
+    delete,
+    func,
+    insert,
+    select,
+    text,
+    tuple_,
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from dal.filters import filter_clauses
+from dao.schema import (
+    Base,
+    CrudeOilImportsDestinationRollupSchema,
+    CrudeOilImportsOriginRollupSchema,
+    CrudeOilImportsSchema,
+)
+from dao.session import SessionLocal, engine
+
+logging.basicConfig(level=logging.ERROR)
+logger = logging.getLogger(__name__)
+
+ROLLUPS = (CrudeOilImportsOriginRollupSchema, CrudeOilImportsDestinationRollupSchema)
+
+# Metrics that can be derived from total_quantity and record_count.
+# min and max cannot be maintained when rows are deleted, they always use the base table.
+ROLLUP_METRICS = {"sum", "count", "avg"}
+
+# Keeps every upsert well below the 32767 bind parameters postgres accepts per statement.
+UPSERT_CHUNK_SIZE = 1000
+
+
+def rollup_dimensions(rollup: Type[Base]) -> List[str]:
+    return [column.name for column in rollup.__table__.primary_key.columns]
+
+
+def rollup_source_columns() -> list:
+    """
+    Base table columns needed to compute the deltas of every rollup.
+    """
+    names = {name for rollup in ROLLUPS for name in rollup_dimensions(rollup)}
+    names.add("quantity")
+    return [
+        column
+        for column in CrudeOilImportsSchema.__table__.columns
+        if column.name in names
+    ]
+
+
+async def apply_rollup_deltas(
+    db: AsyncSession, added: Iterable[Mapping] = (), removed: Iterable[Mapping] = ()
+) -> None:
+    """
+    Adds the contribution of `added` rows to every rollup and removes the one of `removed` rows.
+    Runs in the caller's transaction and does not commit.
+
+    :param db: SQLAlchemy async db session
+    :param added: inserted rows, or the new values of updated rows
+    :param removed: deleted rows, or the old values of updated rows
+    """
+    signed_rows = [(row, 1) for row in added] + [(row, -1) for row in removed]
+    if not signed_rows:
+        return
+    for rollup in ROLLUPS:
+        dimensions = rollup_dimensions(rollup)
+        deltas = defaultdict(lambda: [0, 0])
+        for row, sign in signed_rows:
+            delta = deltas[tuple(row[dimension] for dimension in dimensions)]
+            delta[0] += sign * row["quantity"]
+            delta[1] += sign
+        # Sorted keys make concurrent writers lock the rollup rows in the same order.
+        keys = sorted(key for key, delta in deltas.items() if delta != [0, 0])
+        for start in range(0, len(keys), UPSERT_CHUNK_SIZE):
+            chunk = keys[start : start + UPSERT_CHUNK_SIZE]
+            query = pg_insert(rollup).values(
+                [
+                    {
+                        **dict(zip(dimensions, key)),
+                        "total_quantity": deltas[key][0],
+                        "record_count": deltas[key][1],
+                    }
+                    for key in chunk
+                ]
+            )
+            query = query.on_conflict_do_update(
+                index_elements=dimensions,
+                set_={
+                    "total_quantity": rollup.total_quantity
+                    + query.excluded.total_quantity,
+                    "record_count": rollup.record_count + query.excluded.record_count,
+                },
+            )
+            await db.execute(query)
+            shrunk = [key for key in chunk if deltas[key][1] < 0]
+            if shrunk:
+                # Drop the groups that no longer have any record.
+                await db.execute(
+                    delete(rollup).where(
+                        tuple_(
+                            *[getattr(rollup, dimension) for dimension in dimensions]
+                        ).in_(shrunk),
+                        rollup.record_count <= 0,
+                    )
+                )
+
+
+def find_rollup(
+    group_by: List[str], filter_columns: Iterable[str], metrics: List[str]
+) -> Optional[Type[Base]]:
+    """
+    :param filter_columns: columns the filters apply to, see `dal.filters.filter_columns`
+    :return: the first rollup able to answer the aggregate, None if the base table is needed
+    """
+    if not set(metrics) <= ROLLUP_METRICS:
+        return None
+    needed = set(group_by) | set(filter_columns)
+    for rollup in ROLLUPS:
+        if needed <= set(rollup_dimensions(rollup)):
+            return rollup
+    return None
+
+
+async def aggregate_rollup_in_db(
+    db: AsyncSession,
+    rollup: Type[Base],
+    group_by: List[str],
+    metrics: List[str],
+    filters: dict,
+) -> List[dict]:
+    """
+    Same groups as `dal.crude_oil_imports.aggregate_records_in_db`, computed from a rollup.
+    Rows are keyed by rollup columns and not sorted.
+    """
+    total_quantity = cast(func.sum(rollup.total_quantity), BigInteger)
+    record_count = cast(func.coalesce(func.sum(rollup.record_count), 0), BigInteger)
+    metric_expressions = {
+        "sum": total_quantity,
+        "count": record_count,
+        "avg": cast(func.sum(rollup.total_quantity), Numeric)
+        / func.nullif(func.sum(rollup.record_count), 0),
+    }
+    group_columns = [getattr(rollup, column) for column in group_by]
+    query = (
+        select(
+            *group_columns,
+            *[metric_expressions[metric].label(metric) for metric in metrics],
+        )
+        .where(*filter_clauses(rollup.__table__, filters))
+        .group_by(*group_columns)
+    )
+    results = (await db.execute(query)).mappings().all()
+    return [dict(row) for row in results]
+
+
+async def rebuild_rollups(db: AsyncSession) -> None:
+    """
+    Recomputes every rollup from the base table in a single transaction.
+    Writers are blocked while it runs, readers are not.
+    """
+    try:
+        await db.execute(
+            text(f"LOCK TABLE {CrudeOilImportsSchema.__tablename__} IN SHARE MODE")
+        )
+        for rollup in ROLLUPS:
+            dimensions = rollup_dimensions(rollup)
+            source_columns = [
+                getattr(CrudeOilImportsSchema, dimension) for dimension in dimensions
+            ]
+            await db.execute(delete(rollup))
+            await db.execute(
+                insert(rollup).from_select(
+                    [*dimensions, "total_quantity", "record_count"],
+                    select(
+                        *source_columns,
+                        func.sum(CrudeOilImportsSchema.quantity),
+                        func.count(),
+                    ).group_by(*source_columns),
+                )
+            )
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        error_text = "Error while rebuilding the rollup tables."
+        logger.error(f"{error_text} {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=error_text
+        )
+
+
+async def main():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with SessionLocal() as db:
+        await rebuild_rollups(db)
+    await engine.dispose()
+    print("Rollup tables rebuilt.")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,106 @@
+import time
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+
+class PoolStats:
+    """
+    Counters of the connection pool of this worker, since the start of the worker.
+    Waits include opening a new connection when the pool grows.
+    """
+
+    def __init__(self):
+        self.checkouts = 0
+        self.checkins = 0
+        self.connects = 0
+        self.closes = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self.wait_count = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def record_wait(self, seconds: float) -> None:
+        self.wait_count += 1
+        self.wait_seconds_total += seconds
+        self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+
+    def as_dict(self) -> dict:
+        return {
+            "checkouts": self.checkouts,
+            "checkins": self.checkins,
+            "connects": self.connects,
+            "closes": self.closes,
+            "invalidations": self.invalidations,
+            "timeouts": self.timeouts,
+            "wait_seconds_total": self.wait_seconds_total,
+            "wait_seconds_avg": (
+                self.wait_seconds_total / self.wait_count if self.wait_count else None
+            ),
+            "wait_seconds_max": self.wait_seconds_max,
+        }
+
+
+pool_stats = PoolStats()
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """
+    The default pool of asyncio engines, timing how long every checkout waits for a
+    connection. A recreated pool, e.g. after `engine.dispose()`, keeps the same stats.
+    """
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            pool_stats.timeouts += 1
+            raise
+        finally:
+            pool_stats.record_wait(time.perf_counter() - started)
+
+
+def track_pool_events(engine) -> None:
+    """
+    Counts the checkouts, checkins and the connections opened, closed and invalidated
+    by the pool of `engine`.
+    """
+    target = engine.sync_engine
+
+    @event.listens_for(target, "checkout")
+    def on_checkout(*_):
+        pool_stats.checkouts += 1
+
+    @event.listens_for(target, "checkin")
+    def on_checkin(*_):
+        pool_stats.checkins += 1
+
+    @event.listens_for(target, "connect")
+    def on_connect(*_):
+        pool_stats.connects += 1
+
+    @event.listens_for(target, "close")
+    def on_close(*_):
+        pool_stats.closes += 1
+
+    @event.listens_for(target, "invalidate")
+    def on_invalidate(*_):
+        pool_stats.invalidations += 1
+
+
+def pool_status(engine) -> dict:
+    """
+    :return: the current occupancy of the pool of `engine` and the counters of this worker
+    """
+    pool = engine.sync_engine.pool
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        # Connections opened beyond `size`, the pool counts unused capacity as negative.
+        "overflow": max(pool.overflow(), 0),
+        **pool_stats.as_dict(),
+    }
@@ -0,0 +1,103 @@
+import asyncio
+import itertools
+import logging
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+
+logging.basicConfig(level=logging.ERROR)
+logger = logging.getLogger(__name__)
+
+# Seconds the replica's replayed data is behind its primary. 0 when it replayed
+# everything it received, or when the server is not a standby at all.
+REPLICATION_LAG_QUERY = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() "
+    "OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE coalesce(extract(epoch FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+
+class Replica:
+    def __init__(self, engine: AsyncEngine):
+        self.engine = engine
+        # Sessions are flagged so the reads can tell they may be behind the primary.
+        self.sessionmaker = async_sessionmaker(engine, info={"replica": True})
+        self.healthy = False
+        self.lag_seconds: Optional[float] = None
+        self.error: Optional[str] = None
+
+
+class ReplicaRouter:
+    """
+    Hands out the sessions of the read only requests, round-robin over the healthy
+    replicas. Falls back to the primary when no replica is configured or healthy.
+
+    A replica is healthy when it answered the last check and lags at most
+    `max_lag_seconds` behind the primary. Replicas are checked every
+    `check_interval_seconds` by `run_health_checks()`, started with the application.
+    """
+
+    def __init__(
+        self,
+        engines: List[AsyncEngine],
+        primary: async_sessionmaker,
+        max_lag_seconds: float,
+        check_interval_seconds: float,
+    ):
+        self.replicas = [Replica(engine) for engine in engines]
+        self.primary = primary
+        self.max_lag_seconds = max_lag_seconds
+        self.check_interval_seconds = check_interval_seconds
+        self._turn = itertools.count()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.replicas)
+
+    def read_sessionmaker(self) -> async_sessionmaker:
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return self.primary
+        return healthy[next(self._turn) % len(healthy)].sessionmaker
+
+    async def _check(self, replica: Replica) -> None:
+        try:
+            async with replica.engine.connect() as conn:
+                lag = await asyncio.wait_for(
+                    conn.scalar(REPLICATION_LAG_QUERY),
+                    timeout=self.check_interval_seconds,
+                )
+            replica.lag_seconds = float(lag)
+            replica.error = None
+            replica.healthy = replica.lag_seconds <= self.max_lag_seconds
+        except Exception as e:
+            if replica.healthy:
+                logger.error(f"Read replica {replica.engine.url!r} is unavailable. {e}")
+            replica.healthy = False
+            replica.lag_seconds = None
+            replica.error = str(e)
+
+    async def check_all(self) -> None:
+        await asyncio.gather(*[self._check(replica) for replica in self.replicas])
+
+    async def run_health_checks(self) -> None:
+        while True:
+            await self.check_all()
+            await asyncio.sleep(self.check_interval_seconds)
+
+    async def dispose(self) -> None:
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+    def status(self) -> List[dict]:
+        return [
+            {
+                # repr() of the URL hides the password.
+                "url": repr(replica.engine.url),
+                "healthy": replica.healthy,
+                "lag_seconds": replica.lag_seconds,
+                "error": replica.error,
+            }
+            for replica in self.replicas
+        ]
@@ -1,5 +1,12 @@
 import uuid as uuid_lib
 
+from sqlalchemy import (
+    BigInteger,
+    ForeignKey,
+    Index,
+    SmallInteger,
+    UniqueConstraint,
+)
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
@@ -8,6 +15,36 @@ class Base(DeclarativeBase):
     pass
 
 
+class DimensionMixin:
+    """
+    Distinct values of a repeated string column of `crude_oil_imports`, referenced by a
+    small integer key. Rows are only ever added, an id keeps its name forever.
+    """
+
+    id: Mapped[int] = mapped_column(SmallInteger, primary_key=True, autoincrement=True)
+    name: Mapped[str] = mapped_column(unique=True)
+
+
+class OriginDimensionSchema(DimensionMixin, Base):
+    __tablename__ = "crude_oil_imports_origins"
+
+
+class OriginTypeDimensionSchema(DimensionMixin, Base):
+    __tablename__ = "crude_oil_imports_origin_types"
+
+
+class DestinationDimensionSchema(DimensionMixin, Base):
+    __tablename__ = "crude_oil_imports_destinations"
+
+
+class DestinationTypeDimensionSchema(DimensionMixin, Base):
+    __tablename__ = "crude_oil_imports_destination_types"
+
+
+class GradeDimensionSchema(DimensionMixin, Base):
+    __tablename__ = "crude_oil_imports_grades"
+
+
 class CrudeOilImportsSchema(Base):
     __tablename__ = "crude_oil_imports"
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
@@ -16,13 +53,75 @@ class CrudeOilImportsSchema(Base):
     )
     year: Mapped[int] = mapped_column()
     month: Mapped[int] = mapped_column()
-    origin_name: Mapped[str] = mapped_column(index=True)
-    origin_type_name: Mapped[str] = mapped_column()
-    destination_name: Mapped[str] = mapped_column()
-    destination_type_name: Mapped[str] = mapped_column()
-    grade_name: Mapped[str] = mapped_column()
+    # Names are stored in the dimension tables, `dal.dimensions` translates them.
+    origin_id: Mapped[int] = mapped_column(SmallInteger, ForeignKey(OriginDimensionSchema.id))
+    origin_type_id: Mapped[int] = mapped_column(SmallInteger, ForeignKey(OriginTypeDimensionSchema.id))
+    destination_id: Mapped[int] = mapped_column(SmallInteger, ForeignKey(DestinationDimensionSchema.id))
+    destination_type_id: Mapped[int] = mapped_column(SmallInteger, ForeignKey(DestinationTypeDimensionSchema.id))
+    grade_id: Mapped[int] = mapped_column(SmallInteger, ForeignKey(GradeDimensionSchema.id))
     quantity: Mapped[int] = mapped_column()
+    # Incremented by every update of the row, part of its ETag.
+    version: Mapped[int] = mapped_column(default=1, server_default="1")
+
+    __table_args__ = (
+        # Natural key of a record, `POST /crude-oil-imports/bulk?mode=upsert` resolves
+        # conflicts on it. Its index also serves the period and year ranges.
+        UniqueConstraint(
+            "year",
+            "month",
+            "origin_id",
+            "destination_id",
+            "grade_id",
+            name="unique_import",
+        ),
+        # Match the common filter shapes: a period or year range with a list of origins,
+        # destinations or grades. Equality and IN on the leading column, then a range on
+        # (year, month). The single-dimension filters use the same indexes.
+        Index("ix_crude_oil_imports_origin_period", "origin_id", "year", "month"),
+        Index("ix_crude_oil_imports_destination_period", "destination_id", "year", "month"),
+        Index("ix_crude_oil_imports_grade_period", "grade_id", "year", "month"),
+    )
+
+
+class CrudeOilImportsChangeMarkerSchema(Base):
+    """
+    A single row counting the writes to crude_oil_imports, the change marker of the
+    listing ETags and cache keys. Advanced within the transaction of every write, it is
+    visible, and replicated, together with the data it describes.
+    """
+
+    __tablename__ = "crude_oil_imports_changes"
+    id: Mapped[int] = mapped_column(SmallInteger, primary_key=True, autoincrement=False)
+    marker: Mapped[int] = mapped_column(BigInteger)
+
+
+class CrudeOilImportsOriginRollupSchema(Base):
+    """
+    Monthly totals per origin and grade, kept up to date by the write paths in
+    `dal.crude_oil_imports`. Rebuild with `python -m dal.rollups`.
+    """
+
+    __tablename__ = "crude_oil_imports_origin_monthly"
+    year: Mapped[int] = mapped_column(primary_key=True)
+    month: Mapped[int] = mapped_column(primary_key=True)
+    origin_id: Mapped[int] = mapped_column(SmallInteger, primary_key=True)
+    origin_type_id: Mapped[int] = mapped_column(SmallInteger, primary_key=True)
+    grade_id: Mapped[int] = mapped_column(SmallInteger, primary_key=True)
+    total_quantity: Mapped[int] = mapped_column(BigInteger, default=0)
+    record_count: Mapped[int] = mapped_column(BigInteger, default=0)
+
+
+class CrudeOilImportsDestinationRollupSchema(Base):
+    """
+    Monthly totals per destination and grade, kept up to date by the write paths in
+    `dal.crude_oil_imports`. Rebuild with `python -m dal.rollups`.
+    """
 
-    # __table_args__ = (
-    #     UniqueConstraint('year', 'month', 'origin_name', 'destination_name', 'grade_name', name='unique_import'),
-    # )
+    __tablename__ = "crude_oil_imports_destination_monthly"
+    year: Mapped[int] = mapped_column(primary_key=True)
+    month: Mapped[int] = mapped_column(primary_key=True)
+    destination_id: Mapped[int] = mapped_column(SmallInteger, primary_key=True)
+    destination_type_id: Mapped[int] = mapped_column(SmallInteger, primary_key=True)
+    grade_id: Mapped[int] = mapped_column(SmallInteger, primary_key=True)
+    total_quantity: Mapped[int] = mapped_column(BigInteger, default=0)
+    record_count: Mapped[int] = mapped_column(BigInteger, default=0)
@@ -1,6 +1,61 @@
 from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 
 from config import settings
+from dao.pool import InstrumentedQueuePool, track_pool_events
+from dao.replicas import ReplicaRouter
+from metrics.instrumentation import track_queries
 
-engine = create_async_engine(settings.DATABASE_URL)
+
+def connect_args() -> dict:
+    """
+    asyncpg connection arguments. The timeouts are postgres settings of every
+    connection, 0 keeps the server's default.
+    """
+    server_settings = {}
+    if settings.DB_STATEMENT_TIMEOUT_MS:
+        server_settings["statement_timeout"] = str(settings.DB_STATEMENT_TIMEOUT_MS)
+    if settings.DB_IDLE_IN_TRANSACTION_TIMEOUT_MS:
+        server_settings["idle_in_transaction_session_timeout"] = str(
+            settings.DB_IDLE_IN_TRANSACTION_TIMEOUT_MS
+        )
+    return {
+        # SQLAlchemy's cache of prepared statements, and asyncpg's own used by COPY.
+        "prepared_statement_cache_size": settings.DB_PREPARED_STATEMENT_CACHE_SIZE,
+        "statement_cache_size": settings.DB_PREPARED_STATEMENT_CACHE_SIZE,
+        "server_settings": server_settings,
+    }
+
+
+def engine_options() -> dict:
+    """
+    Pool and connection options shared by the primary and the replica engines.
+    """
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+        "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "connect_args": connect_args(),
+    }
+
+
+engine = create_async_engine(
+    settings.DATABASE_URL, poolclass=InstrumentedQueuePool, **engine_options()
+)
+track_pool_events(engine)
+track_queries(engine)
 SessionLocal = async_sessionmaker(engine)
+
+# Sessionmakers of the read replicas, for the read only requests. Every write uses SessionLocal.
+replica_router = ReplicaRouter(
+    [
+        create_async_engine(url, **engine_options())
+        for url in settings.READ_REPLICA_URLS
+    ],
+    primary=SessionLocal,
+    max_lag_seconds=settings.READ_REPLICA_MAX_LAG_SECONDS,
+    check_interval_seconds=settings.READ_REPLICA_CHECK_INTERVAL_SECONDS,
+)
+for replica in replica_router.replicas:
+    track_queries(replica.engine)
@@ -1,9 +1,86 @@
-from dao.session import SessionLocal
+import inspect
+import time
+from typing import Callable, Type
 
+from fastapi import Query, Request
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, ValidationError
+from sqlalchemy.ext.asyncio import async_sessionmaker
 
-async def get_db():
+from config import settings
+from dao.session import SessionLocal, replica_router
+
+# Returned by the requests that used the primary. Sent back on the next requests, it keeps
+# their reads on the primary until the given unix time, so they see the write.
+READ_PRIMARY_UNTIL_HEADER = "X-Read-Primary-Until"
+
+
+async def get_db(request: Request):
+    # Lets the middleware return the read-your-writes header.
+    request.state.used_primary = True
     async with SessionLocal() as db:
         try:
             yield db
         finally:
             await db.close()
+
+
+def get_read_sessionmaker(request: Request) -> async_sessionmaker:
+    """
+    Sessionmaker of a read replica, or of the primary when the client asks to read its
+    own recent writes or no replica is healthy.
+    """
+    try:
+        read_primary_until = float(request.headers.get(READ_PRIMARY_UNTIL_HEADER, 0))
+    except ValueError:
+        read_primary_until = 0
+    now = time.time()
+    # Values beyond the window were not issued by the API, they cannot pin a client for good.
+    if now < read_primary_until <= now + settings.READ_YOUR_WRITES_SECONDS:
+        return SessionLocal
+    return replica_router.read_sessionmaker()
+
+
+async def get_read_db(request: Request):
+    """
+    Session of the read only requests, they never write. Read replicas lag behind the
+    primary, bounded by READ_REPLICA_MAX_LAG_SECONDS.
+    """
+    async with get_read_sessionmaker(request)() as db:
+        try:
+            yield db
+        finally:
+            await db.close()
+
+
+def query_model(model: Type[BaseModel]) -> Callable:
+    """
+    Dependency reading `model` from the query string, field aliases are the parameter names.
+    Unlike `Depends(model)`, list fields are read from repeated query parameters instead
+    of the request body.
+    """
+
+    def dependency(**values) -> BaseModel:
+        try:
+            return model.model_validate(
+                {name: value for name, value in values.items() if value is not None}
+            )
+        except ValidationError as e:
+            raise RequestValidationError(
+                [{**error, "loc": ("query", *error["loc"])} for error in e.errors()]
+            )
+
+    dependency.__signature__ = inspect.Signature(
+        [
+            inspect.Parameter(
+                name,
+                inspect.Parameter.KEYWORD_ONLY,
+                default=Query(
+                    default=None, alias=field.alias, description=field.description
+                ),
+                annotation=field.annotation,
+            )
+            for name, field in model.model_fields.items()
+        ]
+    )
+    return dependency
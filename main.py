@@ -1,11 +1,23 @@
+import asyncio
 import logging
+import time
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 
+from config import settings
+from content_encoding.middleware import (
+    RequestDecompressionMiddleware,
+    ResponseCompressionMiddleware,
+)
 from dao.schema import Base
-from dao.session import engine
+from dao.session import engine, replica_router
+from dependencies import READ_PRIMARY_UNTIL_HEADER
+from metrics.instrumentation import MetricsMiddleware
+from metrics.profiler import ProfilingMiddleware, profiling
+from routers.admin import router as admin_router
 from routers.crude_oil_imports import router
+from routers.metrics import router as metrics_router
 
 
 @asynccontextmanager
@@ -13,7 +25,15 @@ async def lifespan(_: FastAPI):
     # Create the database schema during the startup of the server, if not already created.
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+    health_checks = None
+    if replica_router.enabled:
+        # Known replica states before the first request, then checked in the background.
+        await replica_router.check_all()
+        health_checks = asyncio.create_task(replica_router.run_health_checks())
     yield
+    if health_checks is not None:
+        health_checks.cancel()
+        await replica_router.dispose()
 
 
 description = """
@@ -68,6 +88,40 @@ logging.basicConfig(level=logging.ERROR)
 logger = logging.getLogger(__name__)
 
 app.include_router(router=router)
+app.include_router(router=admin_router)
+app.include_router(router=metrics_router)
+
+# Added first, so it runs inside read_your_writes: BaseHTTPMiddleware would wrap the
+# errors raised while the route reads the body in an ExceptionGroup.
+app.add_middleware(
+    RequestDecompressionMiddleware,
+    paths=["/crude-oil-imports/bulk", "/crude-oil-imports/stream"],
+    max_bytes=settings.MAX_DECOMPRESSED_BODY_BYTES,
+)
+
+
+@app.middleware("http")
+async def read_your_writes(request: Request, call_next):
+    response = await call_next(request)
+    if replica_router.enabled and getattr(request.state, "used_primary", False):
+        response.headers[READ_PRIMARY_UNTIL_HEADER] = (
+            f"{time.time() + settings.READ_YOUR_WRITES_SECONDS:.3f}"
+        )
+    return response
+
+
+if settings.RESPONSE_COMPRESSION_MIN_BYTES >= 0:
+    app.add_middleware(
+        ResponseCompressionMiddleware,
+        paths=["/crude-oil-imports/", "/crude-oil-imports/export"],
+        minimum_bytes=settings.RESPONSE_COMPRESSION_MIN_BYTES,
+        gzip_level=settings.RESPONSE_COMPRESSION_GZIP_LEVEL,
+        zstd_level=settings.RESPONSE_COMPRESSION_ZSTD_LEVEL,
+    )
+if profiling.enabled:
+    app.add_middleware(ProfilingMiddleware)
+# Outermost, so the latency includes the other middlewares.
+app.add_middleware(MetricsMiddleware)
 
 
 # @app.exception_handler(RequestValidationError)
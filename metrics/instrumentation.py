@@ -0,0 +1,189 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+from starlette.routing import Match
+
+from dao.pool import pool_status
+from metrics.registry import (
+    ROW_BUCKETS,
+    CallbackGauge,
+    Counter,
+    Gauge,
+    Histogram,
+    Registry,
+)
+
+registry = Registry()
+
+request_seconds = registry.register(
+    Histogram(
+        "http_request_duration_seconds",
+        "Time from the start of the request to the last byte of the response.",
+        labels=("method", "route", "status"),
+    )
+)
+requests_in_flight = registry.register(
+    Gauge(
+        "http_requests_in_flight",
+        "Requests being served.",
+        labels=("method", "route"),
+    )
+)
+request_rows = registry.register(
+    Histogram(
+        "db_rows_per_request",
+        "Records and aggregated rows read from the database by a request.",
+        labels=("method", "route"),
+        buckets=ROW_BUCKETS,
+    )
+)
+query_seconds = registry.register(
+    Histogram(
+        "db_query_duration_seconds",
+        "Time to execute a database statement, per kind of statement. "
+        "Rows fetched later from a server-side cursor are not included.",
+        labels=("operation",),
+    )
+)
+query_errors = registry.register(
+    Counter(
+        "db_query_errors_total",
+        "Database statements that failed.",
+        labels=("operation",),
+    )
+)
+model_seconds = registry.register(
+    Histogram(
+        "model_duration_seconds",
+        "Time spent validating data into pydantic models and serializing responses.",
+        labels=("stage", "model"),
+    )
+)
+
+
+def _pool_gauges(field: str):
+    def callback():
+        # dao.session imports this module to track the queries of its engine.
+        from dao.session import engine
+
+        return [((), pool_status(engine)[field])]
+
+    return callback
+
+
+for _field, _description in (
+    ("checked_out", "Connections of the pool in use."),
+    ("checked_in", "Idle connections of the pool."),
+    ("overflow", "Connections opened beyond the pool size."),
+):
+    registry.register(
+        CallbackGauge(f"db_pool_{_field}", _description, _pool_gauges(_field))
+    )
+
+# Rows read by the current request, see `record_rows()`.
+_request_rows: ContextVar[Optional[list]] = ContextVar("request_rows", default=None)
+
+
+def record_rows(count: int) -> None:
+    """
+    Adds `count` rows to the rows read from the database by the current request.
+    """
+    rows = _request_rows.get()
+    if rows is not None:
+        rows[0] += count
+
+
+@contextmanager
+def timed_model(stage: str, model: str):
+    """
+    Times a pydantic validation (`stage="validation"`) or a serialization
+    (`stage="serialization"`) of `model`.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        model_seconds.observe(time.perf_counter() - started, stage=stage, model=model)
+
+
+def _operation(statement: str) -> str:
+    words = statement.lstrip().split(None, 1)
+    return words[0].lower() if words else "unknown"
+
+
+def track_queries(engine) -> None:
+    """
+    Times every statement executed through SQLAlchemy on `engine`. COPY runs on the
+    asyncpg connection directly and is not included.
+    """
+    target = engine.sync_engine
+
+    @event.listens_for(target, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info["query_started"] = time.perf_counter()
+
+    @event.listens_for(target, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.pop("query_started", None)
+        if started is not None:
+            query_seconds.observe(
+                time.perf_counter() - started, operation=_operation(statement)
+            )
+
+    @event.listens_for(target, "handle_error")
+    def handle_error(context):
+        if context.connection is not None:
+            context.connection.info.pop("query_started", None)
+        query_errors.inc(operation=_operation(context.statement or ""))
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware observing the latency, in-flight requests and database rows of
+    every route. Latency runs until the last byte of the body, streamed responses
+    included. Routes are labelled by their path template, unknown paths as `unmatched`.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    def _route(self, scope) -> str:
+        for route in scope["app"].router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route.path
+        return "unmatched"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        method, route = scope["method"], self._route(scope)
+        status_code = 500
+        rows = [0]
+        token = _request_rows.set(rows)
+        started = time.perf_counter()
+        requests_in_flight.inc(method=method, route=route)
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_rows.reset(token)
+            requests_in_flight.dec(method=method, route=route)
+            request_seconds.observe(
+                time.perf_counter() - started,
+                method=method,
+                route=route,
+                status=status_code,
+            )
+            if rows[0]:
+                request_rows.observe(rows[0], method=method, route=route)
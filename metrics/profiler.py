@@ -0,0 +1,162 @@
+import asyncio
+import hmac
+import itertools
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Optional
+
+from config import settings
+
+logging.basicConfig(level=logging.ERROR)
+logger = logging.getLogger(__name__)
+
+# Request header with the PROFILING_TOKEN, profiles the request.
+PROFILE_TOKEN_HEADER = "X-Profile-Token"
+# Response header with the name of the written profile.
+PROFILE_HEADER = "X-Profile"
+
+
+class StackSampler:
+    """
+    Samples the stack of one thread every `interval_seconds` from a background thread,
+    and counts identical stacks. The event loop runs every request of the worker, so a
+    profile also holds the work of the requests running concurrently with the profiled
+    one, and the time the loop waited for I/O, e.g. the database, in `select`.
+    """
+
+    def __init__(self, thread_id: int, interval_seconds: float):
+        self.thread_id = thread_id
+        self.interval_seconds = interval_seconds
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_seconds):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                filename = os.path.relpath(code.co_filename)
+                stack.append(f"{code.co_name} ({filename}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self) -> "StackSampler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self) -> str:
+        """
+        The samples in the collapsed stack format, one `frame;frame;frame count` line per
+        distinct stack. Open it with speedscope, or with flamegraph.pl.
+        """
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.items())
+
+
+class Profiling:
+    """
+    Profiles the requests sending the PROFILING_TOKEN, and one in `sample_one_in`
+    other requests (0 disables the sampling). Profiles are written to PROFILING_DIR.
+    """
+
+    def __init__(self, token: Optional[str], directory: str, sample_one_in: int):
+        self.token = token
+        self.directory = directory
+        self.sample_one_in = sample_one_in
+        self._requests = itertools.count(1)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.token)
+
+    def authorized(self, token: Optional[str]) -> bool:
+        return bool(self.token and token) and hmac.compare_digest(self.token, token)
+
+    def should_sample(self) -> bool:
+        if not self.sample_one_in:
+            return False
+        return next(self._requests) % self.sample_one_in == 0
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, os.path.basename(name))
+
+    @staticmethod
+    def profile_name(method: str, path: str) -> str:
+        route = path.strip("/").replace("/", "_") or "root"
+        suffix = uuid.uuid4().hex[:8]
+        return f"{int(time.time())}-{method.lower()}-{route}-{suffix}.collapsed"
+
+    async def write(self, sampler: StackSampler, name: str) -> None:
+        # In a thread, a slow disk never stalls the requests of the event loop.
+        await asyncio.to_thread(self._write, sampler, name)
+
+    def _write(self, sampler: StackSampler, name: str) -> None:
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self.path(name), "w") as file:
+                file.write(sampler.collapsed())
+        except OSError as e:
+            logger.error(f"Could not write the profile {name}. {e}")
+
+
+profiling = Profiling(
+    token=settings.PROFILING_TOKEN,
+    directory=settings.PROFILING_DIR,
+    sample_one_in=settings.PROFILING_SAMPLE_ONE_IN,
+)
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware profiling the requests selected by `profiling`, from the start of
+    the request to the last byte of its response. Only installed when PROFILING_TOKEN
+    is set, it costs nothing otherwise.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = None
+        for header, value in scope["headers"]:
+            if header == PROFILE_TOKEN_HEADER.lower().encode():
+                token = value.decode("latin-1")
+                break
+        requested = token is not None and profiling.authorized(token)
+        if not requested and not profiling.should_sample():
+            await self.app(scope, receive, send)
+            return
+
+        name = profiling.profile_name(scope["method"], scope["path"])
+        sampler = StackSampler(
+            threading.get_ident(), settings.PROFILING_INTERVAL_MS / 1000
+        ).start()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and requested:
+                # Written once the response is complete, under the name announced here.
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (PROFILE_HEADER.encode(), name.encode()),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            sampler.stop()
+            await profiling.write(sampler, name)
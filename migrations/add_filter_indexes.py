@@ -0,0 +1,40 @@
+"""
+Creates the composite filter indexes of `crude_oil_imports` on an existing database and
+drops the single column origin index they replace. New databases get them from
+`Base.metadata.create_all`.
+
+    python -m migrations.add_filter_indexes
+
+Indexes are built CONCURRENTLY, writers are not blocked while they are built.
+"""
+
+import asyncio
+
+from sqlalchemy import text
+
+from dao.schema import CrudeOilImportsSchema
+from dao.session import engine
+
+TABLE = CrudeOilImportsSchema.__tablename__
+
+STATEMENTS = [
+    f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index.name} ON {TABLE} "
+    f"({', '.join(column.name for column in index.columns)})"
+    for index in CrudeOilImportsSchema.__table__.indexes
+    if index.name != f"ix_{TABLE}_uuid"
+] + [f"DROP INDEX CONCURRENTLY IF EXISTS ix_{TABLE}_origin_id"]
+
+
+async def main():
+    async with engine.connect() as conn:
+        # CONCURRENTLY cannot run inside a transaction block.
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        for statement in STATEMENTS:
+            print(statement)
+            await conn.execute(text(statement))
+        await conn.execute(text(f"ANALYZE {TABLE}"))
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,98 @@
+"""
+Adds the `unique_import` constraint on the natural key of `crude_oil_imports`
+(year, month, origin, destination, grade) to an existing database, and drops the
+(year, month) index its unique index replaces. New databases get it from
+`Base.metadata.create_all`.
+
+    python -m migrations.add_natural_key [--delete-duplicates]
+
+Records repeating a natural key, e.g. from loading the sample data twice, prevent the
+constraint. They are counted and nothing is changed, unless --delete-duplicates is
+given: the oldest record of every key is kept, the others are deleted and the rollups
+are rebuilt. The unique index is then built CONCURRENTLY. If a writer adds a duplicate
+meanwhile, the build fails and leaves an invalid index behind, drop it and run again.
+"""
+
+import argparse
+import asyncio
+import sys
+
+from sqlalchemy import text
+
+from dal.crude_oil_imports import NATURAL_KEY, mark_dataset_changed
+from dal.rollups import rebuild_rollups
+from dao.schema import CrudeOilImportsSchema
+from dao.session import SessionLocal, engine
+
+TABLE = CrudeOilImportsSchema.__tablename__
+CONSTRAINT = "unique_import"
+KEY = ", ".join(NATURAL_KEY)
+
+COUNT_DUPLICATES = f"SELECT count(*) - count(DISTINCT ({KEY})) FROM {TABLE}"
+
+DELETE_DUPLICATES = (
+    f"DELETE FROM {TABLE} USING {TABLE} AS kept WHERE "
+    + " AND ".join(f"{TABLE}.{column} = kept.{column}" for column in NATURAL_KEY)
+    + f" AND {TABLE}.id > kept.id"
+)
+
+STATEMENTS = [
+    f"CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS {CONSTRAINT} ON {TABLE} ({KEY})",
+    f"ALTER TABLE {TABLE} ADD CONSTRAINT {CONSTRAINT} UNIQUE USING INDEX {CONSTRAINT}",
+    # Prefix of the unique index.
+    f"DROP INDEX CONCURRENTLY IF EXISTS ix_{TABLE}_period",
+]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--delete-duplicates",
+        action="store_true",
+        help="keep the oldest record of every natural key and delete the others",
+    )
+    args = parser.parse_args()
+
+    async with engine.connect() as conn:
+        exists = (
+            await conn.execute(
+                text("SELECT count(*) FROM pg_constraint WHERE conname = :name"),
+                {"name": CONSTRAINT},
+            )
+        ).scalar()
+        if exists:
+            print(f"{TABLE} already has the {CONSTRAINT} constraint, nothing to do.")
+            await engine.dispose()
+            return
+        duplicates = (await conn.execute(text(COUNT_DUPLICATES))).scalar()
+
+    if duplicates and not args.delete_duplicates:
+        print(
+            f"{duplicates} records of {TABLE} repeat the natural key ({KEY}). "
+            "Nothing was changed, run again with --delete-duplicates to delete them."
+        )
+        await engine.dispose()
+        sys.exit(1)
+    if duplicates:
+        async with SessionLocal() as db:
+            deleted = (await db.execute(text(DELETE_DUPLICATES))).rowcount
+            # Commits the deletes with the rollups computed without them.
+            await rebuild_rollups(db)
+            # After the rebuild, which locks the table: the marker row is always locked
+            # last, after the table.
+            await mark_dataset_changed(db)
+            await db.commit()
+        print(f"Deleted {deleted} duplicate records.")
+
+    async with engine.connect() as conn:
+        # CONCURRENTLY cannot run inside a transaction block.
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        for statement in STATEMENTS:
+            print(statement)
+            await conn.execute(text(statement))
+        await conn.execute(text(f"ANALYZE {TABLE}"))
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
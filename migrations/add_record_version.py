@@ -0,0 +1,35 @@
+"""
+Adds the `version` column and the change marker table behind the ETags of the
+`crude_oil_imports` endpoints to an existing database, and drops the change marker
+sequence they used before. New databases get them from `Base.metadata.create_all`.
+
+    python -m migrations.add_record_version
+"""
+
+import asyncio
+
+from sqlalchemy import text
+
+from dao.schema import CrudeOilImportsChangeMarkerSchema, CrudeOilImportsSchema
+from dao.session import engine
+
+STATEMENTS = [
+    f"ALTER TABLE {CrudeOilImportsSchema.__tablename__} "
+    "ADD COLUMN IF NOT EXISTS version integer NOT NULL DEFAULT 1",
+    "DROP SEQUENCE IF EXISTS crude_oil_imports_change_marker",
+]
+
+
+async def main():
+    async with engine.begin() as conn:
+        for statement in STATEMENTS:
+            await conn.execute(text(statement))
+        await conn.run_sync(
+            CrudeOilImportsChangeMarkerSchema.__table__.create, checkfirst=True
+        )
+    await engine.dispose()
+    print("crude_oil_imports version column and change marker added.")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
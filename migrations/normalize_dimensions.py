@@ -0,0 +1,134 @@
+"""
+Moves the dimension names of an existing `crude_oil_imports` table into the dimension
+tables, replacing the text columns by small integer keys, and rebuilds the rollups on
+those keys. Prints the size of every table and of its indexes before and after.
+
+    python -m migrations.normalize_dimensions
+
+Runs in one transaction and holds an exclusive lock on crude_oil_imports until it
+commits, stop the writers first. The table is then compacted with VACUUM FULL.
+"""
+
+import asyncio
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from dal.dimensions import DIMENSION_ID_COLUMNS, DIMENSIONS
+from dal.rollups import ROLLUPS, rebuild_rollups
+from dao.schema import Base, CrudeOilImportsSchema
+from dao.session import SessionLocal, engine
+
+TABLE = CrudeOilImportsSchema.__tablename__
+
+
+async def print_table_sizes(conn: AsyncConnection, title: str) -> None:
+    rows = (
+        await conn.execute(
+            text(
+                "SELECT relname, pg_table_size(oid), pg_indexes_size(oid), "
+                "pg_total_relation_size(oid) FROM pg_class "
+                "WHERE relkind = 'r' AND relname LIKE :prefix ORDER BY relname"
+            ),
+            {"prefix": f"{TABLE}%"},
+        )
+    ).all()
+    print(title)
+    print(f"{'table':<40}{'heap':>14}{'indexes':>14}{'total':>14}")
+    for name, heap, indexes, total in rows:
+        print(f"{name:<40}{heap:>14,}{indexes:>14,}{total:>14,}")
+
+
+async def is_normalized(conn: AsyncConnection) -> bool:
+    query = text(
+        "SELECT count(*) FROM information_schema.columns "
+        "WHERE table_name = :table AND column_name = 'origin_name'"
+    )
+    return (await conn.execute(query, {"table": TABLE})).scalar() == 0
+
+
+def migration_statements() -> list:
+    statements = []
+    for column, dimension in DIMENSIONS.items():
+        statements.append(
+            f"INSERT INTO {dimension.__tablename__} (name) "
+            f"SELECT DISTINCT {column} FROM {TABLE} ORDER BY 1 "
+            "ON CONFLICT (name) DO NOTHING"
+        )
+    statements.append(
+        f"ALTER TABLE {TABLE} "
+        + ", ".join(
+            f"ADD COLUMN {id_column} smallint"
+            for id_column in DIMENSION_ID_COLUMNS.values()
+        )
+    )
+    # Single pass over the table, the foreign keys are validated afterwards in bulk.
+    statements.append(
+        f"UPDATE {TABLE} SET "
+        + ", ".join(
+            f"{id_column} = {DIMENSIONS[column].__tablename__}.id"
+            for column, id_column in DIMENSION_ID_COLUMNS.items()
+        )
+        + " FROM "
+        + ", ".join(dimension.__tablename__ for dimension in DIMENSIONS.values())
+        + " WHERE "
+        + " AND ".join(
+            f"{dimension.__tablename__}.name = {TABLE}.{column}"
+            for column, dimension in DIMENSIONS.items()
+        )
+    )
+    statements.append(
+        f"ALTER TABLE {TABLE} "
+        + ", ".join(
+            f"ALTER COLUMN {id_column} SET NOT NULL, "
+            f"ADD CONSTRAINT {TABLE}_{id_column}_fkey FOREIGN KEY ({id_column}) "
+            f"REFERENCES {DIMENSIONS[column].__tablename__} (id), "
+            f"DROP COLUMN {column}"
+            for column, id_column in DIMENSION_ID_COLUMNS.items()
+        )
+    )
+    # Keyed by names, recreated on the new keys and rebuilt below.
+    statements.append(
+        "DROP TABLE IF EXISTS " + ", ".join(rollup.__tablename__ for rollup in ROLLUPS)
+    )
+    return statements
+
+
+def create_tables_and_indexes(session) -> None:
+    connection = session.connection()
+    # create_all skips existing tables, including their new indexes.
+    Base.metadata.create_all(connection)
+    for index in CrudeOilImportsSchema.__table__.indexes:
+        index.create(connection, checkfirst=True)
+
+
+async def main():
+    async with engine.connect() as conn:
+        if await is_normalized(conn):
+            print(f"{TABLE} already stores dimension keys, nothing to do.")
+            await engine.dispose()
+            return
+        await print_table_sizes(conn, "Before:")
+
+    async with SessionLocal() as db:
+        await db.run_sync(
+            lambda session: Base.metadata.create_all(
+                session.connection(),
+                tables=[dimension.__table__ for dimension in DIMENSIONS.values()],
+            )
+        )
+        for statement in migration_statements():
+            await db.execute(text(statement))
+        await db.run_sync(create_tables_and_indexes)
+        # Commits the whole migration.
+        await rebuild_rollups(db)
+
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text(f"VACUUM FULL ANALYZE {TABLE}"))
+        await print_table_sizes(conn, "After:")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
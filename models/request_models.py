@@ -1,8 +1,11 @@
-from typing import Optional
+from enum import Enum
+from typing import Annotated, List, Optional
 from uuid import UUID
 
 from pydantic import BaseModel, Field, field_validator
 
+from config import settings
+
 
 class CrudeOilDataModelBase(BaseModel):
     """
@@ -25,8 +28,43 @@ class CrudeOilDataModelBase(BaseModel):
         validate_by_name = True
 
 
+Year = Annotated[int, Field(ge=1900, le=2100)]
+Month = Annotated[int, Field(ge=1, le=12)]
+# A year and a month, e.g. 2015-03.
+Period = Annotated[str, Field(pattern=r"^\d{4}-(0[1-9]|1[0-2])$", examples=["2015-03"])]
+
+
 class CrudeOilDataModelFilter(CrudeOilDataModelBase):
-    pass
+    """
+    Query filters. A repeated parameter matches any of its values, e.g.
+    `originName=Canada&originName=Mexico`. Range bounds are inclusive.
+    """
+
+    year: Optional[List[Year]] = Field(default=None, examples=[[2000]])
+    month: Optional[List[Month]] = Field(default=None, examples=[[1]])
+    origin_name: Optional[List[str]] = Field(default=None, alias="originName")
+    origin_type_name: Optional[List[str]] = Field(default=None, alias="originTypeName")
+    destination_name: Optional[List[str]] = Field(default=None, alias="destinationName")
+    destination_type_name: Optional[List[str]] = Field(
+        default=None, alias="destinationTypeName"
+    )
+    grade_name: Optional[List[str]] = Field(default=None, alias="gradeName")
+    year_gte: Optional[Year] = Field(default=None, alias="yearGte")
+    year_lte: Optional[Year] = Field(default=None, alias="yearLte")
+    period_from: Optional[Period] = Field(default=None, alias="periodFrom")
+    period_to: Optional[Period] = Field(default=None, alias="periodTo")
+    quantity_min: Optional[int] = Field(default=None, alias="quantityMin")
+    quantity_max: Optional[int] = Field(default=None, alias="quantityMax")
+
+
+class CountMode(str, Enum):
+    """
+    How the `total` of a paginated listing is computed.
+    """
+
+    exact = "exact"
+    estimated = "estimated"
+    none = "none"
 
 
 class CrudeOilDataModelPatch(CrudeOilDataModelBase):
@@ -54,3 +92,60 @@ class CrudeOilDataModelPost(CrudeOilDataModelBase):
 
 class CrudeOilDataModelPut(CrudeOilDataModelPost):
     pass
+
+
+class BulkInsertMode(str, Enum):
+    """
+    How `POST /crude-oil-imports/bulk` treats records whose natural key
+    (year, month, origin, destination, grade) already exists.
+    """
+
+    # Fail the whole request.
+    insert = "insert"
+    # Update the existing record, leave it untouched when nothing differs.
+    upsert = "upsert"
+
+
+class ExportFormat(str, Enum):
+    """
+    Serialization of the full-dataset export.
+    """
+
+    ndjson = "ndjson"
+    csv = "csv"
+    arrow = "arrow"
+    parquet = "parquet"
+
+
+class AggregateDimension(str, Enum):
+    """
+    Columns an aggregation can be grouped by. Values are the API field names.
+    """
+
+    year = "year"
+    month = "month"
+    origin_name = "originName"
+    origin_type_name = "originTypeName"
+    destination_name = "destinationName"
+    destination_type_name = "destinationTypeName"
+    grade_name = "gradeName"
+
+
+class AggregateMetric(str, Enum):
+    """
+    Aggregate functions applied on `quantity`.
+    """
+
+    sum = "sum"
+    avg = "avg"
+    min = "min"
+    max = "max"
+    count = "count"
+
+
+class CrudeOilLookupModel(BaseModel):
+    """
+    UUIDs of the records to retrieve in a single request.
+    """
+
+    uuids: List[UUID] = Field(min_length=1, max_length=settings.LOOKUP_MAX_UUIDS)
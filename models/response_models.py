@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Optional
 from uuid import UUID
 
 from pydantic import BaseModel, Field
@@ -21,7 +21,7 @@ class CrudeOilDataResponseModel(CrudeOilDataModelPost):
 
 
 class SingleDataGetResponseModel(ResponseModel):
-    status: int = "200"
+    status: int = 200
     message: str = "Success"
     data: CrudeOilDataResponseModel
 
@@ -52,7 +52,9 @@ class DataUpdateResponseModel(ResponseModel):
 class PaginatedMetaData(BaseModel):
     skip: int
     limit: int
-    total: int
+    total: Optional[int] = None
+    total_estimated: bool = False
+    next_cursor: Optional[str] = None
 
 
 class PaginatedCrudeOilDataModel(BaseModel):
@@ -66,6 +68,76 @@ class PaginatedResponseModel(ResponseModel):
     data: PaginatedCrudeOilDataModel
 
 
+class AggregatedCrudeOilDataModel(BaseModel):
+    group_by: List[str]
+    metrics: List[str]
+    rows: List[dict]
+
+
+class AggregateResponseModel(ResponseModel):
+    status: int = 200
+    message: str = "Success"
+    data: AggregatedCrudeOilDataModel
+
+
+class IngestionErrorModel(BaseModel):
+    line: int
+    error: str
+
+
+class IngestionSummaryModel(BaseModel):
+    received: int
+    inserted: int
+    failed: int
+    errors: List[IngestionErrorModel]
+    errors_truncated: bool = False
+
+
+class IngestionResponseModel(ResponseModel):
+    status: int = 201
+    message: str = "Success"
+    data: IngestionSummaryModel
+
+
+class UpsertSummaryModel(BaseModel):
+    # Records created, records whose values changed, records already up to date and
+    # records replaced by a later record of the request with the same natural key.
+    inserted: int
+    updated: int
+    unchanged: int
+    duplicates: int
+
+
+class UpsertResponseModel(ResponseModel):
+    status: int = 200
+    message: str = "Success"
+    data: UpsertSummaryModel
+
+
+class BulkChangeSummaryModel(BaseModel):
+    # Records changed, or that would be changed when dry_run is set.
+    affected: int
+    dry_run: bool = False
+
+
+class BulkChangeResponseModel(ResponseModel):
+    status: int = 200
+    message: str = "Success"
+    data: BulkChangeSummaryModel
+
+
+class LookupResultModel(BaseModel):
+    # In the order of the request, without repeated records.
+    records: List[CrudeOilDataResponseModel]
+    missing: List[UUID]
+
+
+class LookupResponseModel(ResponseModel):
+    status: int = 200
+    message: str = "Success"
+    data: LookupResultModel
+
+
 class SingleDataRetrieveNotFoundResponseModel(ResponseModel):
     status: int = 200
     message: str = "Success"
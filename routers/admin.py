@@ -0,0 +1,192 @@
+import asyncio
+import hmac
+import logging
+import os
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from fastapi.responses import FileResponse
+
+import bll.crude_oil_imports as bll
+from config import settings
+from dao.pool import pool_status
+from dao.session import engine, replica_router
+from metrics.profiler import PROFILE_TOKEN_HEADER, profiling
+from models.response_models import ResponseModel
+
+router = APIRouter(prefix="/admin", tags=["Admin"])
+
+logging.basicConfig(level=logging.ERROR)
+logger = logging.getLogger(__name__)
+
+ADMIN_TOKEN_HEADER = "X-Admin-Token"
+
+
+def require_admin_token(
+    token: Optional[str] = Header(default=None, alias=ADMIN_TOKEN_HEADER),
+) -> None:
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="The admin routes are disabled, set ADMIN_TOKEN to enable them.",
+        )
+    if not token or not hmac.compare_digest(
+        settings.ADMIN_TOKEN.encode(), token.encode()
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=f"A valid {ADMIN_TOKEN_HEADER} header is required.",
+        )
+
+
+@router.get(
+    "/cache",
+    status_code=status.HTTP_200_OK,
+    response_model=ResponseModel,
+    dependencies=[Depends(require_admin_token)],
+)
+async def get_cache_stats() -> ResponseModel:
+    """
+    Hit and miss counters of the response caches of this worker. Requires the `X-Admin-Token` header.
+
+    ### Returns:
+
+    - `ResponseModel`: `data` maps every cache name to its `hits`, `misses`, `hit_ratio`, `entries` and `bytes`.
+    """
+    return ResponseModel(
+        status=status.HTTP_200_OK,
+        message="Success",
+        data={
+            cache.name: cache.stats() for cache in (bll.record_cache, bll.listing_cache)
+        },
+    )
+
+
+@router.get(
+    "/pool",
+    status_code=status.HTTP_200_OK,
+    response_model=ResponseModel,
+    dependencies=[Depends(require_admin_token)],
+)
+async def get_pool_stats() -> ResponseModel:
+    """
+    Occupancy and counters of the database connection pool of this worker. Growing
+    waits with every connection checked out point to pool starvation, short waits with
+    slow requests to the database itself. Requires the `X-Admin-Token` header.
+
+    ### Returns:
+
+    - `ResponseModel`: `data` has the pool `size`, the `checked_out`, `checked_in` and `overflow`
+        connections, the `checkouts`, `checkins`, `connects`, `closes`, `invalidations` and `timeouts`
+        counters, and the `wait_seconds_total`, `wait_seconds_avg` and `wait_seconds_max` to acquire a connection.
+    """
+    return ResponseModel(
+        status=status.HTTP_200_OK,
+        message="Success",
+        data=pool_status(engine),
+    )
+
+
+@router.get(
+    "/replicas",
+    status_code=status.HTTP_200_OK,
+    response_model=ResponseModel,
+    dependencies=[Depends(require_admin_token)],
+)
+async def get_replica_status() -> ResponseModel:
+    """
+    Health of the read replicas as last checked by this worker. Requires the `X-Admin-Token` header.
+
+    ### Returns:
+
+    - `ResponseModel`: `data.replicas` lists the `url`, `healthy`, `lag_seconds` and last `error` of every
+        replica. Read only requests use the primary when none is healthy.
+    """
+    return ResponseModel(
+        status=status.HTTP_200_OK,
+        message="Success",
+        data={"replicas": replica_router.status()},
+    )
+
+
+def require_profiling_token(
+    token: Optional[str] = Header(default=None, alias=PROFILE_TOKEN_HEADER),
+) -> None:
+    if not profiling.enabled:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Profiling is disabled, set PROFILING_TOKEN to enable it.",
+        )
+    if not profiling.authorized(token):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=f"A valid {PROFILE_TOKEN_HEADER} header is required.",
+        )
+
+
+@router.put(
+    "/profiling",
+    status_code=status.HTTP_200_OK,
+    response_model=ResponseModel,
+    dependencies=[Depends(require_profiling_token)],
+)
+async def set_profiling_rate(sample_one_in: int = Query(ge=0)) -> ResponseModel:
+    """
+    Profiles one in `sample_one_in` requests of this worker and writes the profiles to
+    PROFILING_DIR, 0 stops the sampling. Requires the `X-Profile-Token` header.
+
+    ### Returns:
+
+    - `ResponseModel`: `data` has the new `sample_one_in`.
+    """
+    profiling.sample_one_in = sample_one_in
+    return ResponseModel(
+        status=status.HTTP_200_OK,
+        message="Success",
+        data={"sample_one_in": sample_one_in},
+    )
+
+
+@router.get(
+    "/profiles",
+    status_code=status.HTTP_200_OK,
+    response_model=ResponseModel,
+    dependencies=[Depends(require_profiling_token)],
+)
+async def list_profiles() -> ResponseModel:
+    """
+    Profiles written to PROFILING_DIR, newest first. Requires the `X-Profile-Token` header.
+
+    ### Returns:
+
+    - `ResponseModel`: `data.profiles` lists the file names, download one with `GET /admin/profiles/{name}`.
+    """
+    try:
+        names = sorted(
+            await asyncio.to_thread(os.listdir, profiling.directory), reverse=True
+        )
+    except FileNotFoundError:
+        names = []
+    return ResponseModel(
+        status=status.HTTP_200_OK,
+        message="Success",
+        data={"profiles": [name for name in names if name.endswith(".collapsed")]},
+    )
+
+
+@router.get(
+    "/profiles/{name}",
+    response_class=FileResponse,
+    dependencies=[Depends(require_profiling_token)],
+)
+async def get_profile(name: str) -> FileResponse:
+    """
+    A profile in the collapsed stack format, e.g. the one named by the `X-Profile` header of a
+    profiled request. Open it with https://www.speedscope.app. Requires the `X-Profile-Token` header.
+    """
+    path = profiling.path(name)
+    if not os.path.isfile(path):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found."
+        )
+    return FileResponse(path, media_type="text/plain", filename=os.path.basename(path))
@@ -1,27 +1,52 @@
 import logging
-from typing import List, Union
+from typing import List, Optional, Type, Union
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import (
+    APIRouter,
+    Depends,
+    Header,
+    HTTPException,
+    Request,
+    Response,
+    status,
+    Query,
+)
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
 import bll.crude_oil_imports as bll
-from dependencies import get_db
+from bll.export import EXPORT_MEDIA_TYPES, export_serializer
+from bll.serialization import envelope_json
+from config import settings
+from dependencies import get_db, get_read_db, get_read_sessionmaker, query_model
 from models.request_models import (
+    AggregateDimension,
+    AggregateMetric,
+    BulkInsertMode,
+    CountMode,
     CrudeOilDataModelFilter,
     CrudeOilDataModelPatch,
     CrudeOilDataModelPost,
     CrudeOilDataModelPut,
+    CrudeOilLookupModel,
+    ExportFormat,
 )
 from models.response_models import (
+    AggregateResponseModel,
+    BulkChangeResponseModel,
     DataCreatedResponseModel,
     DataUpdateResponseModel,
     FailureResponseModel,
+    IngestionResponseModel,
+    LookupResponseModel,
     MultipleDataCreatedResponseModel,
     PaginatedResponseModel,
     SingleDataGetResponseModel,
     SingleDataRetrieveNotFoundResponseModel,
     SingleDataUpdateUnsuccessfulResponseModel,
+    UpsertResponseModel,
 )
 
 router = APIRouter(tags=["US crude oil imports"])
@@ -30,6 +55,21 @@ logging.basicConfig(level=logging.ERROR)
 logger = logging.getLogger(__name__)
 
 
+def _json_response(
+    response_model: Type[BaseModel], data, status_code: int = status.HTTP_200_OK
+) -> Response:
+    """
+    `data`, already validated by the bll, wrapped in `response_model` and serialized
+    once. FastAPI does not validate a returned Response against the route's
+    `response_model`, which still documents the route.
+    """
+    return Response(
+        content=envelope_json(response_model, data),
+        media_type="application/json",
+        status_code=status_code,
+    )
+
+
 @router.get(
     "/crude-oil-imports/",
     status_code=status.HTTP_200_OK,
@@ -38,9 +78,12 @@ logger = logging.getLogger(__name__)
 async def get_paginated_crude_oil_imports(
     skip: int = Query(default=0, ge=0),
     limit: int = Query(default=500, ge=0),
-    filters: CrudeOilDataModelFilter = Depends(CrudeOilDataModelFilter),
-    db: AsyncSession = Depends(get_db),
-) -> Union[PaginatedResponseModel, FailureResponseModel]:
+    cursor: Optional[str] = Query(default=None),
+    count: CountMode = Query(default=CountMode.exact),
+    filters: CrudeOilDataModelFilter = Depends(query_model(CrudeOilDataModelFilter)),
+    if_none_match: Optional[str] = Header(default=None),
+    db: AsyncSession = Depends(get_read_db),
+) -> Union[Response, FailureResponseModel]:
     """
     Retrieves a paginated list of crude oil import records based on the filters.
 
@@ -53,21 +96,103 @@ async def get_paginated_crude_oil_imports(
 
     - `limit` (int, optional): The maximum number of records to return. Defaults to 500.
 
+    - `cursor` (str, optional): The `next_cursor` value returned by the previous page. When set, `skip` is ignored
+                and the page starts right after the last record of the previous page. Unlike `skip`, the cost of
+                a page does not grow with its depth, use it to walk through the whole dataset.
+                The cursor is only valid together with the same filters it was issued for.
+
+    - `count` (str, optional): How `metadata.total` is computed. Defaults to `exact`.
+                - `exact`: counts the matching records, results are cached for a short time per filter set.
+                - `estimated`: uses the database planner statistics, cheap but approximate.
+                  `metadata.total_estimated` is set to `true`.
+                - `none`: `metadata.total` is not computed and is `null`. Fastest, use it with `cursor`.
+
     - `filters` (CrudeOilDataModelFilter, optional):  Filters to apply to the query.
                 Unset values are ignored and not included in the filter.
+                Repeat a parameter to match any of its values, e.g. `originName=Canada&originName=Mexico`.
+                `yearGte`/`yearLte`, `periodFrom`/`periodTo` (`YYYY-MM`) and `quantityMin`/`quantityMax`
+                are inclusive ranges.
+
+    - `If-None-Match` header (optional): The `ETag` of a previous response for the same parameters.
+                If no record was inserted, updated or deleted since, `304 Not Modified` is returned without a body.
 
     ### Returns:
 
     - `Union[PaginatedResponseModel, FailureResponseModel]`: A `PaginatedResponseModel` containing the requested crude oil
-     import data if the request is successful. A `FailureResponseModel` is returned if an error occurs during processing.
+     import data if the request is successful, with an `ETag` header. `metadata.next_cursor` is set when more records
+     may follow. A `FailureResponseModel` is returned if an error occurs during processing.
 
     ### Note: Response samples are also shown below by swagger.
     """
     try:
-        paginated_data = await bll.get_paginated_crude_oil_imports(
-            db, skip=skip, limit=limit, filters=filters
+        # Served from the listing cache as already serialized JSON when possible.
+        etag, body = await bll.get_paginated_crude_oil_imports_response(
+            db,
+            skip=skip,
+            limit=limit,
+            cursor=cursor,
+            count=count,
+            filters=filters,
+            if_none_match=if_none_match,
+        )
+        if body is None:
+            return Response(
+                status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag}
+            )
+        return Response(
+            content=body, media_type="application/json", headers={"ETag": etag}
+        )
+    except HTTPException as he:
+        logger.error(f"HTTPException {str(he)}")
+        return FailureResponseModel(status=he.status_code, message=he.detail)
+    except Exception as e:
+        logger.error(f"Unknown Error {str(e)}")
+        return FailureResponseModel(
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR, message="Unknown Error"
+        )
+
+
+@router.get(
+    "/crude-oil-imports/aggregate",
+    status_code=status.HTTP_200_OK,
+    response_model=Union[AggregateResponseModel, FailureResponseModel],
+)
+async def get_aggregated_crude_oil_imports(
+    group_by: List[AggregateDimension] = Query(default=[]),
+    metrics: List[AggregateMetric] = Query(default=[AggregateMetric.sum]),
+    filters: CrudeOilDataModelFilter = Depends(query_model(CrudeOilDataModelFilter)),
+    db: AsyncSession = Depends(get_read_db),
+) -> Union[Response, FailureResponseModel]:
+    """
+    Aggregates the crude oil import quantities on the server, grouped by the requested columns.
+
+    The grouping, metrics and filters are computed by the database in a single query, so only
+    the aggregated rows are transferred instead of every matching record.
+
+    ### Parameters
+
+    - `group_by` (List[str], optional): Columns to group by, can be repeated, e.g.
+                `group_by=originName&group_by=year`. One of `year`, `month`, `originName`, `originTypeName`,
+                `destinationName`, `destinationTypeName`, `gradeName`.
+                When empty, a single row aggregating all the matching records is returned.
+
+    - `metrics` (List[str], optional): Aggregates computed on `quantity` for every group, can be repeated.
+                One of `sum`, `avg`, `min`, `max`, `count`. Defaults to `sum`.
+
+    - `filters` (CrudeOilDataModelFilter, optional):  Filters to apply before aggregating.
+                Unset values are ignored and not included in the filter.
+
+    ### Returns:
+
+    - `Union[AggregateResponseModel, FailureResponseModel]`: An `AggregateResponseModel` with one row per group,
+     keyed by the group columns and the metric names. A `FailureResponseModel` is returned if an error occurs
+     during processing.
+    """
+    try:
+        aggregated_data = await bll.get_aggregated_crude_oil_imports(
+            db, filters=filters, group_by=group_by, metrics=metrics
         )
-        return PaginatedResponseModel(data=paginated_data)
+        return _json_response(AggregateResponseModel, aggregated_data)
     except HTTPException as he:
         logger.error(f"HTTPException {str(he)}")
         return FailureResponseModel(status=he.status_code, message=he.detail)
@@ -78,6 +203,67 @@ async def get_paginated_crude_oil_imports(
         )
 
 
+@router.get(
+    "/crude-oil-imports/export",
+    status_code=status.HTTP_200_OK,
+    response_class=StreamingResponse,
+    responses={
+        200: {
+            "content": {
+                media_type: {"schema": {"type": "string"}}
+                for media_type in EXPORT_MEDIA_TYPES.values()
+            },
+        }
+    },
+)
+async def export_crude_oil_imports(
+    format: ExportFormat = Query(default=ExportFormat.ndjson),
+    filters: CrudeOilDataModelFilter = Depends(query_model(CrudeOilDataModelFilter)),
+    sessionmaker: async_sessionmaker = Depends(get_read_sessionmaker),
+) -> StreamingResponse:
+    """
+    Streams every crude oil import record matching the filters in a single response.
+
+    Records are read from the database through a server-side cursor and written to the response as they
+    arrive, the memory used by the server is the same for a thousand or millions of records.
+    Use it instead of walking through `GET /crude-oil-imports/` page by page.
+
+    ### Parameters
+
+    - `format` (str, optional): Defaults to `ndjson`. Field names are the same as in the other responses.
+                - `ndjson`: one JSON object per line.
+                - `csv`: with a header line.
+                - `arrow`: Apache Arrow IPC stream with typed columns, the string dimensions are dictionary encoded.
+                  Load it with `pyarrow.ipc.open_stream`, `polars.read_ipc_stream` or `pandas.read_feather`.
+                - `parquet`: the same columns in a parquet file.
+
+    - `filters` (CrudeOilDataModelFilter, optional):  Filters to apply to the query.
+                Unset values are ignored and not included in the filter.
+
+    ### Returns:
+
+    - The matching records, ordered by insertion. If an error occurs while streaming, the response is
+      interrupted rather than silently truncated. A `FailureResponseModel` is returned if the format is not
+      available on the server.
+    """
+    try:
+        serializer = export_serializer(format)
+    except HTTPException as he:
+        logger.error(f"HTTPException {str(he)}")
+        return JSONResponse(
+            FailureResponseModel(status=he.status_code, message=he.detail).model_dump()
+        )
+    return StreamingResponse(
+        bll.export_crude_oil_imports(
+            filters=filters, serializer=serializer, sessionmaker=sessionmaker
+        ),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={
+            "Content-Disposition": f'attachment; filename="crude_oil_imports.{format.value}"'
+        },
+    )
+
+
 @router.get(
     "/crude-oil-imports/{uuid}",
     status_code=status.HTTP_200_OK,
@@ -86,8 +272,10 @@ async def get_paginated_crude_oil_imports(
     ],
 )
 async def get_crude_oil_imports_from_uuid(
-    uuid: UUID, db: AsyncSession = Depends(get_db)
-) -> Union[SingleDataGetResponseModel, SingleDataRetrieveNotFoundResponseModel]:
+    uuid: UUID,
+    if_none_match: Optional[str] = Header(default=None),
+    db: AsyncSession = Depends(get_read_db),
+) -> Union[Response, SingleDataRetrieveNotFoundResponseModel]:
     """
     Retrieves a single crude oil import record by its UUID.
 
@@ -98,19 +286,65 @@ async def get_crude_oil_imports_from_uuid(
 
     - `uuid` (UUID, required): The UUID of the crude oil import record to retrieve.
 
+    - `If-None-Match` header (optional): The `ETag` of a previous response for this record.
+                If the record was not updated since, `304 Not Modified` is returned without a body.
+
     ### Returns:
 
     - `Union[SingleDataGetResponseModel, SingleDataRetrieveNotFoundResponseModel]`:
         A SingleDataGetResponseModel containing the requested crude oil import data
-        if the record is found. A SingleDataRetrieveNotFoundResponseModel is returned
+        if the record is found, with an `ETag` header. A SingleDataRetrieveNotFoundResponseModel is returned
         if the record is not found.
 
     ### Note: Response samples are also shown below by swagger.
     """
-    result = await bll.get_crude_oil_from_uuid(db, uuid)
-    if not result:
+    # Found records are served from the cache as already serialized JSON.
+    result = await bll.get_crude_oil_response_from_uuid(db, uuid, if_none_match)
+    if result is None:
         return SingleDataRetrieveNotFoundResponseModel()
-    return SingleDataGetResponseModel(data=result)
+    etag, body = result
+    if body is None:
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag}
+        )
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
+
+
+@router.post(
+    "/crude-oil-imports/lookup",
+    status_code=status.HTTP_200_OK,
+    response_model=Union[LookupResponseModel, FailureResponseModel],
+)
+async def lookup_crude_oil_imports(
+    lookup: CrudeOilLookupModel, db: AsyncSession = Depends(get_read_db)
+) -> Union[Response, FailureResponseModel]:
+    """
+    Retrieves many crude oil import records by their UUIDs in a single request.
+
+    Use it instead of calling `GET /crude-oil-imports/{uuid}` once per record.
+
+    ### Parameters
+
+    - `lookup` (CrudeOilLookupModel, required): The UUIDs of the records to retrieve,
+            up to `LOOKUP_MAX_UUIDS` (10000 by default).
+
+    ### Returns:
+
+    - `Union[LookupResponseModel, FailureResponseModel]`: A `LookupResponseModel` with the found records
+        in the requested order and the UUIDs that do not match any record in `missing`.
+        A `FailureResponseModel` is returned if an error occurs during processing.
+    """
+    try:
+        result = await bll.lookup_crude_oil_imports(db, lookup.uuids)
+        return _json_response(LookupResponseModel, result)
+    except HTTPException as he:
+        logger.error(f"HTTPException {str(he)}")
+        return FailureResponseModel(status=he.status_code, message=he.detail)
+    except Exception as e:
+        logger.error(f"Unknown Error {str(e)}")
+        return FailureResponseModel(
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR, message="Unknown Error"
+        )
 
 
 @router.post(
@@ -120,7 +354,7 @@ async def get_crude_oil_imports_from_uuid(
 )
 async def insert(
     crude_oil_data: CrudeOilDataModelPost, db: AsyncSession = Depends(get_db)
-) -> Union[DataCreatedResponseModel, FailureResponseModel]:
+) -> Union[Response, FailureResponseModel]:
     """
     Inserts a new crude oil import record into the database.
     This endpoint allows to create a new crude oil import record.
@@ -142,7 +376,11 @@ async def insert(
     """
     try:
         inserted_record = await bll.insert_one_data_into_database(db, crude_oil_data)
-        return DataCreatedResponseModel(data=inserted_record.model_dump())
+        return _json_response(
+            DataCreatedResponseModel,
+            inserted_record,
+            status_code=status.HTTP_201_CREATED,
+        )
     except HTTPException as he:
         logger.error(f"HTTPException {str(he)}")
         return FailureResponseModel(status=he.status_code, message=he.detail)
@@ -156,11 +394,18 @@ async def insert(
 @router.post(
     "/crude-oil-imports/bulk",
     status_code=status.HTTP_201_CREATED,
-    response_model=Union[MultipleDataCreatedResponseModel, FailureResponseModel],
+    response_model=Union[
+        MultipleDataCreatedResponseModel, UpsertResponseModel, FailureResponseModel
+    ],
+    responses={
+        200: {"model": UpsertResponseModel, "description": "Records upserted"},
+    },
 )
 async def insert_bulk(
-    crude_oil_data_list: List[CrudeOilDataModelPost], db: AsyncSession = Depends(get_db)
-) -> Union[MultipleDataCreatedResponseModel, FailureResponseModel]:
+    crude_oil_data_list: List[CrudeOilDataModelPost],
+    mode: BulkInsertMode = Query(default=BulkInsertMode.insert),
+    db: AsyncSession = Depends(get_db),
+) -> Union[Response, FailureResponseModel]:
     """
     Inserts multiple new crude oil import records into the database in bulk.
 
@@ -174,21 +419,110 @@ async def insert_bulk(
     - `crude_oil_data_list` (List[CrudeOilDataModelPost], required): A list of data
             objects for the new crude oil import records. Each item in the list
             should be a JSON object conforming to the CrudeOilDataModelPost schema.
+    - `mode` (BulkInsertMode, optional): `insert` (default) fails with a 409 when a record
+            with the same year, month, origin, destination and grade exists. `upsert`
+            updates those records instead and can be retried safely.
 
     ### Returns:
 
-    - `Union[MultipleDataCreatedResponseModel,  FailureResponseModel]`:
+    - `Union[MultipleDataCreatedResponseModel, UpsertResponseModel, FailureResponseModel]`:
         A MultipleDataCreatedResponseModel containing the newly created crude oil import
-        data if the records are created successfully. A FailureResponseModel is returned
-        if an error occurs during processing.
+        data if the records are created successfully, with a 201. With `mode=upsert`,
+        an UpsertResponseModel with the number of inserted, updated and unchanged
+        records, and of duplicates: records replaced by a later one with the same
+        natural key, with a 200.
+        A FailureResponseModel is returned if an error occurs during processing.
 
     ### Note: A sample format will be prepopulated, we only need to edit the values.
     """
     try:
+        if mode == BulkInsertMode.upsert:
+            summary = await bll.upsert_multiple_data_into_database(
+                db, crude_oil_data_list
+            )
+            return _json_response(
+                UpsertResponseModel, summary, status_code=status.HTTP_200_OK
+            )
         inserted_data = await bll.insert_multiple_data_into_database(
             db, crude_oil_data_list
         )
-        return MultipleDataCreatedResponseModel(data=inserted_data)
+        return _json_response(
+            MultipleDataCreatedResponseModel,
+            inserted_data,
+            status_code=status.HTTP_201_CREATED,
+        )
+    except HTTPException as he:
+        logger.error(f"HTTPException {str(he)}")
+        return FailureResponseModel(status=he.status_code, message=he.detail)
+    except Exception as e:
+        logger.error(f"Unknown Error {str(e)}")
+        return FailureResponseModel(
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR, message="Unknown Error"
+        )
+
+
+@router.post(
+    "/crude-oil-imports/stream",
+    status_code=status.HTTP_201_CREATED,
+    response_model=Union[IngestionResponseModel, FailureResponseModel],
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/x-ndjson": {
+                    "schema": {"type": "string"},
+                    "example": '{"year": 2009, "month": 1, "originName": "Belize", '
+                    '"originTypeName": "Country", "destinationName": "FLINT HILLS RESOURCES LP / WEST / TX", '
+                    '"destinationTypeName": "Refinery", "gradeName": "Light Sour", "quantity": 62}\n',
+                },
+                "text/csv": {
+                    "schema": {"type": "string"},
+                    "example": "year,month,originName,originTypeName,destinationName,"
+                    "destinationTypeName,gradeName,quantity\n"
+                    "2009,1,Belize,Country,FLINT HILLS RESOURCES LP / WEST / TX,Refinery,Light Sour,62\n",
+                },
+            },
+        }
+    },
+)
+async def insert_stream(
+    request: Request,
+    chunk_size: int = Query(default=settings.INGEST_CHUNK_SIZE, ge=1, le=100000),
+    db: AsyncSession = Depends(get_db),
+) -> Union[Response, FailureResponseModel]:
+    """
+    Inserts crude oil import records streamed as newline delimited JSON or CSV.
+
+    The body is read, validated and inserted incrementally, so the memory used does not depend on the upload size.
+    Lines that fail validation, or repeat the year, month, origin, destination and grade of an existing record,
+    are skipped and reported in the summary, the others are still inserted. Records are committed every
+    `chunk_size` rows.
+
+    ### Parameters
+
+    - `Content-Type` header (required): `application/x-ndjson` with one JSON object per line,
+            or `text/csv` whose first line is the header. Columns are the ones of `data.csv`
+            (`year`, `month`, `originName`, `originTypeName`, `destinationName`, `destinationTypeName`,
+            `gradeName`, `quantity`), other columns are ignored.
+
+    - `chunk_size` (int, optional): Number of records inserted per transaction. Defaults to 5000.
+
+    ### Returns:
+
+    - `Union[IngestionResponseModel, FailureResponseModel]`:
+        An IngestionResponseModel with the number of received, inserted and failed records and the
+        errors per line. A FailureResponseModel is returned if the body cannot be processed at all.
+    """
+    try:
+        summary = await bll.ingest_crude_oil_imports_stream(
+            db,
+            body=request.stream(),
+            content_type=request.headers.get("content-type"),
+            chunk_size=chunk_size,
+        )
+        return _json_response(
+            IngestionResponseModel, summary, status_code=status.HTTP_201_CREATED
+        )
     except HTTPException as he:
         logger.error(f"HTTPException {str(he)}")
         return FailureResponseModel(status=he.status_code, message=he.detail)
@@ -211,9 +545,7 @@ async def insert_bulk(
 async def patch_crude_oil_import(
     uuid: UUID, patch_data: CrudeOilDataModelPatch, db: AsyncSession = Depends(get_db)
 ) -> Union[
-    DataUpdateResponseModel,
-    SingleDataUpdateUnsuccessfulResponseModel,
-    FailureResponseModel,
+    Response, SingleDataUpdateUnsuccessfulResponseModel, FailureResponseModel
 ]:
     """
         Updates an existing crude oil import record identified by its UUID.
@@ -250,7 +582,7 @@ async def patch_crude_oil_import(
             return SingleDataUpdateUnsuccessfulResponseModel(
                 message="No such record exists."
             )
-        return DataUpdateResponseModel(data=patched_data)
+        return _json_response(DataUpdateResponseModel, patched_data)
     except HTTPException as he:
         logger.error(f"HTTPException {str(he)}")
         return FailureResponseModel(status=he.status_code, message=he.detail)
@@ -273,9 +605,7 @@ async def patch_crude_oil_import(
 async def update_crude_oil_import(
     uuid: UUID, update_data: CrudeOilDataModelPut, db: AsyncSession = Depends(get_db)
 ) -> Union[
-    DataUpdateResponseModel,
-    SingleDataUpdateUnsuccessfulResponseModel,
-    FailureResponseModel,
+    Response, SingleDataUpdateUnsuccessfulResponseModel, FailureResponseModel
 ]:
     """
     Replaces an existing crude oil import record entirely with new data.
@@ -315,7 +645,7 @@ async def update_crude_oil_import(
             return SingleDataUpdateUnsuccessfulResponseModel(
                 message="No such record exists."
             )
-        return DataUpdateResponseModel(data=updated_data)
+        return _json_response(DataUpdateResponseModel, updated_data)
     except HTTPException as he:
         logger.error(f"HTTPException {str(he)}")
         return FailureResponseModel(status=he.status_code, message=he.detail)
@@ -338,9 +668,7 @@ async def update_crude_oil_import(
 async def update_crude_oil_import(
     uuid: UUID, db: AsyncSession = Depends(get_db)
 ) -> Union[
-    DataUpdateResponseModel,
-    SingleDataUpdateUnsuccessfulResponseModel,
-    FailureResponseModel,
+    Response, SingleDataUpdateUnsuccessfulResponseModel, FailureResponseModel
 ]:
     """
     Deletes an existing crude oil import record identified by its UUID.
@@ -369,7 +697,7 @@ async def update_crude_oil_import(
             return SingleDataUpdateUnsuccessfulResponseModel(
                 message="No such record exists."
             )
-        return DataUpdateResponseModel(data=deleted_data)
+        return _json_response(DataUpdateResponseModel, deleted_data)
     except HTTPException as he:
         logger.error(f"HTTPException {str(he)}")
         return FailureResponseModel(status=he.status_code, message=he.detail)
@@ -380,25 +708,97 @@ async def update_crude_oil_import(
         )
 
 
-# @router.patch(
-#     "/crude-oil-imports/",
-#     status_code=status.HTTP_200_OK,
-#     response_model=DataUpdateResponseModel,
-# )
-# async def patch_crude_oil_imports(
-#         patch_data: CrudeOilDataModelPatch,
-#         db: AsyncSession = Depends(get_db),
-# ):
-#     try:
-#         patched_data = await bll.patch_crude_oil_import(
-#             db, patch_data
-#         )
-#         return DataUpdateResponseModel(data=patched_data)
-#     except HTTPException as he:
-#         logger.error(f"HTTPException {str(he)}")
-#         return FailureResponseModel(status=he.status_code, message=he.detail)
-#     except Exception as e:
-#         logger.error(f"Unknown Error {str(e)}")
-#         return FailureResponseModel(
-#             status=status.HTTP_500_INTERNAL_SERVER_ERROR, message="Unknown Error"
-#         )
+@router.patch(
+    "/crude-oil-imports/",
+    status_code=status.HTTP_200_OK,
+    response_model=Union[BulkChangeResponseModel, FailureResponseModel],
+)
+async def patch_crude_oil_imports(
+    patch_data: CrudeOilDataModelPatch,
+    dry_run: bool = Query(default=False),
+    max_rows: Optional[int] = Query(default=None, ge=1),
+    filters: CrudeOilDataModelFilter = Depends(query_model(CrudeOilDataModelFilter)),
+    db: AsyncSession = Depends(get_db),
+) -> Union[Response, FailureResponseModel]:
+    """
+    Updates every crude oil import record matching the filters with a single statement.
+
+    ### Parameters
+
+    - `patch_data` (CrudeOilDataModelPatch, required): The fields to change and their new values.
+            Omitted fields retain their original values.
+
+    - `dry_run` (bool, optional): Only count the matching records, nothing is changed. Defaults to `false`.
+
+    - `max_rows` (int, optional): Change nothing and fail if more records match.
+
+    - `filters` (CrudeOilDataModelFilter, required): Same filters as `GET /crude-oil-imports/`,
+            at least one is required.
+
+    ### Returns:
+
+    - `Union[BulkChangeResponseModel, FailureResponseModel]`: A `BulkChangeResponseModel` with the number of
+        updated records, or of matching records for a dry run. A `FailureResponseModel` is returned if an error
+        occurs during processing, or with status `400` when no filter is set or `max_rows` is exceeded.
+    """
+    try:
+        summary = await bll.patch_crude_oil_imports_by_filter(
+            db,
+            filters=filters,
+            patch_data_model=patch_data,
+            dry_run=dry_run,
+            max_rows=max_rows,
+        )
+        return _json_response(BulkChangeResponseModel, summary)
+    except HTTPException as he:
+        logger.error(f"HTTPException {str(he)}")
+        return FailureResponseModel(status=he.status_code, message=he.detail)
+    except Exception as e:
+        logger.error(f"Unknown Error {str(e)}")
+        return FailureResponseModel(
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR, message="Unknown Error"
+        )
+
+
+@router.delete(
+    "/crude-oil-imports/",
+    status_code=status.HTTP_200_OK,
+    response_model=Union[BulkChangeResponseModel, FailureResponseModel],
+)
+async def delete_crude_oil_imports(
+    dry_run: bool = Query(default=False),
+    max_rows: Optional[int] = Query(default=None, ge=1),
+    filters: CrudeOilDataModelFilter = Depends(query_model(CrudeOilDataModelFilter)),
+    db: AsyncSession = Depends(get_db),
+) -> Union[Response, FailureResponseModel]:
+    """
+    Deletes every crude oil import record matching the filters with a single statement.
+
+    ### Parameters
+
+    - `dry_run` (bool, optional): Only count the matching records, nothing is deleted. Defaults to `false`.
+
+    - `max_rows` (int, optional): Delete nothing and fail if more records match.
+
+    - `filters` (CrudeOilDataModelFilter, required): Same filters as `GET /crude-oil-imports/`,
+            at least one is required.
+
+    ### Returns:
+
+    - `Union[BulkChangeResponseModel, FailureResponseModel]`: A `BulkChangeResponseModel` with the number of
+        deleted records, or of matching records for a dry run. A `FailureResponseModel` is returned if an error
+        occurs during processing, or with status `400` when no filter is set or `max_rows` is exceeded.
+    """
+    try:
+        summary = await bll.delete_crude_oil_imports_by_filter(
+            db, filters=filters, dry_run=dry_run, max_rows=max_rows
+        )
+        return _json_response(BulkChangeResponseModel, summary)
+    except HTTPException as he:
+        logger.error(f"HTTPException {str(he)}")
+        return FailureResponseModel(status=he.status_code, message=he.detail)
+    except Exception as e:
+        logger.error(f"Unknown Error {str(e)}")
+        return FailureResponseModel(
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR, message="Unknown Error"
+        )
@@ -0,0 +1,18 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from metrics.instrumentation import registry
+
+router = APIRouter(tags=["Admin"])
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics() -> PlainTextResponse:
+    """
+    Metrics of this worker in the Prometheus text format: request latency and in-flight
+    requests per route, database statement latency, rows read per request, pydantic
+    validation and serialization time, and the connection pool occupancy.
+    """
+    return PlainTextResponse(
+        registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -1,43 +1,372 @@
+"""
+Loads data.csv into crude_oil_imports, from the root of the project:
+
+    python -m sample_data.load_data sample_data/data.csv
+
+Batches of `--batch-size` rows are upserted through `POST /crude-oil-imports/bulk`,
+`--concurrency` of them in flight at a time so the server never waits for the next
+batch. Failed requests are retried with exponential backoff. A checkpoint file next to
+the CSV keeps the number of rows committed so far: run the same command again after an
+interruption to resume from it. Records are upserted on their natural key, rows loaded
+twice are updated rather than duplicated.
+
+`--mode copy` writes to the database set by DATABASE_URL directly with binary COPY,
+for the initial load of an empty database.
+"""
+
+import argparse
 import asyncio
 import csv
+import gzip
+import json
+import os
+import random
+import sys
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
 
 import httpx
 
-URL = "http://0.0.0.0:5321/crude-oil-imports/bulk"
-BATCH_SIZE = 10000
-
-
-async def main():
-    async with httpx.AsyncClient() as client:
-        with open("data.csv", newline="") as csvfile:
-            reader = csv.DictReader(csvfile)
-            batch, count = [], 0
-            for row in reader:
-                params = {
-                    "year": row["year"],
-                    "month": row["month"],
-                    "originName": row["originName"],
-                    "originTypeName": row["originTypeName"],
-                    "destinationName": row["destinationName"],
-                    "destinationTypeName": row["destinationTypeName"],
-                    "gradeName": row["gradeName"],
-                    "quantity": row["quantity"],
-                }
-                batch.append(params)
-                count += 1
-                # Only post once each batch size is reached.
-                # Better than hitting one at a time
-                if len(batch) == BATCH_SIZE:
-                    resp = await client.post(url=URL, json=batch)
-                    resp.raise_for_status()
-                    batch = []
-                    print(f"Number of records populated: {count}")
-
-            # Send the final batch
-            resp = await client.post(url=URL, json=batch)
-            resp.raise_for_status()
-            count += len(batch)
-            print(f"Number of records populated: {count}")
-
-
-asyncio.run(main())
+DEFAULT_URL = "http://0.0.0.0:5321"
+BULK_PATH = "/crude-oil-imports/bulk"
+FIELDS = [
+    "year",
+    "month",
+    "originName",
+    "originTypeName",
+    "destinationName",
+    "destinationTypeName",
+    "gradeName",
+    "quantity",
+]
+# Overloaded or restarting server, or a proxy in front of it: worth another try.
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+GZIP_LEVEL = 5
+ZSTD_LEVEL = 3
+
+
+class LoadError(Exception):
+    pass
+
+
+def read_batches(
+    path: str, batch_size: int, skip: int
+) -> Iterator[Tuple[int, List[dict]]]:
+    """
+    :return: (number of the first row, rows) of every batch after the first `skip` rows
+    """
+    with open(path, newline="") as csv_file:
+        reader = csv.DictReader(csv_file)
+        batch, start = [], skip
+        for number, row in enumerate(reader):
+            if number < skip:
+                continue
+            batch.append({field: row[field] for field in FIELDS})
+            if len(batch) == batch_size:
+                yield start, batch
+                batch, start = [], number + 1
+        if batch:
+            yield start, batch
+
+
+class Checkpoint:
+    """
+    Number of leading rows of the CSV already committed, saved after every batch.
+
+    Batches complete out of order: the checkpoint only moves past a batch once every
+    batch before it is committed too, so resuming never skips a row. It is removed once
+    the whole file is loaded.
+    """
+
+    def __init__(self, path: str, source: str):
+        self.path = path
+        stat = os.stat(source)
+        # A checkpoint only applies to the file it was written for.
+        self.source = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        self.rows = 0
+        self.completed: Dict[int, int] = {}
+
+    def load(self) -> int:
+        if not os.path.exists(self.path):
+            return 0
+        with open(self.path) as checkpoint_file:
+            saved = json.load(checkpoint_file)
+        if saved["source"] != self.source:
+            raise LoadError(
+                f"{self.path} was written for another version of the CSV, "
+                "use --restart to load it from the beginning."
+            )
+        self.rows = saved["rows"]
+        return self.rows
+
+    def done(self, start: int, count: int) -> None:
+        self.completed[start] = count
+        advanced = False
+        while self.rows in self.completed:
+            self.rows += self.completed.pop(self.rows)
+            advanced = True
+        if advanced:
+            self.save()
+
+    def save(self) -> None:
+        # Replaced atomically, an interruption never leaves half a checkpoint.
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w") as checkpoint_file:
+            json.dump({"source": self.source, "rows": self.rows}, checkpoint_file)
+        os.replace(temporary, self.path)
+
+    def remove(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class Progress:
+    def __init__(self, already_loaded: int):
+        self.already_loaded = already_loaded
+        self.rows = 0
+        self.started = time.perf_counter()
+        self.last_rows, self.last_time = 0, self.started
+
+    def add(self, rows: int) -> None:
+        self.rows += rows
+
+    def rate(self) -> float:
+        return self.rows / max(time.perf_counter() - self.started, 1e-9)
+
+    def report(self) -> None:
+        now = time.perf_counter()
+        recent = (self.rows - self.last_rows) / max(now - self.last_time, 1e-9)
+        self.last_rows, self.last_time = self.rows, now
+        print(
+            f"{self.already_loaded + self.rows:>12,} rows loaded, "
+            f"{self.rate():,.0f} rows/sec sustained, {recent:,.0f} rows/sec now"
+        )
+
+    async def report_every(self, seconds: float) -> None:
+        while True:
+            await asyncio.sleep(seconds)
+            self.report()
+
+
+def response_status(response: httpx.Response) -> Tuple[int, str]:
+    """
+    :return: the status and message of the response. Failures are also returned as a
+        FailureResponseModel with a success status code.
+    """
+    try:
+        body = response.json()
+    except ValueError:
+        return response.status_code, response.text[:200]
+    if response.status_code < 400 and isinstance(body, dict):
+        return body.get("status", response.status_code), body.get("message", "")
+    return response.status_code, str(body)[:200]
+
+
+class ApiLoader:
+    """
+    Upserts the batches through the bulk endpoint of a running server.
+    """
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        url: str,
+        compress: str,
+        retries: int,
+        backoff_seconds: float,
+    ):
+        self.client = client
+        self.url = url.rstrip("/") + BULK_PATH
+        self.compress = compress
+        self.retries = retries
+        self.backoff_seconds = backoff_seconds
+        if compress == "zstd":
+            try:
+                import zstandard
+            except ImportError:
+                raise LoadError("--compress zstd needs the zstandard package.")
+            self.zstandard = zstandard
+
+    def encode(self, rows: List[dict]) -> Tuple[bytes, dict]:
+        body = json.dumps(rows, separators=(",", ":")).encode()
+        headers = {"Content-Type": "application/json"}
+        if self.compress == "gzip":
+            body = gzip.compress(body, compresslevel=GZIP_LEVEL)
+        elif self.compress == "zstd":
+            # A compressor per batch, they are not shared between threads.
+            body = self.zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+        if self.compress != "none":
+            headers["Content-Encoding"] = self.compress
+        return body, headers
+
+    async def load(self, rows: List[dict]) -> None:
+        # Encoded in a thread, compressors release the GIL while batches are in flight.
+        body, headers = await asyncio.to_thread(self.encode, rows)
+        for attempt in range(self.retries + 1):
+            try:
+                response = await self.client.post(
+                    self.url, params={"mode": "upsert"}, content=body, headers=headers
+                )
+                status, message = response_status(response)
+                if status < 400:
+                    return
+                error = f"HTTP {status}: {message}"
+                if status not in RETRY_STATUSES:
+                    raise LoadError(error)
+            except httpx.TransportError as e:
+                error = f"{type(e).__name__}: {e}"
+            if attempt == self.retries:
+                raise LoadError(f"{error} (after {self.retries} retries)")
+            # Exponential backoff with jitter, concurrent batches do not retry in step.
+            delay = self.backoff_seconds * 2**attempt * random.uniform(0.5, 1.5)
+            print(f"Retrying in {delay:.1f}s after {error}", file=sys.stderr)
+            await asyncio.sleep(delay)
+
+
+class CopyLoader:
+    """
+    Inserts the batches with binary COPY, each in its own transaction, bypassing the
+    API. A batch found already committed, e.g. when the process stopped before saving
+    the checkpoint, is upserted instead.
+    """
+
+    def __init__(self):
+        # Only this mode needs the project's modules and a database connection.
+        from fastapi import HTTPException, status
+
+        import dal.crude_oil_imports as dal
+        from config import settings
+        from dao.session import SessionLocal, engine
+        from models.request_models import CrudeOilDataModelPost
+
+        settings.BULK_INSERT_METHOD = "copy"
+        self.dal = dal
+        self.engine = engine
+        self.sessionmaker = SessionLocal
+        self.model = CrudeOilDataModelPost
+        self.http_exception = HTTPException
+        self.conflict = status.HTTP_409_CONFLICT
+
+    async def load(self, rows: List[dict]) -> None:
+        data_list = [self.model(**row) for row in rows]
+        async with self.sessionmaker() as db:
+            try:
+                await self.dal.insert_multiple_data_into_database(db, data_list)
+            except self.http_exception as he:
+                if he.status_code != self.conflict:
+                    raise LoadError(he.detail)
+                await self.dal.upsert_multiple_data_into_database(db, data_list)
+
+    async def finish(self) -> None:
+        from sqlalchemy import text
+
+        async with self.engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await conn.execute(text("ANALYZE crude_oil_imports"))
+        await self.engine.dispose()
+
+
+async def load_file(
+    loader, batches, checkpoint: Checkpoint, progress: Progress, concurrency: int
+) -> None:
+    """
+    Loads the batches with up to `concurrency` of them in flight. Stops at the first
+    batch failing for good, the checkpoint keeps the rows committed before it.
+    """
+
+    async def load_batch(start: int, rows: List[dict]) -> None:
+        await loader.load(rows)
+        checkpoint.done(start, len(rows))
+        progress.add(len(rows))
+
+    in_flight = set()
+    try:
+        for start, rows in batches:
+            if len(in_flight) >= concurrency:
+                done, in_flight = await asyncio.wait(
+                    in_flight, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    task.result()
+            in_flight.add(asyncio.create_task(load_batch(start, rows)))
+        if in_flight:
+            await asyncio.gather(*in_flight)
+    finally:
+        for task in in_flight:
+            task.cancel()
+
+
+async def main(args) -> Optional[str]:
+    checkpoint = Checkpoint(args.checkpoint or f"{args.csv}.checkpoint", args.csv)
+    if args.restart:
+        checkpoint.remove()
+    skip = checkpoint.load()
+    if skip:
+        print(f"Resuming after row {skip:,} from {checkpoint.path}")
+    progress = Progress(skip)
+    reporter = asyncio.create_task(progress.report_every(args.report_seconds))
+    batches = read_batches(args.csv, args.batch_size, skip)
+    try:
+        if args.mode == "copy":
+            loader = CopyLoader()
+            await load_file(loader, batches, checkpoint, progress, args.concurrency)
+            await loader.finish()
+        else:
+            limits = httpx.Limits(max_connections=args.concurrency)
+            async with httpx.AsyncClient(
+                timeout=args.timeout, limits=limits
+            ) as client:
+                loader = ApiLoader(
+                    client, args.url, args.compress, args.retries, args.backoff
+                )
+                await load_file(loader, batches, checkpoint, progress, args.concurrency)
+    except LoadError as e:
+        return (
+            f"Load failed: {e}\n{checkpoint.rows:,} rows are committed, "
+            "run the same command again to resume."
+        )
+    finally:
+        reporter.cancel()
+    checkpoint.remove()
+    elapsed = time.perf_counter() - progress.started
+    print(
+        f"Loaded {progress.rows:,} rows in {elapsed:.1f}s, "
+        f"{progress.rate():,.0f} rows/sec sustained."
+    )
+    return None
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("csv", nargs="?", default="sample_data/data.csv")
+    parser.add_argument("--mode", choices=["api", "copy"], default="api")
+    parser.add_argument("--url", default=DEFAULT_URL, help="base url of the API")
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument(
+        "--concurrency", type=int, default=4, help="batches in flight at a time"
+    )
+    parser.add_argument(
+        "--compress",
+        choices=["none", "gzip", "zstd"],
+        default="gzip",
+        help="Content-Encoding of the request bodies, zstd needs the zstandard package",
+    )
+    parser.add_argument("--retries", type=int, default=5)
+    parser.add_argument(
+        "--backoff", type=float, default=0.5, help="seconds before the first retry"
+    )
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument(
+        "--checkpoint", help="checkpoint file, defaults to <csv>.checkpoint"
+    )
+    parser.add_argument(
+        "--restart", action="store_true", help="ignore the checkpoint, load every row"
+    )
+    parser.add_argument("--report-seconds", type=float, default=5.0)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
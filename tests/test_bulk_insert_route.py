@@ -0,0 +1,49 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import bll.crude_oil_imports as bll
+from dependencies import get_db
+from main import app
+from models.response_models import UpsertSummaryModel
+
+RECORD = {
+    "year": 2020,
+    "month": 1,
+    "originName": "Canada",
+    "originTypeName": "Country",
+    "destinationName": "Texas",
+    "destinationTypeName": "State",
+    "gradeName": "Heavy Sour",
+    "quantity": 100,
+}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    async def insert_multiple(db, data_list):
+        return []
+
+    async def upsert_multiple(db, data_list):
+        return UpsertSummaryModel(
+            inserted=len(data_list), updated=0, unchanged=0, duplicates=0
+        )
+
+    monkeypatch.setattr(bll, "insert_multiple_data_into_database", insert_multiple)
+    monkeypatch.setattr(bll, "upsert_multiple_data_into_database", upsert_multiple)
+    app.dependency_overrides[get_db] = lambda: None
+    yield TestClient(app)
+    app.dependency_overrides.pop(get_db)
+
+
+@pytest.mark.parametrize("mode, status_code", [("insert", 201), ("upsert", 200)])
+def test_bulk_insert_status_code(client, mode, status_code):
+    response = client.post(
+        "/crude-oil-imports/bulk", params={"mode": mode}, json=[RECORD]
+    )
+    assert response.status_code == status_code
+    assert response.json()["status"] == status_code
+
+
+def test_bulk_insert_documents_both_status_codes():
+    responses = app.openapi()["paths"]["/crude-oil-imports/bulk"]["post"]["responses"]
+    assert {"200", "201"} <= responses.keys()
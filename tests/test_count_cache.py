@@ -0,0 +1,48 @@
+import asyncio
+
+import bll.crude_oil_imports as bll
+from models.request_models import CountMode, CrudeOilDataModelFilter
+
+
+class SharedDatabase:
+    """The rows count and change marker every worker of the service sees."""
+
+    def __init__(self):
+        self.total = 10
+        self.marker = 1
+
+    def insert_from_another_worker(self, rows: int):
+        # Another worker's write commits its rows and moves the marker, but cannot clear
+        # the caches of this one.
+        self.total += rows
+        self.marker += 1
+
+
+def test_exact_total_follows_another_workers_insert(monkeypatch):
+    database = SharedDatabase()
+
+    async def get_change_marker(db):
+        return f"m{database.marker}"
+
+    async def get_records_from_db(db, **kwargs):
+        return []
+
+    async def count_records(db, filters):
+        return database.total
+
+    monkeypatch.setattr(bll.dal, "get_change_marker", get_change_marker)
+    monkeypatch.setattr(bll.dal, "get_records_from_db", get_records_from_db)
+    monkeypatch.setattr(bll, "_count_records_on_own_connection", count_records)
+    monkeypatch.setattr(bll, "count_cache", bll.TTLCache(16, 60.0))
+
+    def exact_total():
+        page = asyncio.run(
+            bll.get_paginated_crude_oil_imports(
+                None, filters=CrudeOilDataModelFilter(), count=CountMode.exact
+            )
+        )
+        return page.metadata.total
+
+    assert exact_total() == 10
+    database.insert_from_another_worker(rows=5)
+    assert exact_total() == 15
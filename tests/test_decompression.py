@@ -0,0 +1,67 @@
+import gzip
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from content_encoding.coding import _ZstdFrameTracker
+from main import app
+
+BODY = json.dumps(
+    [
+        {
+            "year": 2020,
+            "month": 1,
+            "originName": "Canada",
+            "originTypeName": "Country",
+            "destinationName": "Texas",
+            "destinationTypeName": "State",
+            "gradeName": "Heavy Sour",
+            "quantity": 100,
+        }
+    ]
+).encode()
+
+
+def raw_frame(content: bytes, checksum: bool) -> bytes:
+    """A single segment zstd frame holding `content` in one raw block."""
+    descriptor = 0x20 | (0x04 if checksum else 0)
+    block_header = (1 | len(content) << 3).to_bytes(3, "little")
+    frame = b"\x28\xb5\x2f\xfd" + bytes([descriptor, len(content)]) + block_header
+    return frame + content + (b"\0" * 4 if checksum else b"")
+
+
+@pytest.mark.parametrize("checksum", [True, False])
+def test_zstd_frame_tracker_finds_the_end_of_every_frame(checksum):
+    frames = [
+        raw_frame(b"first", checksum),
+        b"\x50\x2a\x4d\x18" + (3).to_bytes(4, "little") + b"abc",  # skippable
+        raw_frame(b"second", checksum),
+    ]
+    body = b"".join(frames)
+    frame_ends = {sum(map(len, frames[:count])) for count in range(len(frames) + 1)}
+    for size in range(len(body) + 1):
+        tracker = _ZstdFrameTracker()
+        tracker.feed(body[:size])
+        assert tracker.at_frame_end == (size in frame_ends), size
+
+def post_encoded(body: bytes, encoding: str):
+    return TestClient(app).post(
+        "/crude-oil-imports/bulk",
+        content=body,
+        headers={"Content-Encoding": encoding, "Content-Type": "application/json"},
+    )
+
+
+def test_truncated_gzip_body_is_rejected():
+    response = post_encoded(gzip.compress(BODY)[:-8], "gzip")
+    assert response.status_code == 400
+    assert "truncated gzip body" in response.text
+
+
+def test_truncated_zstd_body_is_rejected():
+    zstandard = pytest.importorskip("zstandard")
+    compressed = zstandard.ZstdCompressor().compress(BODY)
+    response = post_encoded(compressed[:-4], "zstd")
+    assert response.status_code == 400
+    assert "truncated zstd body" in response.text
@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+from sqlalchemy.orm import Session
+
+from dal.dimensions import DimensionCache
+
+
+class ScriptedSession:
+    """Stands for the caller's AsyncSession, answering its statements in order."""
+
+    def __init__(self, *results):
+        self.sync_session = Session()
+        self.results = list(results)
+        self.statements = []
+
+    async def execute(self, statement):
+        self.statements.append(statement)
+        return ScriptedResult(self.results.pop(0))
+
+
+class ScriptedResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def all(self):
+        return self.rows
+
+
+def resolve_new_name(cache: DimensionCache, db: ScriptedSession) -> dict:
+    db.sync_session.begin()
+    return asyncio.run(cache.resolve_names(db, "origin_name", ["Canada"], create=True))
+
+
+@pytest.mark.parametrize("commit", [True, False])
+def test_new_names_are_cached_once_the_caller_commits(commit):
+    cache = DimensionCache()
+    # Lookup, insert and re-select, all on the caller's session.
+    db = ScriptedSession([], [], [(7, "Canada")])
+
+    assert resolve_new_name(cache, db) == {"Canada": 7}
+    assert len(db.statements) == 3
+    assert cache.ids["origin_name"] == {}
+
+    if commit:
+        db.sync_session.commit()
+        assert cache.ids["origin_name"] == {"Canada": 7}
+        assert cache.names["origin_name"] == {7: "Canada"}
+    else:
+        db.sync_session.rollback()
+        assert cache.ids["origin_name"] == {}
+    assert cache.pending == {}
+
+
+def test_names_of_a_closed_transaction_are_not_cached_by_a_later_commit():
+    cache = DimensionCache()
+    db = ScriptedSession([], [], [(7, "Canada")])
+    resolve_new_name(cache, db)
+    db.sync_session.close()
+
+    db.sync_session.begin()
+    db.sync_session.commit()
+    assert cache.ids["origin_name"] == {}